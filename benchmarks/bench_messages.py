@@ -0,0 +1,75 @@
+"""
+Building and serializing a 10k-message conversation history with the slotted, memoized Message classes against
+the previous implementation (pydantic validation on every message, to_dict rebuilt on every call).
+
+    python benchmarks/bench_messages.py --messages 10000 --reads 3
+"""
+import argparse
+import time
+import tracemalloc
+
+
+class PreviousMessage:
+
+    def __init__(self, role, content):
+        from tinyllm.util.message import MessageInput, Text
+        MessageInput(role=role, content=content)
+        self.role = role
+        self.content = content
+        self.raw_content = content
+        if type(content) == str:
+            self.content = [Text(content)]
+
+    def to_dict(self):
+        return {"role": self.role,
+                "content": self.raw_content.strip() if type(self.raw_content) == str else [c.dict() for c in self.content]}
+
+
+def make_history(message_class, count, **kwargs):
+    return [message_class('user' if i % 2 == 0 else 'assistant', f"Message number {i} of the conversation", **kwargs)
+            for i in range(count)]
+
+
+def measure(build, reads, wire_dict=False):
+    start = time.perf_counter()
+    history = build()
+    built = time.perf_counter()
+    for _ in range(reads):
+        # Memory trimming, request parsing and tracing each serialize the history
+        if wire_dict:
+            [message.wire_dict for message in history]
+        else:
+            [message.to_dict() for message in history]
+    end = time.perf_counter()
+
+    tracemalloc.start()
+    history = build()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return built - start, (end - built) / reads, memory
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--reads', type=int, default=3)
+    args = parser.parse_args()
+
+    from tinyllm.util.message import Message
+
+    results = {
+        'previous': measure(lambda: make_history(PreviousMessage, args.messages), args.reads),
+        'slotted, validated': measure(lambda: make_history(Message, args.messages), args.reads),
+        'slotted, validate=False': measure(lambda: make_history(Message, args.messages, validate=False), args.reads),
+        'slotted, wire_dict': measure(lambda: make_history(Message, args.messages, validate=False), args.reads,
+                                      wire_dict=True),
+    }
+
+    print(f"messages: {args.messages}, to_dict passes: {args.reads}")
+    print(f"{'':25} {'build (ms)':>12} {'per pass (ms)':>14} {'memory (MB)':>12}")
+    for name, (build, serialize, memory) in results.items():
+        print(f"{name:25} {build * 1e3:12.1f} {serialize * 1e3:14.1f} {memory / 2 ** 20:12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Streaming throughput of LiteLLMStream with a local fake chunk generator (no network): chunks per second through
+the whole pipeline (LiteLLMStream.run and FunctionStream.__call__), for growing output lengths. With a per-chunk
+cost that grows with the output length, throughput drops as the output gets longer. Tracing goes to a no-op sink.
+
+    python benchmarks/bench_stream.py --tokens 500 2000 8000 --rounds 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+
+def write_config():
+    config = """
+LOGS:
+  LOGGING: false
+  LOG_STATES: []
+LLM_PROVIDERS: {}
+TRACING:
+  SINK: noop
+"""
+    config_file = tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False)
+    config_file.write(config)
+    config_file.close()
+    return config_file.name
+
+
+def make_chunks(tokens, json_output):
+    from litellm.types.utils import Delta, ModelResponseStream, StreamingChoices
+    if json_output:
+        words = ['{"items": ['] + [f'"word {i}", ' for i in range(tokens - 2)] + ['"end"]}']
+    else:
+        words = [f"word{i} " for i in range(tokens)]
+    chunks = [ModelResponseStream(choices=[StreamingChoices(index=0, delta=Delta(content=word, role='assistant'),
+                                                            finish_reason=None)])
+              for word in words]
+    chunks.append(ModelResponseStream(choices=[StreamingChoices(index=0, delta=Delta(content=None),
+                                                                finish_reason='stop')]))
+    return chunks
+
+
+def fake_acompletion(chunks):
+    async def acompletion(**kwargs):
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+
+        return stream()
+
+    return acompletion
+
+
+async def consume(llm, **kwargs):
+    from tinyllm.util.message import UserMessage
+    start = time.perf_counter()
+    count = 0
+    async for message in llm(messages=[UserMessage('Hi')], **kwargs):
+        assert message['status'] == 'success'
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tokens', type=int, nargs='+', default=[500, 2000, 8000])
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ['TINYLLM_CONFIG_PATH'] = write_config()
+    from tinyllm.llms.lite_llm_stream import LiteLLMStream
+
+    llm = LiteLLMStream(name='bench_stream')
+    print(f"best of {args.rounds} rounds, chunks/s (1 token per chunk)")
+    print(f"{'tokens':>8} {'text':>12} {'json mode':>12}")
+    for tokens in args.tokens:
+        results = []
+        for json_output in [False, True]:
+            kwargs = {'response_format': {'type': 'json_object'}} if json_output else {}
+            with patch('tinyllm.llms.lite_llm.acompletion', fake_acompletion(make_chunks(tokens, json_output))):
+                results.append(max(asyncio.run(consume(llm, **kwargs)) for _ in range(args.rounds)))
+        print(f"{tokens:8} {results[0]:12.0f} {results[1]:12.0f}")
+
+
+if __name__ == '__main__':
+    main()
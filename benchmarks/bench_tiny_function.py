@@ -0,0 +1,124 @@
+"""
+Per-call overhead of a tiny_function with a stub LLM (no network), comparing the compiled function with the
+previous per-call path (parsing the docstring, rendering the system role and building a new Agent on every call).
+Tracing goes to a no-op sink.
+
+    python benchmarks/bench_tiny_function.py --calls 300 --rounds 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+
+def write_config():
+    config = """
+LOGS:
+  LOGGING: false
+  LOG_STATES: []
+LLM_PROVIDERS: {}
+TRACING:
+  SINK: noop
+"""
+    config_file = tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False)
+    config_file.write(config)
+    config_file.close()
+    return config_file.name
+
+
+async def stub_acompletion(**kwargs):
+    from litellm import ModelResponse
+    return ModelResponse(choices=[{'message': {'role': 'assistant', 'content': json.dumps({'risk_score': 0.2})},
+                                   'finish_reason': 'stop'}],
+                         usage={'prompt_tokens': 100, 'completion_tokens': 10, 'total_tokens': 110})
+
+
+async def calculate_risk_score(bank_account_history: str, employment_history: str):
+    """
+    <system>
+    Extract a Risk Score between 0 and 1 for a Credit Card application based on bank account and employment history.
+    </system>
+
+    <prompt>
+    Given the bank account history: {bank_account_history}
+    And the employment history: {employment_history}
+    Calculate the risk score for a credit card application.
+    </prompt>
+    """
+    pass
+
+
+def previous_prepare(output_model, **kwargs):
+    # The work the wrapper used to do on every call before calling the Agent
+    from tinyllm.agent.agent import Agent
+    from tinyllm.llms.tiny_function import get_system_role
+    from tinyllm.util.parse_util import extract_html
+    system_role = get_system_role(func=calculate_risk_score, output_model=output_model)
+    prompt = extract_html(calculate_risk_score.__doc__.strip(), tag='prompt')[0]
+    agent = Agent(name='calculate_risk_score', system_role=system_role)
+    return agent, prompt.format(**kwargs)
+
+
+def compiled_prepare(compiled, **kwargs):
+    return compiled.agent, compiled.render_prompt(**kwargs)
+
+
+async def previous_call(output_model, **kwargs):
+    # Compiling on every call redoes all the per-call work of the previous wrapper
+    from tinyllm.llms.tiny_function import tiny_function
+    return await tiny_function(output_model=output_model)(calculate_risk_score)(**kwargs)
+
+
+async def run_calls(call, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        await call(bank_account_history=f"salary {i}", employment_history="engineer")
+    return (time.perf_counter() - start) / calls
+
+
+def time_prepare(prepare, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        prepare(bank_account_history=f"salary {i}", employment_history="engineer")
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ['TINYLLM_CONFIG_PATH'] = write_config()
+    from pydantic import BaseModel
+    from tinyllm.llms.tiny_function import tiny_function
+
+    class RiskScoreOutput(BaseModel):
+        risk_score: float
+
+    compiled = tiny_function(output_model=RiskScoreOutput)(calculate_risk_score)
+
+    previous_prepare_time = min(time_prepare(lambda **kwargs: previous_prepare(RiskScoreOutput, **kwargs), args.calls)
+                                for _ in range(args.rounds))
+    compiled_prepare_time = min(time_prepare(lambda **kwargs: compiled_prepare(compiled.compiled, **kwargs),
+                                             args.calls)
+                                for _ in range(args.rounds))
+
+    # Interleave rounds and keep the best of each, to limit noise
+    previous, current = [], []
+    with patch('tinyllm.llms.lite_llm.acompletion', stub_acompletion):
+        for _ in range(args.rounds):
+            previous.append(asyncio.run(run_calls(lambda **kwargs: previous_call(RiskScoreOutput, **kwargs),
+                                                  args.calls)))
+            current.append(asyncio.run(run_calls(compiled, args.calls)))
+
+    print(f"calls: {args.calls}, best of {args.rounds} rounds")
+    print(f"{'':18} {'prepare (us)':>14} {'end to end (us)':>16}")
+    print(f"{'per-call Agent':18} {previous_prepare_time * 1e6:14.1f} {min(previous) * 1e6:16.1f}")
+    print(f"{'compiled':18} {compiled_prepare_time * 1e6:14.1f} {min(current) * 1e6:16.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Token counting throughput of the cached TokenCounter against the previous path (tiktoken.get_encoding and a
+full encode on every call).
+
+    python benchmarks/bench_token_count.py --documents 2000 --repeats 5
+"""
+import argparse
+import random
+import string
+import time
+
+import tiktoken
+
+
+def previous_num_tokens_from_string(text, encoding_name='cl100k_base'):
+    encoding = tiktoken.get_encoding(encoding_name)
+    return len(encoding.encode(text))
+
+
+def make_documents(count, words):
+    random.seed(0)
+    return [' '.join(''.join(random.choices(string.ascii_lowercase, k=random.randint(2, 9)))
+                     for _ in range(words))
+            for _ in range(count)]
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=200)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    from tinyllm.util.helpers import TokenCounter
+    documents = make_documents(args.documents, args.words)
+    counter = TokenCounter(cache_size=args.documents)
+
+    previous = timed(lambda: [previous_num_tokens_from_string(document)
+                              for _ in range(args.repeats) for document in documents])
+    repeated = timed(lambda: [counter.count(document) for _ in range(args.repeats) for document in documents])
+    counter.clear()
+    cold = timed(lambda: [counter.count(document) for document in documents])
+    warm = timed(lambda: [counter.count(document) for document in documents])
+    counter.clear()
+    batch = timed(lambda: counter.count_batch(documents))
+
+    calls = args.documents * args.repeats
+    print(f"documents: {args.documents} x {args.words} words, repeated {args.repeats} times")
+    print(f"previous path:        {previous / calls * 1e6:10.1f} us/count")
+    print(f"counter, cold cache:  {cold / args.documents * 1e6:10.1f} us/count")
+    print(f"counter, warm cache:  {warm / args.documents * 1e6:10.1f} us/count")
+    print(f"count_batch, cold:    {batch / args.documents * 1e6:10.1f} us/count")
+    print(f"speedup (repeated):   {previous / repeated:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Per-call tracing overhead of a trivial Function against a local stub Langfuse server.
+
+Compares the previous behaviour (flushing the Langfuse client after every call) with the background exporter
+(a single flush at the end).
+
+    python benchmarks/bench_trace_export.py --calls 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLangfuseHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({"successes": [], "errors": []}).encode()
+        self.send_response(207)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubLangfuseHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_config(host):
+    config = f"""
+LOGS:
+  LOGGING: false
+  LOG_STATES: []
+LLM_PROVIDERS: {{}}
+LANGFUSE:
+  PROJECT_ID: bench
+  PUBLIC_KEY: pk-lf-bench
+  SECRET_KEY: sk-lf-bench
+  HOST: {host}
+"""
+    config_file = tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False)
+    config_file.write(config)
+    config_file.close()
+    return config_file.name
+
+
+async def run_calls(function, calls, flush_each_call):
+    import tinyllm
+    start = time.perf_counter()
+    for i in range(calls):
+        await function(value=i)
+        if flush_each_call:
+            tinyllm.langfuse_client.flush()
+    tinyllm.flush_traces()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_stub_server()
+    os.environ['TINYLLM_CONFIG_PATH'] = write_config(f"http://127.0.0.1:{server.server_address[1]}")
+
+    from tinyllm.function import Function
+    function = Function(name='Bench: trace export')
+
+    flush_each_call = asyncio.run(run_calls(function, args.calls, flush_each_call=True))
+    background = asyncio.run(run_calls(function, args.calls, flush_each_call=False))
+
+    print(f"calls: {args.calls}")
+    print(f"flush after each call: {flush_each_call * 1e6:10.1f} us/call")
+    print(f"background exporter:   {background * 1e6:10.1f} us/call")
+    print(f"speedup:               {flush_each_call / background:10.1f}x")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,442 @@
+"""
+End-to-end benchmark suite of the hot paths, offline: LLM calls go to the mock provider (mock/ models) and tracing
+to a no-op sink. Each benchmark reports the time per operation (median, mean, min and standard deviation over
+rounds) and can be saved as JSON, then compared with a saved baseline.
+
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --compare baseline.json --threshold 0.1
+    python benchmarks/suite.py --only stream agent --rounds 3
+
+With --compare, benchmarks whose median is more than threshold slower than the baseline are reported as regressions
+and the exit code is 1.
+"""
+import argparse
+import asyncio
+import datetime as dt
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = {}
+
+
+def benchmark(name, description):
+    def decorator(func):
+        func.description = description
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+def write_config():
+    config = """
+LOGS:
+  LOGGING: false
+  LOG_STATES: []
+LLM_PROVIDERS: {}
+TRACING:
+  SINK: noop
+"""
+    config_file = tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False)
+    config_file.write(config)
+    config_file.close()
+    return config_file.name
+
+
+def summarize(timings, number, **extra):
+    per_op = [timing / number for timing in timings]
+    return {
+        'median': statistics.median(per_op),
+        'mean': statistics.mean(per_op),
+        'min': min(per_op),
+        'stdev': statistics.stdev(per_op) if len(per_op) > 1 else 0.0,
+        'rounds': len(per_op),
+        'number': number,
+        **extra,
+    }
+
+
+def measure(func, rounds, number, setup=None, **extra):
+    """
+    Calls func number times per round and returns the time per call. setup runs before each call, untimed.
+    """
+    if setup is not None:
+        setup()
+    func()  # Warm up
+    timings = []
+    for _ in range(rounds):
+        elapsed = 0.0
+        for _ in range(number):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func()
+            elapsed += time.perf_counter() - start
+        timings.append(elapsed)
+    return summarize(timings, number, **extra)
+
+
+def measure_async(loop, func, rounds, number, **extra):
+    """
+    Awaits func() number times per round, in one event loop, and returns the time per call.
+    """
+
+    async def run_round():
+        start = time.perf_counter()
+        for _ in range(number):
+            await func()
+        return time.perf_counter() - start
+
+    loop.run_until_complete(func())  # Warm up
+    timings = [loop.run_until_complete(run_round()) for _ in range(rounds)]
+    return summarize(timings, number, **extra)
+
+
+def make_text(rng, words):
+    return ' '.join(rng.choice(['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta'])
+                    for _ in range(words))
+
+
+@benchmark('function_call', 'Function.__call__ of a no-op Function, and its cost per state transition')
+def bench_function_call(args, loop):
+    from tinyllm.function import Function
+
+    class NoOp(Function):
+        transitions = 0
+
+        def transition(self, new_state, msg=None):
+            NoOp.transitions += 1
+            super().transition(new_state, msg)
+
+        async def run(self, **kwargs):
+            return kwargs
+
+    function = NoOp(name='bench_noop')
+
+    def call():
+        return function(value=1)
+
+    loop.run_until_complete(call())
+    NoOp.transitions = 0
+    loop.run_until_complete(call())
+    transitions = NoOp.transitions
+    result = measure_async(loop, call, args.rounds, args.number * 10)
+    result['transitions'] = transitions
+    result['per_transition'] = result['median'] / transitions
+    return result
+
+
+@benchmark('nested_function_call', 'A Function calling 3 nested Functions with typed validators, by validation mode')
+def bench_nested_function_call(args, loop):
+    import tinyllm
+    from tinyllm.function import Function
+    from tinyllm.validator import Validator
+
+    class Payload(Validator):
+        value: float
+        text: str
+
+    class Nested(Function):
+        def __init__(self, child=None, **kwargs):
+            super().__init__(input_validator=Payload, output_validator=Payload, processed_output_validator=Payload,
+                             **kwargs)
+            self.child = child
+
+        async def run(self, **kwargs):
+            if self.child is None:
+                return kwargs
+            return (await self.child(**kwargs))['output']
+
+    nested_calls = 3
+    function = None
+    for depth in range(nested_calls + 1):
+        function = Nested(child=function, name=f'bench_nested_{depth}')
+
+    def call():
+        return function(value=1.0, text='text')
+
+    async def run_round():
+        start = time.perf_counter()
+        for _ in range(args.number):
+            await call()
+        return time.perf_counter() - start
+
+    # Rounds of the three modes are interleaved, so that drifts of the machine's speed affect them alike
+    modes = ['strict', 'boundary', 'off']
+    timings = {mode: [] for mode in modes}
+    validation_mode = tinyllm.validation_mode
+    try:
+        for round_index in range(args.rounds + 1):
+            for mode in modes:
+                tinyllm.validation_mode = mode
+                elapsed = loop.run_until_complete(run_round())
+                # The first round warms up
+                if round_index > 0:
+                    timings[mode].append(elapsed)
+    finally:
+        tinyllm.validation_mode = validation_mode
+
+    results = {mode: summarize(mode_timings, args.number) for mode, mode_timings in timings.items()}
+    result = results['strict']
+    result['boundary'] = results['boundary']['median']
+    result['off'] = results['off']['median']
+    result['saved_per_nested_call'] = (result['median'] - result['boundary']) / nested_calls
+    return result
+
+
+@benchmark('litellm_stream', 'LiteLLMStream over a 2000 chunk mock stream, per chunk')
+def bench_litellm_stream(args, loop):
+    from tinyllm.llms.lite_llm_stream import LiteLLMStream
+    from tinyllm.llms.mock_provider import MockModelSettings, MockProvider, set_mock_provider
+    from tinyllm.util.message import UserMessage
+
+    chunks = 2000
+    provider = MockProvider(settings=MockModelSettings(chunk_size=4))
+    provider.add_response('word' * chunks)
+    set_mock_provider(provider)
+    llm = LiteLLMStream(name='bench_stream')
+
+    async def consume():
+        async for _ in llm(messages=[UserMessage('Hi')], model='mock/bench'):
+            pass
+
+    result = measure_async(loop, consume, args.rounds, 1)
+    set_mock_provider(None)
+    return {**result, **{key: result[key] / (chunks + 1) for key in ['median', 'mean', 'min', 'stdev']},
+            'chunks': chunks + 1}
+
+
+def run_agent_hops(args, loop, hops):
+    from tinyllm.agent.agent import Agent
+    from tinyllm.agent.tool import Toolkit
+    from tinyllm.agent.tool.tool import Tool
+    from tinyllm.llms.mock_provider import MockProvider, MockToolCall, set_mock_provider
+
+    def tool_hops_left(kwargs):
+        # Tool results since the last user message
+        done = 0
+        for message in reversed(kwargs['messages']):
+            if message['role'] == 'user':
+                break
+            done += message['role'] == 'tool'
+        return done < hops
+
+    provider = MockProvider()
+    provider.add_response(MockToolCall('lookup', {'key': 'answer'}), match=tool_hops_left)
+    provider.add_response('The answer is 42')
+    set_mock_provider(provider)
+    toolkit = Toolkit(name='Toolkit', tools=[Tool(
+        name='lookup',
+        description='Looks up a value',
+        python_lambda=lambda key: '42',
+        parameters={'type': 'object', 'properties': {'key': {'type': 'string'}}, 'required': ['key']},
+    )])
+    agent = Agent(name='bench_agent', toolkit=toolkit)
+
+    async def run():
+        result = await agent(content='What is the answer?', model='mock/bench')
+        assert result['status'] == 'success', result
+
+    result = measure_async(loop, run, args.rounds, args.number, hops=hops)
+    set_mock_provider(None)
+    return result
+
+
+@benchmark('agent_1_tool_hop', 'Agent.__call__ with 1 tool call before the answer')
+def bench_agent_1_hop(args, loop):
+    return run_agent_hops(args, loop, 1)
+
+
+@benchmark('agent_5_tool_hops', 'Agent.__call__ with 5 sequential tool calls before the answer')
+def bench_agent_5_hops(args, loop):
+    return run_agent_hops(args, loop, 5)
+
+
+@benchmark('prompt_manager_format', 'PromptManager.format_messages with 10k messages in memory')
+def bench_prompt_manager(args, loop):
+    from tinyllm.memory.memory import BufferMemory
+    from tinyllm.prompt_manager import PromptManager
+    from tinyllm.util.message import AssistantMessage, UserMessage
+
+    rng = random.Random(0)
+    memory = BufferMemory(buffer_size=10000)
+    memory.memories = [(UserMessage if i % 2 == 0 else AssistantMessage)(make_text(rng, 30)) for i in range(10000)]
+    prompt_manager = PromptManager(system_role='You are a helpful assistant', memory=memory)
+    messages = [UserMessage('Hi')]
+    return measure_async(loop, lambda: prompt_manager.format_messages(messages), args.rounds, args.number,
+                         memories=len(memory.memories))
+
+
+@benchmark('count_tokens_cold', 'count_tokens of 1000 messages, empty token count cache')
+def bench_count_tokens_cold(args, loop):
+    from tinyllm.util.helpers import count_tokens, token_counter
+
+    rng = random.Random(0)
+    messages = [{'role': 'user', 'content': make_text(rng, 50)} for _ in range(1000)]
+    return measure(lambda: count_tokens(messages, model='gpt-4o-mini'), args.rounds, args.number,
+                   setup=token_counter.clear, messages=len(messages))
+
+
+@benchmark('count_tokens_warm', 'count_tokens of 1000 messages already in the token count cache')
+def bench_count_tokens_warm(args, loop):
+    from tinyllm.util.helpers import count_tokens
+
+    rng = random.Random(0)
+    messages = [{'role': 'user', 'content': make_text(rng, 50)} for _ in range(1000)]
+    count_tokens(messages, model='gpt-4o-mini')
+    return measure(lambda: count_tokens(messages, model='gpt-4o-mini'), args.rounds, args.number * 10,
+                   messages=len(messages))
+
+
+@benchmark('example_selector_10k', 'ExampleSelector.__call__ over 10k examples with 384 dimension embeddings')
+def bench_example_selector(args, loop):
+    import numpy as np
+    from tinyllm.examples.example_selector import ExampleSelector
+
+    rng = np.random.default_rng(0)
+    examples = [{'user': f"Question {i}", 'assistant': f"Answer {i}"} for i in range(10000)]
+    query_embedding = rng.random((1, 384)).tolist()
+
+    async def embedding_function(text):
+        return query_embedding
+
+    selector = ExampleSelector(name='bench_example_selector', examples=examples,
+                               embeddings=rng.random((10000, 384)).tolist(),
+                               embedding_function=embedding_function)
+    return measure_async(loop, lambda: selector(input='Find a relevant example', k=5), args.rounds, args.number,
+                         examples=len(examples))
+
+
+@benchmark('document_store_fit', 'DocumentStore.fit_store of 3 sources of 1000 documents')
+def bench_document_store(args, loop):
+    from tinyllm.rag.document.document import Document
+    from tinyllm.rag.document.store import DocumentStore
+
+    rng = random.Random(0)
+    sources = {f"source_{i}": [Document(content=make_text(rng, 40), metadata={'index': j}) for j in range(1000)]
+               for i in range(3)}
+    store = DocumentStore()
+
+    def reset():
+        # fit_store keeps the documents that fit, so every call starts from the full sources
+        store.store = {name: list(docs) for name, docs in sources.items()}
+
+    return measure(lambda: store.fit_store(context_size=60000, weights=[0.5, 0.3, 0.2]), args.rounds, args.number,
+                   setup=reset, documents=3000)
+
+
+@benchmark('reranker_rerank', 'ReRanker.rerank of 1000 documents with 384 dimension embeddings, top 10')
+def bench_reranker(args, loop):
+    import numpy as np
+    from tinyllm.rag.document.document import Document
+    from tinyllm.rag.rerank import ReRanker
+
+    rng = random.Random(0)
+    embeddings = np.random.default_rng(0).random((1000, 384)).tolist()
+    docs = [Document(content=f"{i} {make_text(rng, 40)}", embeddings=embeddings[i]) for i in range(1000)]
+    reranker = ReRanker(docs=docs, scores=[1.0] * len(docs))
+    return measure(lambda: reranker.rerank(top_n=10), args.rounds, args.number, documents=len(docs))
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(names, args):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = {}
+    for name in names:
+        try:
+            results[name] = BENCHMARKS[name](args, loop)
+            results[name]['description'] = BENCHMARKS[name].description
+        except ImportError as error:
+            # Optional dependencies (like smartpy for the reranker) may be missing
+            results[name] = {'skipped': str(error), 'description': BENCHMARKS[name].description}
+        print(format_result(name, results[name]), flush=True)
+    loop.close()
+    return results
+
+
+def format_time(seconds):
+    for unit, scale in [('s', 1), ('ms', 1e-3), ('us', 1e-6)]:
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def format_result(name, result):
+    if 'skipped' in result:
+        return f"{name:24} skipped: {result['skipped']}"
+    return f"{name:24} {format_time(result['median']):>12} median  {format_time(result['min']):>12} min  " \
+           f"+/- {format_time(result['stdev'])}"
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns {name: (baseline median, median, relative change, status)} for benchmarks in both runs.
+    """
+    comparison = {}
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None or 'skipped' in result or 'skipped' in previous:
+            continue
+        change = (result['median'] - previous['median']) / previous['median']
+        status = 'regression' if change > threshold else 'improvement' if change < -threshold else 'unchanged'
+        comparison[name] = (previous['median'], result['median'], change, status)
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--only', nargs='+', help='run the benchmarks whose name contains one of these strings')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--number', type=int, default=20, help='operations per round')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown reported as a regression')
+    args = parser.parse_args()
+
+    os.environ['TINYLLM_CONFIG_PATH'] = write_config()
+    names = [name for name in BENCHMARKS if not args.only or any(pattern in name for pattern in args.only)]
+    results = run_benchmarks(names, args)
+
+    report = {
+        'meta': {
+            'timestamp': dt.datetime.now().isoformat(),
+            'commit': get_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rounds': args.rounds,
+            'number': args.number,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        comparison = compare(results, baseline, args.threshold)
+        print(f"\ncompared with {args.compare} (commit {baseline.get('meta', {}).get('commit')})")
+        for name, (previous, current, change, status) in comparison.items():
+            print(f"{name:24} {format_time(previous):>12} -> {format_time(current):>12} {change:+8.1%}  {status}")
+        if any(status == 'regression' for *_, status in comparison.values()):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
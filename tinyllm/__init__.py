@@ -2,28 +2,39 @@ import yaml
 import os
 import pyperclip
 
-from langfuse import Langfuse
+from tinyllm.llms.cache import create_response_cache
+from tinyllm.llms.rate_limiter import create_rate_limiter
+from tinyllm.tracing.exporter import BackgroundExporter
+from tinyllm.tracing.sampling import create_sampling_tracer
+from tinyllm.tracing.tracer import LangfuseTracer, create_tracer
+from tinyllm.util.log_util import configure_logger
+from tinyllm.validator import VALIDATION_MODES
 
 import logging
-from logging import StreamHandler, Formatter
 from pathlib import Path
 
 tinyllm_logger = logging.getLogger('tinyllm')
 tinyllm_logger.propagate = False
-tinyllm_logger.setLevel(logging.DEBUG)
-formatter = Formatter('%(levelname)s | %(name)s | %(asctime)s : %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-ch = StreamHandler()
-ch.setLevel(logging.DEBUG)
-ch.setFormatter(formatter)
-tinyllm_logger.addHandler(ch)
+# Text logs to stderr at DEBUG until the config sets LOGS.LEVEL, FORMAT and HANDLER
+configure_logger(tinyllm_logger, {})
 
 
 
 global tinyllm_config
 global langfuse_client
+global tracer
+global trace_exporter
+global response_cache
+global rate_limiter
+global validation_mode
 
 tinyllm_config = None
 langfuse_client = None
+tracer = None
+trace_exporter = None
+response_cache = None
+rate_limiter = None
+validation_mode = 'strict'
 
 def load_yaml_config(yaml_file_path: str) -> dict:
     config = None
@@ -46,23 +57,60 @@ def set_config(file_path: str):
 
     global tinyllm_config
     global langfuse_client
+    global tracer
+    global trace_exporter
+    global response_cache
+    global rate_limiter
+    global validation_mode
 
     # Load config file
 
     tinyllm_config = load_yaml_config(file_path)
 
+    # Log level, text or JSON format, and stream or background queue handler (LOGS)
+    configure_logger(tinyllm_logger, tinyllm_config.get('LOGS') or {})
+
     # Set LLM providers env vars from the config file
     for provider_key in tinyllm_config['LLM_PROVIDERS'].keys():
         os.environ[provider_key] = tinyllm_config['LLM_PROVIDERS'][provider_key]
 
-    # Initialize Langfuse client
-    langfuse_client = Langfuse(
-        public_key=tinyllm_config['LANGFUSE']['PUBLIC_KEY'],
-        secret_key=tinyllm_config['LANGFUSE']['SECRET_KEY'],
-        host=tinyllm_config['LANGFUSE']['HOST'],
-        flush_interval=0.1,
+    # Initialize the tracer: Langfuse by default, or a local sink (TRACING.SINK)
+    tracer = create_tracer(tinyllm_config)
+    langfuse_client = tracer.client if isinstance(tracer, LangfuseTracer) else None
+    # Optional head or tail sampling (TRACING.SAMPLING)
+    tracer = create_sampling_tracer(tracer, tinyllm_config)
+
+    # Tracing operations are exported in the background, flushed at exit or with flush_traces(). The operations
+    # queued for the previous tracer are exported before its thread stops
+    if trace_exporter is not None:
+        trace_exporter.shutdown()
+    exporter_config = (tinyllm_config.get('LANGFUSE') or {}).get('EXPORTER') or {}
+    trace_exporter = BackgroundExporter(
+        client=tracer,
+        max_queue_size=exporter_config.get('MAX_QUEUE_SIZE', 10000),
     )
 
+    # Optional cache of LLM responses (LLM.CACHE)
+    response_cache = create_response_cache(tinyllm_config)
+
+    # Optional client side RPM/TPM limits by model (LLM.RATE_LIMITS)
+    rate_limiter = create_rate_limiter(tinyllm_config)
+
+    # strict, boundary or off (VALIDATION.MODE)
+    validation_mode = (tinyllm_config.get('VALIDATION') or {}).get('MODE') or 'strict'
+    if validation_mode not in VALIDATION_MODES:
+        raise ValueError(f"Unknown validation mode: {validation_mode}")
+
+
+def flush_traces():
+    trace_exporter.flush()
+
+
+def set_tracer(new_tracer):
+    global tracer
+    tracer = new_tracer
+    trace_exporter.client = new_tracer
+
 
 def find_yaml_config(yaml_file_name: str, directories: list) -> dict:
     for directory in directories:
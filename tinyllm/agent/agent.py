@@ -12,7 +12,8 @@ from tinyllm.llms.lite_llm import LiteLLM
 from tinyllm.memory.memory import Memory, BufferMemory
 from tinyllm.prompt_manager import PromptManager, MaxTokensStrategy
 from tinyllm.util.message import Content, UserMessage, ToolMessage, AssistantMessage
-from tinyllm.validator import Validator
+from tinyllm.util.parse_util import parse_json
+from tinyllm.validator import Validator, validate_init
 
 
 class AgentInitValidator(Validator):
@@ -64,16 +65,17 @@ class Agent(Function):
                  brain: Brain = None,
                  **kwargs):
 
-        AgentInitValidator(system_role=system_role,
-                           llm=llm,
-                           toolkit=toolkit,
-                           memory=memory,
-                           example_manager=example_manager,
-                           initial_user_message_text=initial_user_message_text,
-                           tool_retries=tool_retries,
-                           output_model=output_model,
-                           brain=brain,
-                           prompt_manager=None)
+        validate_init(AgentInitValidator,
+                      system_role=system_role,
+                      llm=llm,
+                      toolkit=toolkit,
+                      memory=memory,
+                      example_manager=example_manager,
+                      initial_user_message_text=initial_user_message_text,
+                      tool_retries=tool_retries,
+                      output_model=output_model,
+                      brain=brain,
+                      prompt_manager=None)
         super().__init__(
             input_validator=AgentInputValidator,
             **kwargs
@@ -129,7 +131,8 @@ class Agent(Function):
                     tool_call_msg = response_msg['output']['response']['choices'][0]['message']
                     await self.prompt_manager.add_memory(message=AssistantMessage(content='',
                                                                                   tool_calls=tool_call_msg[
-                                                                                      'tool_calls']))
+                                                                                      'tool_calls'],
+                                                                                  validate=False))
 
                     tool_calls = tool_call_msg.get('tool_calls', [])
                     tool_results = await self.toolkit(
@@ -143,7 +146,8 @@ class Agent(Function):
                     # Format for next openai call
                     tool_call_messages = [ToolMessage(name=tool_result['name'],
                                                       content=pprint.pformat(tool_result['content']),
-                                                      tool_call_id=tool_call['id']) for tool_result, tool_call in
+                                                      tool_call_id=tool_call['id'],
+                                                      validate=False) for tool_result, tool_call in
                                           zip(tool_results['output']['tool_results'], tool_calls)]
 
                     # Set next input
@@ -155,15 +159,14 @@ class Agent(Function):
                     if self.output_model is None:
                         msg_content = response_msg['output']['response']['choices'][0]['message']['content']
                         await self.prompt_manager.add_memory(
-                            message=AssistantMessage(msg_content)
+                            message=AssistantMessage(msg_content, validate=False)
                         )
                         return {'response': response_msg['output']['response']}
                     else:
                         msg_content = response_msg['output']['response']['choices'][0]['message']['content']
-                        msg_content = msg_content.replace('```json', '').replace('```', '')
-                        parsed_output = json.loads(msg_content)
+                        parsed_output = parse_json(msg_content)
                         await self.prompt_manager.add_memory(
-                            message=AssistantMessage(msg_content)
+                            message=AssistantMessage(msg_content, validate=False)
                         )
                         return {'response': self.output_model(**parsed_output)}
 
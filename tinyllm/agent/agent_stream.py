@@ -1,5 +1,7 @@
-import json
-from typing import Optional
+import asyncio
+from typing import Optional, Type
+
+from pydantic import BaseModel
 
 from tinyllm.agent.agent import AgentInitValidator, AgentInputValidator
 from tinyllm.agent.tool import Toolkit
@@ -10,7 +12,10 @@ from tinyllm.llms.lite_llm_stream import LiteLLMStream
 from tinyllm.memory.memory import BufferMemory, Memory
 from tinyllm.prompt_manager import PromptManager
 from tinyllm.util.helpers import get_openai_message
+from tinyllm.util.json_stream import validate_partial
+from tinyllm.util.parse_util import parse_json
 from tinyllm.util.message import UserMessage, AssistantMessage, ToolMessage
+from tinyllm.validator import validate_init
 
 
 class AgentStream(FunctionStream):
@@ -23,19 +28,26 @@ class AgentStream(FunctionStream):
                  toolkit: Optional[Toolkit] = None,
                  initial_user_message_text: Optional[str] = None,
                  tool_retries: int = 3,
+                 prompt_manager: Optional[PromptManager] = None,
+                 output_model: Optional[Type[BaseModel]] = None,
+                 speculative_tools: bool = False,
                  **kwargs):
-        AgentInitValidator(system_role=system_role,
-                           llm=llm,
-                           toolkit=toolkit,
-                           memory=memory,
-                           example_manager=example_manager,
-                           initial_user_message_text=initial_user_message_text,
-                           tool_retries=tool_retries
-                           )
+        validate_init(AgentInitValidator,
+                      system_role=system_role,
+                      llm=llm,
+                      toolkit=toolkit,
+                      memory=memory,
+                      example_manager=example_manager,
+                      initial_user_message_text=initial_user_message_text,
+                      tool_retries=tool_retries,
+                      output_model=output_model,
+                      prompt_manager=None
+                      )
         super().__init__(
             input_validator=AgentInputValidator,
             **kwargs)
         self.system_role = system_role
+        self.output_model = output_model
         self.llm = llm or LiteLLMStream()
         self.toolkit = toolkit
         self.example_manager = example_manager
@@ -44,66 +56,136 @@ class AgentStream(FunctionStream):
             example_manager=example_manager,
             memory=memory or BufferMemory(),
             initial_user_message_text=initial_user_message_text,
-        )
+        ) if prompt_manager is None else prompt_manager
         self.tool_retries = tool_retries
+        # Start idempotent tools as soon as their call is parsed, before the end of the stream
+        self.speculative_tools = speculative_tools
+        self.speculated = 0
+        self.reused = 0
+        self.cancelled = 0
+
+    @property
+    def speculation_stats(self):
+        return {
+            'speculated': self.speculated,
+            'reused': self.reused,
+            'cancelled': self.cancelled,
+        }
 
     async def run(self,
                   **kwargs):
 
-        input_msg = UserMessage(kwargs['content'])
+        input_msgs = [UserMessage(kwargs['content'])]
 
         while True:
-            kwargs = await self.prompt_manager.prepare_llm_request(message=input_msg,
-                                                                   **kwargs)
-
-            async for msg in self.llm(tools=self.toolkit.as_dict_list() if self.toolkit else None,
-                                      **kwargs):
-                yield msg
-
-            await self.prompt_manager.add_memory(message=input_msg)
-
-            # Process the last message
-            if msg['status'] == 'success':
-                msg_output = msg['output']
-
-                # Agent decides to call a tool
-                if msg_output['type'] == 'tool':
-                    input_msg = await self.get_tool_message(msg_output)
-                elif msg_output['type'] == 'assistant':
-                    break
-
-            else:
-                raise Exception(msg['message'])
-
-    async def get_tool_message(self,
-                               msg_output):
-        api_tool_call = msg_output['last_completion_delta']['tool_calls'][0]
-        msg_output['last_completion_delta'].pop('function_call')
-
-        # Memorize tool call with arguments
-        json_tool_call = {
-            'name': msg_output['completion']['name'],
-            'arguments': msg_output['completion']['arguments']
-        }
-        api_tool_call['function'] = json_tool_call
-        msg_output['last_completion_delta']['content'] = ''
+            request_kwargs = await self.prompt_manager.prepare_llm_request(messages=input_msgs,
+                                                                           json_model=self.output_model,
+                                                                           **kwargs)
+
+            # Speculative tool calls by id: (call, task)
+            speculative_calls = {}
+            partial_output, partial_members = {}, 0
+            try:
+                async for msg in self.llm(tools=self.toolkit.as_dict_list() if self.toolkit else None,
+                                          **request_kwargs):
+                    if self.speculative_tools and msg['status'] == 'success':
+                        for tool_call in msg['output']['completed_tool_calls']:
+                            if self.can_speculate(tool_call):
+                                speculative_calls[tool_call['id']] = (tool_call,
+                                                                      asyncio.ensure_future(self.call_tool(tool_call)))
+                                self.speculated += 1
+
+                    # Structured outputs: expose the fields that are complete and valid so far. They only change
+                    # when a top level member is complete.
+                    if self.output_model is not None and msg['status'] == 'success' and \
+                            msg['output']['type'] == 'assistant' and msg['output']['partial_json'] is not None:
+                        partial_json = msg['output']['partial_json']
+                        if partial_json['members'] != partial_members:
+                            partial_members = partial_json['members']
+                            partial_output = validate_partial(self.output_model,
+                                                              partial_json['value'],
+                                                              partial_json['pending_key'])
+                        msg['output']['partial_output'] = partial_output
+                    yield msg
+
+                for input_msg in input_msgs:
+                    await self.prompt_manager.add_memory(message=input_msg)
+
+                # Process the last message
+                if msg['status'] == 'success':
+                    msg_output = msg['output']
+
+                    # Agent decides to call tools
+                    if msg_output['type'] == 'tool':
+                        input_msgs = await self.get_tool_messages(msg_output, speculative_calls)
+                    elif msg_output['type'] == 'assistant':
+                        break
+
+                else:
+                    raise Exception(msg['message'])
+            finally:
+                # Speculative calls that weren't used, whether the stream failed, was closed by the consumer or
+                # ended with an answer
+                for _, task in speculative_calls.values():
+                    task.cancel()
+                    self.cancelled += 1
+
+    def can_speculate(self,
+                      tool_call):
+        tool = self.toolkit.get_tool(tool_call['name']) if self.toolkit else None
+        return tool is not None and tool.idempotent and tool_call['id'] is not None
+
+    async def call_tool(self,
+                        tool_call):
+        return await self.toolkit(tool_calls=[{
+            'name': tool_call['name'],
+            'arguments': tool_call['arguments']
+        }])
+
+    async def get_tool_messages(self,
+                                msg_output,
+                                speculative_calls):
+        # Memorize tool calls with their arguments
+        tool_calls = msg_output['tool_calls']
         await self.prompt_manager.add_memory(message=AssistantMessage(content='',
-                                                                      tool_calls=msg_output['last_completion_delta']['tool_calls']))
-
-        # Memorize tool result
-        tool_results = await self.toolkit(
-            tool_calls=[{
-                'name': api_tool_call['function']['name'],
-                'arguments': json.loads(api_tool_call['function']['arguments'])
-            }])
-        tool_result = tool_results['output']['tool_results'][0]
-        tool_call_result_msg = get_openai_message(
-            name=tool_result['name'],
-            role='tool',
-            content=tool_result['content'],
-            tool_call_id=api_tool_call['id']
-        )
-
-        tool_call_result_msg.pop('role')
-
-        return ToolMessage(**tool_call_result_msg)
+                                                                      tool_calls=tool_calls,
+                                                                      validate=False))
+
+        # Run every call concurrently. Speculative results are reused if the final call is the one they started
+        # with, and cancelled otherwise.
+        tasks = []
+        for tool_call in tool_calls:
+            name, arguments = tool_call['function']['name'], tool_call['function']['arguments']
+            speculative_call, task = speculative_calls.pop(tool_call['id'], (None, None))
+            if speculative_call is not None and speculative_call['name'] == name and \
+                    speculative_call['raw_arguments'] == arguments:
+                self.reused += 1
+            else:
+                if task is not None:
+                    task.cancel()
+                    self.cancelled += 1
+                task = asyncio.ensure_future(self.call_tool({
+                    'name': name,
+                    'arguments': parse_json(arguments) if arguments.strip() else {}
+                }))
+            tasks.append(task)
+        for _, task in speculative_calls.values():
+            task.cancel()
+            self.cancelled += 1
+        speculative_calls.clear()
+
+        # Tool results, in the order of the calls
+        tool_messages = []
+        results = await asyncio.gather(*tasks)
+        for tool_call, tool_results in zip(tool_calls, results):
+            tool_result = tool_results['output']['tool_results'][0]
+            tool_call_result_msg = get_openai_message(
+                name=tool_result['name'],
+                role='tool',
+                content=tool_result['content'],
+                tool_call_id=tool_call['id']
+            )
+            tool_call_result_msg.pop('role')
+            tool_messages.append(ToolMessage(**tool_call_result_msg))
+
+        return tool_messages
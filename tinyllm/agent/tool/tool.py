@@ -8,13 +8,14 @@ from langchain_core.utils.function_calling import convert_to_openai_function, co
 from tinyllm.function import Function
 from tinyllm.tracing.langfuse_context import observation
 from tinyllm.util.helpers import get_openai_message
-from tinyllm.validator import Validator
+from tinyllm.validator import Validator, validate_init
 
 
 class ToolInitValidator(Validator):
     description: str
     parameters: dict
     python_lambda: Callable
+    idempotent: bool
 
 
 
@@ -36,17 +37,22 @@ class Tool(Function):
                  description,
                  parameters,
                  python_lambda,
+                 idempotent: bool = False,
                  **kwargs):
-        ToolInitValidator(
+        validate_init(
+            ToolInitValidator,
             description=description,
             parameters=parameters,
             python_lambda=python_lambda,
+            idempotent=idempotent,
         )
         super().__init__(
             **kwargs)
         self.description = description.strip()
         self.parameters = parameters
         self.python_lambda = python_lambda
+        # Idempotent tools have no side effects, so they can be started speculatively before the LLM response is final
+        self.idempotent = idempotent
 
     def as_dict(self):
         return {
@@ -65,7 +71,7 @@ class Tool(Function):
                 tool_output = await self.python_lambda(**kwargs)
             else:
                 tool_output = self.python_lambda(**kwargs)
-        except:
+        except Exception:
             tool_output = f"""
 <SYSTEM ERROR>
 The tool returned the following error:
@@ -1,5 +1,5 @@
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from tinyllm.agent.tool.tool import Tool
 from tinyllm.function import Function
@@ -31,8 +31,7 @@ class Toolkit(Function):
         tasks = []
 
         for tool_call in kwargs['tool_calls']:
-            name = tool_call['name']
-            tool = [tool for tool in self.tools if tool.name == name][0]
+            tool = self.get_tool(tool_call['name'])
             tasks.append(tool(**tool_call['arguments']))
 
         results = await asyncio.gather(*tasks)
@@ -40,5 +39,8 @@ class Toolkit(Function):
         return {'tool_results': tool_results,
                 'tool_calls': kwargs['tool_calls']}
 
+    def get_tool(self, name) -> Optional[Tool]:
+        return next((tool for tool in self.tools if tool.name == name), None)
+
     def as_dict_list(self):
         return [tool.as_dict() for tool in self.tools]
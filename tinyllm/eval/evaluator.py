@@ -1,7 +1,8 @@
 import pprint
 from typing import Optional, Any, Type, Union
+import tinyllm
 from tinyllm.function import Function
-from tinyllm.validator import Validator
+from tinyllm.validator import Validator, validate_init
 
 
 
@@ -24,7 +25,7 @@ class Evaluator(Function):
     def __init__(self,
                  prefix='',
                  **kwargs):
-        EvaluatorInitValidator(prefix=prefix)
+        validate_init(EvaluatorInitValidator, prefix=prefix)
         super().__init__(output_validator=EvaluatorOutputValidator,
                          input_validator=EvaluatorInputValidator,
                          **kwargs)
@@ -35,7 +36,8 @@ class Evaluator(Function):
     async def process_output(self, **kwargs):
         self.evals = kwargs['evals']
         for name, score in kwargs['evals'].items():
-            self.input['observation'].score(
+            tinyllm.trace_exporter.submit(
+                self.input['observation'].score,
                 name=self.prefix+name,
                 value=score,
                 comment=pprint.pformat(kwargs.get('metadata',{})),
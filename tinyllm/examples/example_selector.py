@@ -3,7 +3,7 @@ from typing import List, Dict, Optional, Callable
 import numpy as np
 
 from tinyllm.function import Function
-from tinyllm.validator import Validator
+from tinyllm.validator import Validator, validate_init
 from tinyllm.util.ai_util import get_top_n_similar_vectors_index
 
 
@@ -33,9 +33,10 @@ class ExampleSelector(Function):
                  examples=[],
                  embeddings=None,
                  **kwargs):
-        ExampleSelectorInitValidator(examples=examples,
-                                     embedding_function=embedding_function,
-                                     embeddings=embeddings)
+        validate_init(ExampleSelectorInitValidator,
+                      examples=examples,
+                      embedding_function=embedding_function,
+                      embeddings=embeddings)
         super().__init__(
             input_validator=InputValidator,
             output_validator=OutputValidator,
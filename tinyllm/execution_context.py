@@ -0,0 +1,121 @@
+import contextvars
+from contextvars import ContextVar
+from functools import wraps
+
+current_execution_context = ContextVar('current_execution_context', default=None)
+
+
+class ExecutionContext:
+    """
+    Holds everything that belongs to a single Function invocation: the state machine position, the
+    input/output payloads and the Langfuse handles. A Function instance reads and writes these attributes
+    through the context of the call it is currently executing, so one instance can serve concurrent calls.
+    """
+
+    __slots__ = ('function', 'parent', 'state', 'input', 'output', 'processed_output',
+                 'observation', 'trace', 'generation', 'state_started', 'state_timings')
+
+    def __init__(self, function, parent=None):
+        self.function = function
+        self.parent = parent
+        self.state = None
+        self.input = None
+        self.output = None
+        self.processed_output = None
+        self.observation = None
+        self.trace = None
+        self.generation = None
+        # perf_counter() at the last transition, and seconds spent in each state so far
+        self.state_started = None
+        self.state_timings = {}
+
+    @classmethod
+    def find(cls, function):
+        # Walk up the chain of running calls to find the innermost one executed by this function
+        context = current_execution_context.get()
+        while context is not None:
+            if context.function is function:
+                return context
+            context = context.parent
+        return None
+
+
+class ContextStep:
+    """
+    Awaits a coroutine with its code running in the given contextvars.Context, like a Task created with that context,
+    without the cost of a Task.
+    """
+
+    __slots__ = ('context', 'coroutine')
+
+    def __init__(self, context: contextvars.Context, coroutine):
+        self.context = context
+        self.coroutine = coroutine
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            try:
+                if error is None:
+                    future = self.context.run(self.coroutine.send, value)
+                else:
+                    future = self.context.run(self.coroutine.throw, error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = (yield future), None
+            except BaseException as e:
+                value, error = None, e
+
+
+def context_property(attribute):
+    def getter(self):
+        return getattr(self.context, attribute)
+
+    def setter(self, value):
+        setattr(self.context, attribute, value)
+
+    return property(getter, setter)
+
+
+def execution_context(stream=False):
+    """
+    Runs the decorated Function method inside a fresh ExecutionContext. Must be the outermost decorator so that
+    observation decorators attach their handles to the context of this call.
+    """
+
+    def decorator(func):
+        if stream:
+            @wraps(func)
+            async def wrapper(self, **kwargs):
+                context = self.new_context()
+                # The generator runs in its own copy of the caller's context variables, so the caller doesn't see
+                # this call as its current one while it consumes the messages
+                variables = contextvars.copy_context()
+                variables.run(current_execution_context.set, context)
+                messages = func(self, **kwargs)
+                try:
+                    while True:
+                        try:
+                            message = await ContextStep(variables, messages.__anext__())
+                        except StopAsyncIteration:
+                            break
+                        yield message
+                finally:
+                    # Also runs when the consumer stops early
+                    await ContextStep(variables, messages.aclose())
+                    self._context = context
+        else:
+            @wraps(func)
+            async def wrapper(self, **kwargs):
+                context = self.new_context()
+                token = current_execution_context.set(context)
+                try:
+                    return await func(self, **kwargs)
+                finally:
+                    current_execution_context.reset(token)
+                    self._context = context
+
+        return wrapper
+
+    return decorator
@@ -1,12 +1,30 @@
+import asyncio
 import inspect
+import logging
+import time
 import traceback
 from typing import Any, Optional, Type, Union
 
 from tinyllm.exceptions import InvalidStateTransition
-from tinyllm import langfuse_client, tinyllm_config, tinyllm_logger
-from tinyllm.state import States, ALLOWED_TRANSITIONS
+import tinyllm
+from tinyllm import tinyllm_config, tinyllm_logger
+from tinyllm.execution_context import ExecutionContext, context_property, current_execution_context, \
+    execution_context
+from tinyllm.state import States, ALLOWED_TRANSITIONS, TERMINAL_STATES
 from tinyllm.tracing.langfuse_context import observation
-from tinyllm.validator import Validator
+from tinyllm.tracing.metrics import record_state_timings
+from tinyllm.validator import Validator, dump_unvalidated, is_noop_validator, validate_init
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+
+async def iterate_inputs(inputs):
+    if hasattr(inputs, '__aiter__'):
+        async for item in inputs:
+            yield item
+    else:
+        for item in inputs:
+            yield item
 
 
 class CallBackHandler:
@@ -45,7 +63,8 @@ class Function:
             stream=False,
             callback_handler=None
     ):
-        FunctionInitValidator(
+        validate_init(
+            FunctionInitValidator,
             user_id=user_id,
             session_id=str(session_id),
             input_validator=input_validator,
@@ -55,6 +74,8 @@ class Function:
             processed_output_evaluators=processed_output_evaluators,
             stream=stream,
         )
+        # Context used outside of a call; holds the last finished call for inspection
+        self._context = ExecutionContext(function=self)
         self.callback_handler = callback_handler
         self.user_id = user_id
         self.session_id = str(session_id)
@@ -87,6 +108,17 @@ class Function:
         self.stream = stream
         self.observation = None
 
+    @property
+    def context(self):
+        return ExecutionContext.find(self) or self._context
+
+    def new_context(self):
+        context = ExecutionContext(function=self, parent=current_execution_context.get())
+        context.state = States.INIT
+        context.state_started = time.perf_counter()
+        return context
+
+    @execution_context()
     @observation('span')
     async def __call__(self, **kwargs):
         try:
@@ -104,6 +136,8 @@ class Function:
             self.validate_output(**self.output)
 
             # Evaluate output
+            if self.run_evaluators:
+                self.transition(States.OUTPUT_EVALUATION)
             for evaluator in self.run_evaluators:
                 await evaluator(**{'status': 'success', 'output': self.output}, observation=self.observation)
 
@@ -119,17 +153,19 @@ class Function:
                 self.processed_output.update(validated_processed_output)
 
             # Evaluate processed output
+            if self.processed_output_evaluators:
+                self.transition(States.PROCESSED_OUTPUT_EVALUATION)
             for evaluator in self.processed_output_evaluators:
                 await evaluator(**{'status': 'success', 'output': self.processed_output}, observation=self.observation)
 
             final_output = {"status": "success",
                             "output": self.processed_output}
 
+            self.transition(States.CLOSING)
             await self.close(**final_output)
 
             # Complete
             self.transition(States.COMPLETE)
-            langfuse_client.flush()
             return final_output
 
         except Exception as e:
@@ -156,54 +192,181 @@ class Function:
 
 
         self.transition(States.FAILED, msg=detailed_error_msg)
-        langfuse_client.flush()
 
         return output_message
 
+    async def map(self,
+                  inputs,
+                  max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                  ordered: bool = True):
+        """
+        Calls the function on each kwargs dict of a list or async iterable, with at most max_concurrency calls in
+        flight. Yields (index, message) tuples in input order, or in completion order if ordered is False. Streaming
+        functions yield every message of every call. All calls are traced as child spans of a single map span.
+        A failing item yields an error message and does not cancel the rest of the batch.
+        """
+
+        @observation(observation_type='span', name=self.name + '.map', stream=True)
+        async def traced_map(**kwargs):
+            async for index, message in self._map(inputs, **kwargs):
+                yield index, message
+
+        async for index, message in traced_map(max_concurrency=max_concurrency, ordered=ordered):
+            yield index, message
+
+    async def batch(self,
+                    inputs,
+                    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                    ordered: bool = True) -> list:
+        """
+        Runs map and returns the final message of each call, in input order or in completion order.
+        """
+        results = {}
+        async for index, message in self.map(inputs, max_concurrency=max_concurrency, ordered=ordered):
+            results.pop(index, None)
+            results[index] = message
+        return list(results.values())
+
+    async def _iter_call(self, **kwargs):
+        yield await self(**kwargs)
+
+    async def _map(self,
+                   inputs,
+                   max_concurrency,
+                   ordered):
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # Queue items are (index, message, is_done). The scheduler sends (None, items_count, True) when the inputs
+        # are exhausted
+        queue = asyncio.Queue()
+        tasks = set()
+
+        async def run_item(index, kwargs):
+            try:
+                async for message in self._iter_call(**kwargs):
+                    queue.put_nowait((index, message, False))
+            except Exception:
+                queue.put_nowait((index, {"status": "error", "message": traceback.format_exc()}, False))
+            finally:
+                semaphore.release()
+                queue.put_nowait((index, None, True))
+
+        async def schedule():
+            items_count = 0
+            try:
+                async for kwargs in iterate_inputs(inputs):
+                    await semaphore.acquire()
+                    task = asyncio.create_task(run_item(items_count, kwargs))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    items_count += 1
+            finally:
+                queue.put_nowait((None, items_count, True))
+
+        scheduler = asyncio.create_task(schedule())
+        items_count = None
+        done_count = 0
+        pending_messages = {}
+        done_indexes = set()
+        next_index = 0
+        try:
+            while items_count is None or done_count < items_count:
+                index, message, is_done = await queue.get()
+                if index is None:
+                    items_count = message
+                    continue
+                if is_done:
+                    done_count += 1
+                    if ordered:
+                        done_indexes.add(index)
+                elif not ordered:
+                    yield index, message
+                else:
+                    pending_messages.setdefault(index, []).append(message)
+
+                # Release buffered messages as soon as every earlier input is done
+                while ordered and (next_index in pending_messages or next_index in done_indexes):
+                    for pending_message in pending_messages.pop(next_index, []):
+                        yield next_index, pending_message
+                    if next_index not in done_indexes:
+                        break
+                    done_indexes.discard(next_index)
+                    next_index += 1
+            # Surface errors raised while iterating the inputs
+            await scheduler
+        finally:
+            scheduler.cancel()
+            for task in list(tasks):
+                task.cancel()
+
     def transition(self, new_state: States, msg: Optional[str] = None):
         if new_state not in ALLOWED_TRANSITIONS[self.state]:
             raise InvalidStateTransition(
                 self, f"Invalid state transition from {self.state.name} to {new_state.name}"
             )
-        log_level = "error" if new_state == States.FAILED else "info"
-        if new_state.name in tinyllm_config['LOGS']['LOG_STATES']:
-            if log_level == 'error':
-                self.log(
-                    f"transition from {self.state.name} to: {new_state.name}" + (f" ({msg})" if msg is not None else ""),
-                    level=log_level,
-                )
-            else:
-                self.log(
-                    f"transition to: {new_state.name}" + (f" ({msg})" if msg is not None else ""),
-                    level=log_level,
-                )
-
+        self.record_transition(new_state)
+        old_state = self.state
         self.state = new_state
 
-    @property
-    def log_prefix(self):
-        base_url = "https://us.cloud.langfuse.com/project/{project_id}/traces/{trace_id}"
-        if getattr(self, 'trace', None) is not None:
-            trace_id = self.trace.id
-            url = base_url.format(project_id=tinyllm_config['LANGFUSE']['PROJECT_ID'], trace_id=trace_id)
-            return f"[{self.trace.id}][{self.name}]({url})"
-        else:
-            return f"[{self.name}]"
-
-    def log(self, message, level="info"):
-        if tinyllm_config['LOGS']['LOGGING']:
-            if level == "error":
-                tinyllm_logger.error(self.log_prefix+' '+message)
+        if new_state.name in tinyllm_config['LOGS']['LOG_STATES']:
+            details = f" ({msg})" if msg is not None else ""
+            if new_state == States.FAILED:
+                self.log("transition from %s to: %s%s", old_state.name, new_state.name, details, level="error")
             else:
-                tinyllm_logger.info(self.log_prefix+' '+message)
+                self.log("transition to: %s%s", new_state.name, details)
+
+    def record_transition(self, new_state: States):
+        # Time spent in the state being left; the INIT transition of __init__ happens outside of any call
+        context = self.context
+        if context.state_started is None:
+            return
+        now = time.perf_counter()
+        if context.state not in TERMINAL_STATES:
+            timings = context.state_timings
+            timings[context.state.name] = timings.get(context.state.name, 0.0) + now - context.state_started
+        context.state_started = now
+        if new_state in TERMINAL_STATES:
+            record_state_timings(self.name, context.state_timings,
+                                 status='success' if new_state == States.COMPLETE else 'error')
+
+    def log(self, message, *args, level="info"):
+        """
+        Logs message % args, with the trace id, name and state of the call, and the seconds from its start to its last
+        transition, as record attributes. Nothing is formatted or computed unless the record is going to be written.
+        """
+        if not tinyllm_config['LOGS']['LOGGING']:
+            return
+        log_level = logging.ERROR if level == "error" else logging.INFO
+        if not tinyllm_logger.isEnabledFor(log_level):
+            return
+        context = self.context
+        tinyllm_logger.log(log_level, message, *args, extra={
+            'trace_id': getattr(context.trace, 'id', None),
+            'function': self.name,
+            'state': context.state.name if context.state is not None else None,
+            'duration': sum(context.state_timings.values()),
+        })
+
+    def skip_validation(self, validator, payload) -> bool:
+        if tinyllm.validation_mode == 'off':
+            return True
+        # Nested calls get payloads from their parent call, which was validated at the boundary
+        if tinyllm.validation_mode == 'boundary' and self.context.parent is not None:
+            return True
+        return bool(payload) and is_noop_validator(validator)
 
     def validate_input(self, **kwargs):
+        if self.skip_validation(self.input_validator, kwargs):
+            return dump_unvalidated(self.input_validator, kwargs)
         return self.input_validator(**kwargs).model_dump()
 
     def validate_output(self, **kwargs):
+        if self.skip_validation(self.output_validator, kwargs):
+            return dump_unvalidated(self.output_validator, kwargs)
         return self.output_validator(**kwargs).model_dump()
 
     def validate_processed_output(self, **kwargs):
+        if self.skip_validation(self.processed_output_validator, kwargs):
+            return dump_unvalidated(self.processed_output_validator, kwargs)
         return self.processed_output_validator(**kwargs).model_dump()
 
     async def run(self, **kwargs) -> Any:
@@ -215,3 +378,14 @@ class Function:
     async def close(self,
                     **kwargs):
         pass
+
+    # Per-call attributes live on the ExecutionContext of the running call (declared last so they don't
+    # shadow the observation decorator in the class body)
+    state = context_property('state')
+    input = context_property('input')
+    output = context_property('output')
+    processed_output = context_property('processed_output')
+    observation = context_property('observation')
+    trace = context_property('trace')
+    generation = context_property('generation')
+    state_timings = context_property('state_timings')
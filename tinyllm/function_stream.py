@@ -2,7 +2,8 @@ from abc import abstractmethod
 from typing import Any, Optional
 
 from tinyllm.function import Function
-from tinyllm import langfuse_client, tinyllm_config
+from tinyllm import tinyllm_config
+from tinyllm.execution_context import execution_context
 from tinyllm.state import States
 from tinyllm.tracing.langfuse_context import observation
 from tinyllm.validator import Validator
@@ -27,6 +28,7 @@ class FunctionStream(Function):
                   **kwargs):
         yield None
 
+    @execution_context(stream=True)
     @observation('span', stream=True)
     async def __call__(self, **kwargs):
         try:
@@ -39,19 +41,18 @@ class FunctionStream(Function):
             # Run
             self.transition(States.RUNNING)
             async for message in self.run(**validated_input):
-                # Output validation
-                if 'status' in message.keys():
+                if 'status' in message:
                     if message['status'] == 'success':
                         message = message['output']
                     else:
                         raise Exception(message['message'])
 
-                self.transition(States.OUTPUT_VALIDATION)
-                self.validate_output(**message)
-
                 yield {"status": "success",
                        "output": message}
 
+            # Output validation runs once, on the last message: the previous ones are partial versions of it
+            self.transition(States.OUTPUT_VALIDATION)
+            self.validate_output(**message)
             self.output = message
 
             # Process output
@@ -59,10 +60,13 @@ class FunctionStream(Function):
             self.processed_output = await self.process_output(**self.output)
 
             # Validate processed output
+            self.transition(States.PROCESSED_OUTPUT_VALIDATION)
             if self.processed_output_validator:
                 self.validate_processed_output(**self.processed_output)
 
             # Evaluate processed output
+            if self.processed_output_evaluators:
+                self.transition(States.PROCESSED_OUTPUT_EVALUATION)
             for evaluator in self.processed_output_evaluators:
                 await evaluator(**self.processed_output, observation=self.observation)
 
@@ -72,9 +76,12 @@ class FunctionStream(Function):
 
             # Complete
             self.transition(States.COMPLETE)
-            langfuse_client.flush()
 
         except Exception as e:
             output_message = await self.handle_exception(e)
             # Raise or return error
             yield output_message
+
+    async def _iter_call(self, **kwargs):
+        async for message in self(**kwargs):
+            yield message
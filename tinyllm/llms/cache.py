@@ -0,0 +1,189 @@
+import copy
+import json
+import sqlite3
+import threading
+import time
+from abc import abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+
+class ResponseCache:
+    """
+    Exact-match cache of LLM responses, keyed by coalescing.request_key. Values are JSON-serializable response
+    dicts (model_dump() of a litellm response). Entries expire after ttl seconds (None: never).
+    """
+
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: dict, ttl: float = None):
+        ttl = ttl if ttl is not None else self.ttl
+        self._set(key, value, expires_at=time.time() + ttl if ttl is not None else None)
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    def _set(self, key: str, value: dict, expires_at: Optional[float]):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class InMemoryCache(ResponseCache):
+    """
+    LRU cache holding up to max_entries responses. Values are copied in and out so callers can modify them.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = None):
+        super().__init__(ttl=ttl)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def _set(self, key, value, expires_at):
+        value = copy.deepcopy(value)
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SQLiteCache(ResponseCache):
+    """
+    On-disk cache in a SQLite file, shared between runs. Holds up to max_entries responses and evicts the least
+    recently used ones. Hits only read the file: their access times are kept in memory and written with the next set,
+    so reads never wait on a write transaction.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl: float = None):
+        super().__init__(ttl=ttl)
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # Access times of the hits since the last set, by key
+        self.accessed = {}
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                                "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, accessed_at REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.connection.commit()
+
+    def _get(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            now = time.time()
+            # Expired entries are deleted with the next set
+            if expires_at is not None and expires_at < now:
+                return None
+            self.accessed[key] = now
+        return json.loads(value)
+
+    def _set(self, key, value, expires_at):
+        value = json.dumps(value, default=str)
+        with self.lock:
+            now = time.time()
+            self.accessed.pop(key, None)
+            self.connection.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?",
+                                        [(accessed_at, accessed_key)
+                                         for accessed_key, accessed_at in self.accessed.items()])
+            self.accessed.clear()
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                                    (key, value, expires_at, now))
+            self.connection.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            self.connection.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                                    "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+            self.connection.commit()
+
+    def clear(self):
+        with self.lock:
+            self.accessed.clear()
+            self.connection.execute("DELETE FROM responses")
+            self.connection.commit()
+
+
+class TieredCache(ResponseCache):
+    """
+    In-memory LRU in front of a persistent cache. Hits on the persistent cache are promoted to memory.
+    """
+
+    def __init__(self, memory: ResponseCache, persistent: ResponseCache, ttl: float = None):
+        super().__init__(ttl=ttl)
+        self.memory = memory
+        self.persistent = persistent
+
+    def _get(self, key):
+        value = self.memory.get(key)
+        if value is None:
+            value = self.persistent.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def _set(self, key, value, expires_at):
+        ttl = expires_at - time.time() if expires_at is not None else None
+        self.memory.set(key, value, ttl=ttl)
+        self.persistent.set(key, value, ttl=ttl)
+
+    def clear(self):
+        self.memory.clear()
+        self.persistent.clear()
+
+
+def create_response_cache(tinyllm_config: dict) -> Optional[ResponseCache]:
+    cache_config = (tinyllm_config.get('LLM') or {}).get('CACHE') or {}
+    backend = cache_config.get('BACKEND') or 'none'
+    ttl = cache_config.get('TTL')
+    if backend == 'none':
+        return None
+    elif backend == 'memory':
+        return InMemoryCache(max_entries=cache_config.get('MAX_ENTRIES', 1000), ttl=ttl)
+    elif backend == 'sqlite':
+        return SQLiteCache(cache_config['PATH'], max_entries=cache_config.get('MAX_ENTRIES', 100000), ttl=ttl)
+    elif backend == 'tiered':
+        return TieredCache(InMemoryCache(max_entries=cache_config.get('MEMORY_MAX_ENTRIES', 1000), ttl=ttl),
+                           SQLiteCache(cache_config['PATH'], max_entries=cache_config.get('MAX_ENTRIES', 100000),
+                                       ttl=ttl),
+                           ttl=ttl)
+    raise ValueError(f"Unknown response cache backend: {backend}")
@@ -0,0 +1,59 @@
+import asyncio
+import hashlib
+import json
+
+
+def request_key(completion_kwargs: dict) -> str:
+    """
+    Canonical hash of the model parameters and messages of a completion request: the same request always
+    gets the same key, whatever the order of its keys.
+    """
+    canonical = json.dumps(completion_kwargs, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class RequestCoalescer:
+    """
+    Singleflight: concurrent calls with the same key share a single upstream call and its result (or error).
+    The upstream call is shielded, so a cancelled caller doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self.in_flight = {}
+        self.issued = 0
+        self.coalesced = 0
+
+    @property
+    def stats(self):
+        return {
+            'issued': self.issued,
+            'coalesced': self.coalesced,
+            'in_flight': len(self.in_flight),
+        }
+
+    def _done(self, key, future):
+        if self.in_flight.get(key) is future:
+            self.in_flight.pop(key)
+        # Mark the error as retrieved in case every caller was cancelled
+        if not future.cancelled():
+            future.exception()
+
+    async def run(self, key, call):
+        """
+        Returns (result, coalesced) where coalesced tells if the result came from another caller's request.
+        """
+        # Futures belong to an event loop, so requests are only shared within a loop
+        key = (asyncio.get_running_loop(), key)
+        future = self.in_flight.get(key)
+        coalesced = future is not None
+        if coalesced:
+            self.coalesced += 1
+        else:
+            future = asyncio.ensure_future(call())
+            self.in_flight[key] = future
+            future.add_done_callback(lambda done: self._done(key, done))
+            self.issued += 1
+        return await asyncio.shield(future), coalesced
+
+
+request_coalescer = RequestCoalescer()
@@ -2,11 +2,17 @@ from typing import Optional, Any
 
 import openai
 import litellm
+import tinyllm
 from litellm import acompletion
 from openai import OpenAIError
 from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type
 
+from tinyllm import tinyllm_config
 from tinyllm.function import Function
+from tinyllm.llms.cache import ResponseCache
+from tinyllm.llms.coalescing import request_coalescer, request_key
+from tinyllm.llms.mock_provider import get_mock_provider, is_mock_model
+from tinyllm.llms.rate_limiter import ModelRateLimiter
 from tinyllm.tracing.langfuse_context import observation
 from tinyllm.util.helpers import *
 from tinyllm.util.message import Content, Message
@@ -58,7 +64,8 @@ OPENAI_TOKEN_LIMITS = {
     "gpt-4-32k-0613": 32768,
     "gpt-4-0314": 8192,
     "gpt-4-32k-0314": 32768,
-
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
 }
 
 ANYSCALE_TOKEN_LIMITS = {
@@ -75,6 +82,16 @@ AZURE_TOKEN_LIMITS = {
 LLM_TOKEN_LIMITS = {**OPENAI_TOKEN_LIMITS, **ANYSCALE_TOKEN_LIMITS, **AZURE_TOKEN_LIMITS}
 
 
+def get_token_limit(model: str, default: Optional[int] = None) -> Optional[int]:
+    """
+    Context limit of a model: LLM_TOKEN_LIMITS, then the litellm model map, then default.
+    """
+    if model in LLM_TOKEN_LIMITS:
+        return LLM_TOKEN_LIMITS[model]
+    model_info = litellm.model_cost.get(model) or {}
+    return model_info.get('max_input_tokens') or model_info.get('max_tokens') or default
+
+
 
 DEFAULT_CONTEXT_FALLBACK_DICT = {
     "gpt-3.5-turbo-0125": "gpt-4-turbo-preview",
@@ -101,6 +118,8 @@ class LiteLLMChatInputValidator(Validator):
     n: Optional[int] = 1
     stream: Optional[bool] = False
     context_window_fallback_dict: Optional[Dict] = DEFAULT_CONTEXT_FALLBACK_DICT
+    cache: Optional[bool] = None
+    cache_ttl: Optional[float] = None
 
 
 class LiteLLMChatOutputValidator(Validator):
@@ -110,10 +129,16 @@ class LiteLLMChatOutputValidator(Validator):
 
 
 class LiteLLM(Function):
-    def __init__(self, **kwargs):
+    def __init__(self, coalesce: bool = None, cache: ResponseCache = None, priority: int = None, **kwargs):
         super().__init__(input_validator=LiteLLMChatInputValidator,
                          **kwargs)
         self.generation = None
+        # Concurrent identical requests share one upstream call (LLM.COALESCE in the config by default)
+        self.coalesce = coalesce if coalesce is not None else (tinyllm_config.get('LLM') or {}).get('COALESCE', False)
+        # Response cache, tinyllm.response_cache (LLM.CACHE in the config) by default
+        self.cache = cache
+        # Queue priority under the rate limits (lower first), LLM.PRIORITIES of the user or session by default
+        self.priority = priority
 
     def _validate_tool_args(self, **kwargs):
         tools_args = {}
@@ -129,6 +154,74 @@ class LiteLLM(Function):
             messages = [message.to_dict() for message in messages]
         return messages
 
+    def _get_completion_kwargs(self, **kwargs):
+        completion_kwargs = {arg: kwargs[arg] for arg in kwargs if arg in model_parameters}
+        completion_kwargs.update(self._validate_tool_args(**kwargs))
+        return completion_kwargs
+
+    def _get_response_cache(self, cache, completion_kwargs) -> Optional[ResponseCache]:
+        """
+        cache=False bypasses the response cache and cache=True forces it. By default, only deterministic calls
+        (temperature 0, the input validator default) are cached.
+        """
+        response_cache = self.cache if self.cache is not None else tinyllm.response_cache
+        if response_cache is None or cache is False:
+            return None
+        if cache is None and completion_kwargs.get('temperature', 0) != 0:
+            return None
+        return response_cache
+
+    def _get_cache_key(self, completion_kwargs):
+        # Streamed and non-streamed calls share cache entries
+        return request_key({arg: value for arg, value in completion_kwargs.items() if arg != 'stream'})
+
+    def _get_rate_limiter(self, model) -> Optional[ModelRateLimiter]:
+        if tinyllm.rate_limiter is None:
+            return None
+        return tinyllm.rate_limiter.get(model)
+
+    async def _send(self, completion_kwargs):
+        # mock/ models are answered offline by the mock provider (LLM.MOCK in the config)
+        if is_mock_model(completion_kwargs.get('model')):
+            return await get_mock_provider().acompletion(**completion_kwargs)
+        return await acompletion(**completion_kwargs)
+
+    async def _acompletion(self, completion_kwargs, generation_metadata):
+        """
+        Calls the provider once the rate limiter of the model (LLM.RATE_LIMITS) admits the request. The request is
+        charged its prompt tokens and max_tokens, corrected with the usage of the response when there is one.
+        """
+        model = completion_kwargs.get('model')
+        rate_limiter = self._get_rate_limiter(model)
+        if rate_limiter is None:
+            return await self._send(completion_kwargs)
+
+        session_id = self.session_id if self.session_id != 'None' else None
+        priority = self.priority
+        if priority is None:
+            priority = tinyllm.rate_limiter.get_priority(user_id=self.user_id, session_id=session_id)
+        tokens = count_tokens(completion_kwargs['messages'], model=model) + (completion_kwargs.get('max_tokens') or 0)
+        generation_metadata['queue_wait'] = await rate_limiter.acquire(tokens, priority=priority,
+                                                                       key=self.user_id or session_id)
+        try:
+            response = await self._send(completion_kwargs)
+        except openai.RateLimitError:
+            rate_limiter.on_rate_limited()
+            raise
+        usage = getattr(response, 'usage', None)
+        if usage is not None and getattr(usage, 'total_tokens', None) is not None:
+            rate_limiter.settle(tokens, usage.total_tokens)
+        return response
+
+    async def _complete(self, completion_kwargs, generation_metadata):
+        if self.coalesce:
+            api_result, coalesced = await request_coalescer.run(
+                request_key(completion_kwargs),
+                lambda: self._acompletion(completion_kwargs, generation_metadata))
+            generation_metadata['coalesced'] = coalesced
+            return api_result
+        return await self._acompletion(completion_kwargs, generation_metadata)
+
     @observation(observation_type='generation', input_mapping={'input': 'messages'},
                  output_mapping={'output': 'response'})
     @retry(
@@ -138,13 +231,23 @@ class LiteLLM(Function):
     )
     async def run(self, **kwargs):
         kwargs['messages'] = self._parse_mesages(kwargs['messages'])
-        tools_args = self._validate_tool_args(**kwargs)
-        completion_kwargs = {arg: kwargs[arg] for arg in kwargs if arg in model_parameters}
-        completion_kwargs.update(tools_args)
-        api_result = await acompletion(
-            **completion_kwargs,
-        )
-        model_dump = api_result.model_dump()
+        completion_kwargs = self._get_completion_kwargs(**kwargs)
+        generation_metadata = {}
+
+        model_dump = None
+        response_cache = self._get_response_cache(kwargs.get('cache'), completion_kwargs)
+        if response_cache is not None:
+            cache_key = self._get_cache_key(completion_kwargs)
+            model_dump = response_cache.get(cache_key)
+            generation_metadata['cache'] = 'miss' if model_dump is None else 'hit'
+
+        if model_dump is None:
+            api_result = await self._complete(completion_kwargs, generation_metadata)
+            # Each caller dumps its own copy, so coalesced callers never share mutable dicts
+            model_dump = api_result.model_dump()
+            if response_cache is not None:
+                response_cache.set(cache_key, model_dump, ttl=kwargs.get('cache_ttl'))
+
         msg_type = 'tool' if model_dump['choices'][0]['finish_reason'] == 'tool_calls' else 'completion'
         message = model_dump['choices'][0]['message']
         return {
@@ -152,4 +255,5 @@ class LiteLLM(Function):
             "message": message,
             "response": model_dump,
             "completion": message['content'],
+            "generation_metadata": generation_metadata,
         }
@@ -1,5 +1,6 @@
+from collections.abc import Mapping
+
 import openai
-from litellm import acompletion
 from openai import OpenAIError
 from tenacity import stop_after_attempt, wait_random_exponential, retry_if_exception_type, retry
 
@@ -7,10 +8,200 @@ from tinyllm.llms.lite_llm import LiteLLM, DEFAULT_CONTEXT_FALLBACK_DICT, DEFAUL
 from tinyllm.function_stream import FunctionStream
 from tinyllm.tracing.langfuse_context import observation
 from tinyllm.util.helpers import get_openai_message
+from tinyllm.util.json_stream import IncrementalJsonParser
+from tinyllm.util.parse_util import parse_json
+from tinyllm.util.stream_buffer import StreamBuffer
+
+REPLAY_CHUNK_SIZE = 32
+
+
+async def replay_chunks(response, chunk_size=REPLAY_CHUNK_SIZE):
+    """
+    Replays a cached completion as synthetic stream chunks (dicts shaped like litellm chunk.dict()).
+    """
+    choice = response['choices'][0]
+    message = choice['message']
+
+    def make_chunk(delta, finish_reason=None, **kwargs):
+        return {'id': response.get('id'),
+                'model': response.get('model'),
+                'object': 'chat.completion.chunk',
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+                **kwargs}
+
+    if message.get('tool_calls'):
+        for index, tool_call in enumerate(message['tool_calls']):
+            yield make_chunk({'role': 'assistant', 'content': None, 'tool_calls': [{
+                'index': index, 'id': tool_call['id'], 'type': 'function',
+                'function': {'name': tool_call['function']['name'], 'arguments': ''}}]})
+            arguments = tool_call['function']['arguments']
+            for i in range(0, len(arguments), chunk_size):
+                yield make_chunk({'content': None, 'tool_calls': [{
+                    'index': index, 'id': None, 'type': None,
+                    'function': {'name': None, 'arguments': arguments[i:i + chunk_size]}}]})
+    else:
+        content = message.get('content') or ''
+        for i in range(0, len(content), chunk_size):
+            yield make_chunk({'role': 'assistant', 'content': content[i:i + chunk_size]})
+    yield make_chunk({'content': None}, finish_reason=choice['finish_reason'], usage=response.get('usage'))
+
+
+def build_response(last_chunk, completion, tool_calls):
+    """
+    Builds a completion (shaped like litellm response.model_dump()) from a finished stream, to cache it.
+    """
+    if tool_calls:
+        message = {'role': 'assistant', 'content': None, 'tool_calls': tool_calls}
+    else:
+        message = {'role': 'assistant', 'content': completion}
+    return {'id': last_chunk.get('id'),
+            'model': last_chunk.get('model'),
+            'object': 'chat.completion',
+            'choices': [{'index': 0, 'message': message, 'finish_reason': last_chunk['choices'][0]['finish_reason']}],
+            'usage': last_chunk.get('usage')}
+
+
+STREAM_EVENT_KEYS = ('streaming_status', 'type', 'delta', 'last_completion_delta', 'finish_delta', 'completion',
+                     'message', 'last_chunk', 'partial_json', 'tool_calls', 'completed_tool_calls',
+                     'generation_metadata')
+
+
+def get_field(value, name):
+    # Stream chunks are litellm objects, or dicts when replayed from the cache
+    return value.get(name) if isinstance(value, dict) else getattr(value, name, None)
+
+
+def to_dict(value):
+    if value is None or isinstance(value, dict):
+        return value
+    return value.model_dump()
+
+
+class ToolCallBuffer:
+    """
+    A tool call being streamed. Its arguments are accumulated and parsed as they arrive, so the call can be
+    dispatched as soon as they are complete.
+    """
+
+    __slots__ = ('index', 'id', 'name', 'arguments', 'parser', 'reported')
+
+    def __init__(self, index, id, name):
+        self.index = index
+        self.id = id
+        self.name = name
+        self.arguments = StreamBuffer()
+        self.parser = IncrementalJsonParser()
+        self.reported = False
+
+    def append(self, text):
+        self.arguments.append(text)
+        self.parser.feed(text)
+
+    @property
+    def complete(self) -> bool:
+        return self.parser.complete
+
+    def parse_arguments(self) -> dict:
+        if self.parser.complete:
+            return self.parser.value
+        text = self.arguments.text()
+        return parse_json(text) if text.strip() else {}
+
+    def to_dict(self, length=None) -> dict:
+        return {'id': self.id,
+                'type': 'function',
+                'function': {'name': self.name, 'arguments': self.arguments.text(length)}}
+
+
+class StreamEvent(Mapping):
+    """
+    A LiteLLMStream message. Events only keep the chunk, its text delta and the length of the output so far: the
+    accumulated completion, the OpenAI message, the chunk and delta dicts and the parsed JSON are materialized when
+    read, so the cost of a chunk doesn't grow with the length of the output.
+    """
+
+    __slots__ = ('streaming_status', 'type', 'delta', 'chunk', 'completion_delta', 'finish_chunk_delta',
+                 'output', 'length', 'function_name', 'json_state', 'tool_call_lengths', 'completed_calls',
+                 'generation_metadata', '_values')
+
+    def __init__(self, streaming_status, type, delta, chunk, completion_delta, finish_chunk_delta, output,
+                 function_name, json_state, tool_calls, completed_calls, generation_metadata):
+        self.streaming_status = streaming_status
+        self.type = type
+        self.delta = delta
+        self.chunk = chunk
+        self.completion_delta = completion_delta
+        self.finish_chunk_delta = finish_chunk_delta
+        self.output = output
+        self.length = output.length
+        self.function_name = function_name
+        self.json_state = json_state
+        self.tool_call_lengths = [(tool_call, tool_call.arguments.length) for tool_call in tool_calls]
+        self.completed_calls = tuple((tool_call, tool_call.arguments.length) for tool_call in completed_calls)
+        self.generation_metadata = generation_metadata
+        self._values = {}
+
+    def _materialize(self, key):
+        if key in ('streaming_status', 'type', 'delta', 'generation_metadata'):
+            return getattr(self, key)
+        elif key == 'last_completion_delta':
+            return to_dict(self.completion_delta)
+        elif key == 'finish_delta':
+            return to_dict(self.finish_chunk_delta)
+        elif key == 'completion':
+            text = self.output.text(self.length)
+            return text if self.function_name is None else {'name': self.function_name, 'arguments': text}
+        elif key == 'message':
+            return get_openai_message(role=self.type, content=self['completion'])
+        elif key == 'last_chunk':
+            return to_dict(self.chunk)
+        elif key == 'partial_json':
+            return self.json_state
+        elif key == 'tool_calls':
+            return [tool_call.to_dict(length) for tool_call, length in self.tool_call_lengths]
+        elif key == 'completed_tool_calls':
+            # Calls whose arguments were completed by this chunk, ready to be dispatched
+            return [{'index': tool_call.index,
+                     'id': tool_call.id,
+                     'name': tool_call.name,
+                     'arguments': tool_call.parse_arguments(),
+                     'raw_arguments': tool_call.arguments.text(length)}
+                    for tool_call, length in self.completed_calls]
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            if key not in STREAM_EVENT_KEYS:
+                raise KeyError(key)
+            self._values[key] = self._materialize(key)
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+
+    def __contains__(self, key):
+        return key in STREAM_EVENT_KEYS or key in self._values
+
+    def __iter__(self):
+        yield from STREAM_EVENT_KEYS
+        yield from (key for key in self._values if key not in STREAM_EVENT_KEYS)
+
+    def __len__(self):
+        return len(STREAM_EVENT_KEYS) + sum(1 for key in self._values if key not in STREAM_EVENT_KEYS)
+
+    def to_dict(self) -> dict:
+        event = dict(self)
+        if event['partial_json'] is not None:
+            event['partial_json'] = dict(event['partial_json'])
+        return event
 
 
 class LiteLLMStream(LiteLLM, FunctionStream):
 
+    async def _stream_chunks(self, completion_kwargs, generation_metadata):
+        response = await self._acompletion(completion_kwargs, generation_metadata)
+        async for chunk in response:
+            yield chunk
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_random_exponential(min=1, max=10),
@@ -19,80 +210,114 @@ class LiteLLMStream(LiteLLM, FunctionStream):
     @observation(observation_type='generation', stream=True)
     async def run(self, **kwargs):
         kwargs['messages'] = self._parse_mesages(kwargs['messages'])
-        tools_args = self._validate_tool_args(**kwargs)
-        completion_kwargs = {arg: kwargs[arg] for arg in kwargs if arg in model_parameters}
-        completion_kwargs.update(tools_args)
+        completion_kwargs = self._get_completion_kwargs(**kwargs)
         completion_kwargs['stream'] = True
+        generation_metadata = {}
+
+        cached_response = None
+        response_cache = self._get_response_cache(kwargs.get('cache'), completion_kwargs)
+        if response_cache is not None:
+            cache_key = self._get_cache_key(completion_kwargs)
+            cached_response = response_cache.get(cache_key)
+            generation_metadata['cache'] = 'miss' if cached_response is None else 'hit'
 
-        response = await acompletion(
-            **completion_kwargs,
-        )
+        if cached_response is not None:
+            chunks = replay_chunks(cached_response)
+        else:
+            chunks = self._stream_chunks(completion_kwargs, generation_metadata)
 
-        # We need to track 2 things: the response delta and the function_call
-        function_call = {
-            "name": None,
-            "arguments": ""
-        }
-        completion = ""
+        # The completion and the tool call arguments are accumulated in buffers and only joined when read
+        content = StreamBuffer()
+        tool_calls = {}
+        first_call = None
         last_completion_delta = None
         finish_delta = None
+        # JSON outputs and tool call arguments are parsed as they stream
+        json_parser = IncrementalJsonParser() if completion_kwargs.get('response_format') else None
 
-        # OpenAI function call works as follows: function name available at delta.tool_calls[0].function.
-        # It returns a dict where: 'name' is returned only in the first chunk
-        # tool argument tokens are sent in chunks after so need to keep track of them
+        # OpenAI tool calls work as follows: each call has an index in delta.tool_calls, its id and function name
+        # are only in its first chunk, and its argument tokens are sent in the chunks after.
+        # Several calls can be streamed in the same response.
 
-        async for chunk in response:
-            chunk_dict = chunk.dict()
-            status = self.get_streaming_status(chunk_dict)
-            chunk_role = self.get_chunk_type(chunk_dict)
-            delta = chunk_dict['choices'][0]['delta']
+        async for chunk in chunks:
+            status = self.get_streaming_status(chunk)
+            chunk_role = self.get_chunk_type(chunk)
+            delta = get_field(get_field(chunk, 'choices')[0], 'delta')
+            text = None
+            completed_calls = ()
 
             # When using tools:
             # We need the last response delta as it contains the full function message
             # The finish message does not contain any delta
-
-            # If streaming , we need to store chunks of the completion/function call
             if status == "streaming":
                 if chunk_role == "assistant":
-                    if delta['content']:
-                        completion += delta['content']
+                    text = get_field(delta, 'content')
                     last_completion_delta = delta
+                    if text:
+                        content.append(text)
+                        if json_parser is not None:
+                            json_parser.feed(text)
                 elif chunk_role == "tool":
-                    if function_call['name'] is None:
-                        function_call['name'] = delta['tool_calls'][0]['function']['name']
                     if last_completion_delta is None:
                         last_completion_delta = delta
-
-                    completion = function_call
-                    if delta['tool_calls'][0]['function']['arguments']:
-                        function_call['arguments'] += delta['tool_calls'][0]['function']['arguments']
+                    for tool_call_delta in get_field(delta, 'tool_calls') or []:
+                        index = get_field(tool_call_delta, 'index') or 0
+                        function = get_field(tool_call_delta, 'function')
+                        tool_call = tool_calls.get(index)
+                        if tool_call is None:
+                            tool_call = tool_calls[index] = ToolCallBuffer(index,
+                                                                           get_field(tool_call_delta, 'id'),
+                                                                           get_field(function, 'name'))
+                            first_call = first_call or tool_call
+                        text = get_field(function, 'arguments')
+                        if text:
+                            tool_call.append(text)
+                        json_parser = tool_call.parser
+                        if tool_call.complete and not tool_call.reported:
+                            tool_call.reported = True
+                            completed_calls += (tool_call,)
 
             elif status == "finished-streaming":
                 finish_delta = delta
+                # Calls whose arguments aren't a complete JSON object (like empty arguments) are completed here
+                completed_calls = tuple(tool_call for tool_call in tool_calls.values() if not tool_call.reported)
+                for tool_call in completed_calls:
+                    tool_call.reported = True
+
+            event = StreamEvent(streaming_status=status,
+                                type=chunk_role,
+                                delta=text,
+                                chunk=chunk,
+                                completion_delta=last_completion_delta,
+                                finish_chunk_delta=finish_delta,
+                                output=content if first_call is None else first_call.arguments,
+                                function_name=first_call.name if first_call is not None else None,
+                                json_state=json_parser.state if json_parser is not None else None,
+                                tool_calls=tool_calls.values(),
+                                completed_calls=completed_calls,
+                                generation_metadata=generation_metadata)
+            # The last message is materialized once, for tracing, validation and the callers
+            yield event.to_dict() if status == "finished-streaming" else event
 
-            yield {
-                "streaming_status": status,
-                "type": chunk_role,
-                "last_completion_delta": last_completion_delta,
-                "finish_delta": finish_delta,
-                "completion": completion,
-                "message": get_openai_message(role=chunk_role,
-                                              content=completion),
-                "last_chunk": chunk_dict,
-            }
+        if cached_response is None and response_cache is not None and finish_delta is not None:
+            response_cache.set(cache_key,
+                               build_response(to_dict(chunk), content.text(),
+                                              [tool_calls[index].to_dict() for index in sorted(tool_calls)]),
+                               ttl=kwargs.get('cache_ttl'))
 
     def get_chunk_type(self,
                        chunk):
-        delta = chunk['choices'][0]['delta']
+        choice = get_field(chunk, 'choices')[0]
 
-        if delta.get('tool_calls', None) is not None or chunk['choices'][0]['finish_reason'] == 'tool_calls':
+        if get_field(get_field(choice, 'delta'), 'tool_calls') is not None or \
+                get_field(choice, 'finish_reason') == 'tool_calls':
             return "tool"
 
         return "assistant"
 
     def get_streaming_status(self,
                              chunk):
-        if chunk['choices'][0]['finish_reason'] in ['stop', 'tool_calls']:
+        if get_field(get_field(chunk, 'choices')[0], 'finish_reason') in ['stop', 'tool_calls']:
             return "finished-streaming"
         else:
             return "streaming"
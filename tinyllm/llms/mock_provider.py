@@ -0,0 +1,326 @@
+import asyncio
+import json
+import math
+import random
+import re
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import httpx
+import litellm
+import tinyllm
+from litellm import ModelResponse
+from litellm.types.utils import ChatCompletionDeltaToolCall, Delta, Function, ModelResponseStream, StreamingChoices
+
+from tinyllm.llms.coalescing import request_key
+
+MOCK_MODEL_PREFIX = 'mock/'
+
+# Usage is estimated from the length of the texts, so mock calls never need a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def is_mock_model(model: Optional[str]) -> bool:
+    return bool(model) and model.startswith(MOCK_MODEL_PREFIX)
+
+
+class Latency:
+    """
+    A latency distribution, in seconds: constant, uniform between low and high, or normal and lognormal with a mean
+    and a standard deviation. Samples are never negative.
+    """
+
+    def __init__(self, distribution: str = 'constant', mean: float = 0, std: float = 0, low: float = 0,
+                 high: float = 0):
+        if distribution not in ['constant', 'uniform', 'normal', 'lognormal']:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.distribution = distribution
+        self.mean = mean
+        self.std = std
+        self.low = low
+        self.high = high
+
+    @classmethod
+    def from_config(cls, value) -> 'Latency':
+        # A number of seconds, or {DISTRIBUTION: uniform, MIN:, MAX:} or {DISTRIBUTION: normal|lognormal, MEAN:, STD:}
+        if value is None:
+            return cls()
+        if isinstance(value, (int, float)):
+            return cls(mean=value)
+        return cls(distribution=value.get('DISTRIBUTION', 'constant'),
+                   mean=value.get('MEAN') or value.get('VALUE') or 0,
+                   std=value.get('STD') or 0,
+                   low=value.get('MIN') or 0,
+                   high=value.get('MAX') or 0)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == 'uniform':
+            return rng.uniform(self.low, self.high)
+        elif self.distribution == 'normal':
+            return max(0.0, rng.gauss(self.mean, self.std))
+        elif self.distribution == 'lognormal':
+            if self.mean <= 0:
+                return 0.0
+            sigma = math.sqrt(math.log(1 + (self.std / self.mean) ** 2))
+            return rng.lognormvariate(math.log(self.mean) - sigma ** 2 / 2, sigma)
+        return self.mean
+
+
+class MockToolCall:
+    """
+    A scripted tool call. Calls without an id get a deterministic one.
+    """
+
+    def __init__(self, name: str, arguments: Union[Dict, str] = None, id: str = None):
+        self.name = name
+        self.arguments = arguments if isinstance(arguments, str) else json.dumps(arguments or {})
+        self.id = id
+
+
+class MockRule:
+    """
+    Answers the requests it matches with response, at most times times. match is a regex searched in the content
+    of the last message or a callable taking the completion kwargs, and None matches every request. response is a
+    completion string, a dict or list sent as JSON, a MockToolCall or a list of them, an exception to raise, or a
+    callable taking the completion kwargs and returning one of these.
+    """
+
+    def __init__(self, response, match: Union[str, Callable, None] = None, times: int = None):
+        self.response = response
+        self.match = re.compile(match) if isinstance(match, str) else match
+        self.times = times
+
+    def matches(self, kwargs) -> bool:
+        if self.times is not None and self.times <= 0:
+            return False
+        if self.match is None:
+            return True
+        if isinstance(self.match, re.Pattern):
+            return self.match.search(get_last_content(kwargs)) is not None
+        return bool(self.match(kwargs))
+
+
+class MockModelSettings:
+
+    def __init__(self,
+                 latency: Latency = None,
+                 chunk_interval: Latency = None,
+                 chunk_size: int = 4,
+                 error_rate: float = 0,
+                 rate_limit_rate: float = 0):
+        # Time before the response or, when streaming, before the first chunk
+        self.latency = latency or Latency()
+        self.chunk_interval = chunk_interval or Latency()
+        # Characters per stream chunk
+        self.chunk_size = chunk_size
+        # Share of calls failing with a 500 and with a 429
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+
+    @classmethod
+    def from_config(cls, config: dict, defaults: 'MockModelSettings' = None) -> 'MockModelSettings':
+        defaults = defaults or cls()
+        return cls(
+            latency=Latency.from_config(config['LATENCY']) if 'LATENCY' in config else defaults.latency,
+            chunk_interval=Latency.from_config(config['CHUNK_INTERVAL']) if 'CHUNK_INTERVAL' in config
+            else defaults.chunk_interval,
+            chunk_size=config.get('CHUNK_SIZE') or defaults.chunk_size,
+            error_rate=config.get('ERROR_RATE', defaults.error_rate) or 0,
+            rate_limit_rate=config.get('RATE_LIMIT_RATE', defaults.rate_limit_rate) or 0,
+        )
+
+
+def get_content(message: dict) -> str:
+    content = message.get('content')
+    return content if isinstance(content, str) else json.dumps(content, default=str)
+
+
+def get_last_content(kwargs) -> str:
+    messages = kwargs.get('messages') or []
+    if not messages:
+        return ''
+    return get_content(messages[-1])
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class MockProvider:
+    """
+    Offline LLM provider for mock/<name> models, with the same interface as litellm.acompletion. Completions come
+    from scripted rules (add_response), or echo the last message. Latency, stream chunks, errors and 429s follow the
+    settings of the model.
+
+    Calls are deterministic: the randomness of a call only depends on the seed, the request and how many times the
+    same request was made before, not on the order of concurrent calls.
+    """
+
+    def __init__(self, seed: int = 0, settings: MockModelSettings = None,
+                 models: Dict[str, MockModelSettings] = None):
+        self.seed = seed
+        self.settings = settings or MockModelSettings()
+        self.models = models or {}
+        self.rules: List[MockRule] = []
+        self.request_counts = {}
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    @property
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rate_limited': self.rate_limited,
+        }
+
+    def add_response(self, response, match: Union[str, Callable, None] = None, times: int = None) -> MockRule:
+        rule = MockRule(response, match=match, times=times)
+        self.rules.append(rule)
+        return rule
+
+    def clear(self):
+        self.rules = []
+        self.request_counts = {}
+
+    def get_settings(self, model: str) -> MockModelSettings:
+        return self.models.get(model[len(MOCK_MODEL_PREFIX):], self.settings)
+
+    def get_rng(self, kwargs) -> random.Random:
+        key = request_key({arg: value for arg, value in kwargs.items() if arg != 'stream'})
+        count = self.request_counts.get(key, 0)
+        self.request_counts[key] = count + 1
+        return random.Random(f"{self.seed}:{key}:{count}")
+
+    def get_response(self, kwargs) -> Any:
+        for rule in self.rules:
+            if rule.matches(kwargs):
+                if rule.times is not None:
+                    rule.times -= 1
+                response = rule.response
+                return response(kwargs) if callable(response) and not isinstance(response, type) else response
+        content = f"Mock response to: {get_last_content(kwargs)}"
+        if kwargs.get('response_format'):
+            return {'response': content}
+        return content
+
+    def get_error(self, settings, model, rng) -> Optional[Exception]:
+        draw = rng.random()
+        if draw < settings.rate_limit_rate:
+            self.rate_limited += 1
+            return litellm.RateLimitError('Mock rate limit reached', llm_provider='mock', model=model,
+                                          response=httpx.Response(429, request=httpx.Request('POST', 'mock://')))
+        if draw < settings.rate_limit_rate + settings.error_rate:
+            self.errors += 1
+            return litellm.InternalServerError('Mock server error', llm_provider='mock', model=model,
+                                               response=httpx.Response(500, request=httpx.Request('POST', 'mock://')))
+        return None
+
+    def get_usage(self, kwargs, content, tool_calls) -> dict:
+        prompt_tokens = sum(estimate_tokens(get_content(message)) for message in kwargs.get('messages') or [])
+        if tool_calls:
+            completion_tokens = sum(estimate_tokens(tool_call.name + tool_call.arguments) for tool_call in tool_calls)
+        else:
+            completion_tokens = estimate_tokens(content or '')
+        return {'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens}
+
+    async def acompletion(self, **kwargs):
+        self.calls += 1
+        model = kwargs['model']
+        settings = self.get_settings(model)
+        rng = self.get_rng(kwargs)
+        error = self.get_error(settings, model, rng)
+        if error is not None and error.status_code == 429:
+            raise error
+
+        response = self.get_response(kwargs)
+        if isinstance(response, BaseException):
+            raise response
+        if isinstance(response, MockToolCall):
+            response = [response]
+        if isinstance(response, list) and response and all(isinstance(item, MockToolCall) for item in response):
+            # Copies, so the scripted calls of the rule keep no id from this request
+            content = None
+            tool_calls = [MockToolCall(tool_call.name, tool_call.arguments,
+                                       tool_call.id or f"call_{rng.getrandbits(48):012x}")
+                          for tool_call in response]
+        else:
+            content, tool_calls = response if isinstance(response, str) else json.dumps(response), []
+
+        response_id = f"chatcmpl-mock-{rng.getrandbits(48):012x}"
+        usage = self.get_usage(kwargs, content, tool_calls)
+        chunks = self.get_chunks(content, tool_calls, settings.chunk_size)
+        if kwargs.get('stream'):
+            return self.stream(response_id, model, chunks, usage, settings, rng, error)
+
+        await asyncio.sleep(settings.latency.sample(rng) + sum(settings.chunk_interval.sample(rng) for _ in chunks))
+        if error is not None:
+            raise error
+        if tool_calls:
+            message = {'role': 'assistant', 'content': None,
+                       'tool_calls': [{'id': tool_call.id, 'type': 'function',
+                                       'function': {'name': tool_call.name, 'arguments': tool_call.arguments}}
+                                      for tool_call in tool_calls]}
+        else:
+            message = {'role': 'assistant', 'content': content}
+        return ModelResponse(id=response_id, model=model,
+                             choices=[{'index': 0, 'message': message,
+                                       'finish_reason': 'tool_calls' if tool_calls else 'stop'}],
+                             usage=usage)
+
+    def get_chunks(self, content, tool_calls, chunk_size) -> List[Delta]:
+        if not tool_calls:
+            return [Delta(content=content[i:i + chunk_size], role='assistant')
+                    for i in range(0, len(content), chunk_size)]
+        deltas = []
+        for index, tool_call in enumerate(tool_calls):
+            deltas.append(Delta(content=None, role='assistant', tool_calls=[ChatCompletionDeltaToolCall(
+                index=index, id=tool_call.id, type='function', function=Function(name=tool_call.name, arguments=''))]))
+            for i in range(0, len(tool_call.arguments), chunk_size):
+                deltas.append(Delta(content=None, tool_calls=[ChatCompletionDeltaToolCall(
+                    index=index, function=Function(arguments=tool_call.arguments[i:i + chunk_size]))]))
+        return deltas
+
+    async def stream(self, response_id, model, deltas, usage, settings, rng, error):
+        await asyncio.sleep(settings.latency.sample(rng))
+        # Server errors interrupt the stream halfway
+        for i, delta in enumerate(deltas):
+            if error is not None and i >= len(deltas) // 2:
+                raise error
+            if i > 0:
+                await asyncio.sleep(settings.chunk_interval.sample(rng))
+            yield ModelResponseStream(id=response_id, model=model,
+                                      choices=[StreamingChoices(index=0, delta=delta, finish_reason=None)])
+        if error is not None:
+            raise error
+        finish_reason = 'tool_calls' if deltas and deltas[0].tool_calls else 'stop'
+        yield ModelResponseStream(id=response_id, model=model,
+                                  choices=[StreamingChoices(index=0, delta=Delta(content=None),
+                                                            finish_reason=finish_reason)],
+                                  usage=usage)
+
+
+def create_mock_provider(tinyllm_config: dict) -> MockProvider:
+    mock_config = (tinyllm_config.get('LLM') or {}).get('MOCK') or {}
+    settings = MockModelSettings.from_config(mock_config)
+    models = {name: MockModelSettings.from_config(model_config or {}, defaults=settings)
+              for name, model_config in (mock_config.get('MODELS') or {}).items()}
+    return MockProvider(seed=mock_config.get('SEED') or 0, settings=settings, models=models)
+
+
+mock_provider = None
+
+
+def get_mock_provider() -> MockProvider:
+    # Created from LLM.MOCK on first use, so importing tinyllm doesn't load litellm
+    global mock_provider
+    if mock_provider is None:
+        mock_provider = create_mock_provider(tinyllm.tinyllm_config or {})
+    return mock_provider
+
+
+def set_mock_provider(provider: Optional[MockProvider]):
+    global mock_provider
+    mock_provider = provider
@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, Hashable, Optional
+
+
+class TokenBucket:
+    """
+    Holds up to capacity units, refilled continuously at capacity units per minute.
+    """
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.refill_rate = capacity / 60
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """
+        Seconds until amount units are available. Amounts above the capacity wait for a full bucket.
+        """
+        self.refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(missing, 0) / self.refill_rate
+
+    def consume(self, amount: float):
+        # The level goes negative for amounts above the capacity, so they are paid back before the next request
+        self.refill()
+        self.level -= amount
+
+    def drain(self):
+        self.refill()
+        self.level = min(self.level, 0)
+
+
+class Waiter:
+    __slots__ = ('order', 'tokens', 'event')
+
+    def __init__(self, order, tokens):
+        self.order = order
+        self.tokens = tokens
+        self.event = asyncio.Event()
+
+    def __lt__(self, other):
+        return self.order < other.order
+
+
+class ModelRateLimiter:
+    """
+    Client side admission control for one model or deployment: a request is sent once a requests per minute
+    bucket and a tokens per minute bucket both have room for it.
+
+    Waiting requests are admitted one at a time, by priority (lower first) and then fairly between keys (a user or
+    session): a key with many queued requests takes turns with the others instead of holding the queue.
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.rpm = TokenBucket(rpm) if rpm else None
+        self.tpm = TokenBucket(tpm) if tpm else None
+        self.queue = []
+        self.sequence = itertools.count()
+        # Fair queuing: each key's queued requests get increasing finish tags, served in tag order
+        self.virtual_time = 0
+        self.finish_tags = {}
+        self.admitted = 0
+        self.queued = 0
+        self.total_wait = 0.0
+
+    @property
+    def stats(self):
+        return {
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'waiting': len(self.queue),
+            'total_wait': self.total_wait,
+        }
+
+    def delay(self, tokens: float) -> float:
+        delays = [0.0]
+        if self.rpm is not None:
+            delays.append(self.rpm.delay(1))
+        if self.tpm is not None:
+            delays.append(self.tpm.delay(tokens))
+        return max(delays)
+
+    def _enqueue(self, tokens, priority, key) -> Waiter:
+        tag = max(self.virtual_time, self.finish_tags.get(key, 0)) + 1
+        self.finish_tags[key] = tag
+        waiter = Waiter((priority, tag, next(self.sequence)), tokens)
+        heapq.heappush(self.queue, waiter)
+        return waiter
+
+    def _admit(self, waiter):
+        heapq.heappop(self.queue)
+        # Never backwards: a higher priority request can be admitted with a larger tag than the ones queued after it
+        self.virtual_time = max(self.virtual_time, waiter.order[1] - 1)
+        if self.rpm is not None:
+            self.rpm.consume(1)
+        if self.tpm is not None:
+            self.tpm.consume(waiter.tokens)
+        # Keys that are caught up with the virtual time don't need their tag anymore
+        self.finish_tags = {key: tag for key, tag in self.finish_tags.items() if tag > self.virtual_time}
+
+    def _wake_head(self):
+        if self.queue:
+            self.queue[0].event.set()
+
+    async def acquire(self, tokens: float = 0, priority: int = 0, key: Hashable = None) -> float:
+        """
+        Waits until the request can be sent and returns the time it waited, in seconds.
+        """
+        start = time.monotonic()
+        waiter = self._enqueue(tokens, priority, key)
+        # A new head (like a higher priority request) must check the buckets itself
+        self._wake_head()
+        try:
+            while True:
+                timeout = None
+                if self.queue[0] is waiter:
+                    timeout = self.delay(tokens)
+                    if timeout <= 0:
+                        self._admit(waiter)
+                        break
+                waiter.event.clear()
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            if waiter in self.queue:
+                self.queue.remove(waiter)
+                heapq.heapify(self.queue)
+            raise
+        finally:
+            self._wake_head()
+
+        wait = time.monotonic() - start
+        self.admitted += 1
+        if wait > 0.001:
+            self.queued += 1
+        self.total_wait += wait
+        return wait
+
+    def settle(self, estimated_tokens: float, used_tokens: float):
+        """
+        Corrects the tokens per minute bucket once the actual usage of an admitted request is known.
+        """
+        if self.tpm is not None:
+            self.tpm.refill()
+            self.tpm.level = min(self.tpm.capacity, self.tpm.level + estimated_tokens - used_tokens)
+
+    def on_rate_limited(self):
+        # The provider is out of quota: queued requests wait for the buckets to refill instead of retrying together
+        for bucket in [self.rpm, self.tpm]:
+            if bucket is not None:
+                bucket.drain()
+
+
+class RateLimiter:
+    """
+    Rate limiters by model, from the LLM.RATE_LIMITS config. Models without limits are not queued.
+    """
+
+    def __init__(self, limits: Dict[str, Dict], priorities: Dict = None):
+        self.limiters = {model: ModelRateLimiter(rpm=limit.get('RPM'), tpm=limit.get('TPM'))
+                         for model, limit in limits.items() if limit}
+        self.priorities = {str(key): priority for key, priority in (priorities or {}).items()}
+
+    def get(self, model: str) -> Optional[ModelRateLimiter]:
+        return self.limiters.get(model)
+
+    def get_priority(self, user_id=None, session_id=None) -> int:
+        for key in [user_id, session_id]:
+            if key is not None and str(key) in self.priorities:
+                return self.priorities[str(key)]
+        return 0
+
+
+def create_rate_limiter(tinyllm_config: dict) -> Optional[RateLimiter]:
+    llm_config = tinyllm_config.get('LLM') or {}
+    limits = llm_config.get('RATE_LIMITS') or {}
+    if not limits:
+        return None
+    return RateLimiter(limits, priorities=llm_config.get('PRIORITIES'))
@@ -0,0 +1,99 @@
+from typing import Callable, Optional
+
+import numpy as np
+
+
+class SemanticIndex:
+    """
+    In-memory index of normalized embeddings. Lookups compute all cosine similarities with one matrix product.
+    Once max_entries is reached, new entries replace the oldest ones.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.vectors = None
+        self.values = []
+        self.next_index = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def search(self, vector: np.ndarray):
+        if not self.values:
+            return None, 0.0
+        similarities = self.vectors[:len(self.values)] @ vector
+        index = int(np.argmax(similarities))
+        return self.values[index], float(similarities[index])
+
+    def add(self, vector: np.ndarray, value):
+        if self.vectors is None:
+            self.vectors = np.zeros((min(self.max_entries, 64), vector.shape[0]), dtype=np.float32)
+        if len(self.values) < self.max_entries:
+            if len(self.values) == self.vectors.shape[0]:
+                # Grow the matrix geometrically up to max_entries rows
+                grown = np.zeros((min(self.max_entries, 2 * self.vectors.shape[0]), self.vectors.shape[1]),
+                                 dtype=np.float32)
+                grown[:len(self.values)] = self.vectors
+                self.vectors = grown
+            self.values.append(value)
+            index = len(self.values) - 1
+        else:
+            index = self.next_index
+            self.values[index] = value
+            self.next_index = (index + 1) % self.max_entries
+        self.vectors[index] = vector
+
+
+class SemanticCache:
+    """
+    Caches tiny_function outputs by the embedding of their rendered prompt: a prompt whose embedding has a cosine
+    similarity of at least similarity_threshold with a cached one reuses its output. Entries are scoped, so
+    functions and output models never share them.
+
+    embedding_function follows the ExampleSelector convention: async, takes a text and returns a list of
+    embeddings.
+    """
+
+    def __init__(self,
+                 embedding_function: Callable,
+                 similarity_threshold: float = 0.95,
+                 max_entries: int = 10000):
+        self.embedding_function = embedding_function
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.indexes = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': sum(len(index) for index in self.indexes.values()),
+        }
+
+    async def embed(self, text: str) -> np.ndarray:
+        embeddings = await self.embedding_function(text)
+        vector = np.asarray(embeddings[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, scope, vector: np.ndarray) -> Optional[dict]:
+        index = self.indexes.get(scope)
+        value, similarity = index.search(vector) if index is not None else (None, 0.0)
+        if value is None or similarity < self.similarity_threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, scope, vector: np.ndarray, value: dict):
+        if scope not in self.indexes:
+            self.indexes[scope] = SemanticIndex(max_entries=self.max_entries)
+        self.indexes[scope].add(vector, value)
+
+    def clear(self):
+        self.indexes = {}
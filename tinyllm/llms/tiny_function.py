@@ -1,21 +1,33 @@
+import asyncio
 import functools
-import traceback
 from textwrap import dedent
 
 from pydantic import BaseModel, create_model
-from typing import Type
+from typing import Dict, List, Tuple, Type, Union, get_args, get_origin
 
 from tenacity import retry, stop_after_attempt, retry_if_exception_type, wait_fixed
 
 from tinyllm.agent.agent import Agent
+from tinyllm.agent.agent_stream import AgentStream
 from tinyllm.exceptions import MissingBlockException, LLMJsonValidationError
+from tinyllm.function import DEFAULT_MAX_CONCURRENCY
+from tinyllm.llms.lite_llm import DEFAULT_LLM_MODEL, get_token_limit
+from tinyllm.llms.semantic_cache import SemanticCache
+from tinyllm.prompt_manager import PromptManager
+from tinyllm.util.helpers import count_tokens
+from tinyllm.util.json_stream import validate_partial
 from tinyllm.tracing.langfuse_context import observation
 from tinyllm.util.parse_util import *
 
 
+@functools.lru_cache(maxsize=1024)
+def get_json_output_model(fields: Tuple[Tuple[str, type], ...]) -> Type[BaseModel]:
+    # Building a pydantic model class costs far more than validating with it, so outputs of the same shape share one
+    return create_model('JSONOutput', **{key: (value_type, ...) for key, value_type in fields})
+
+
 def create_pydantic_model_from_dict(data: Dict[str, Any]) -> BaseModel:
-    fields = {key: (type(value), ...) for key, value in data.items()}
-    JSONOutput = create_model('JSONOutput', **fields)
+    JSONOutput = get_json_output_model(tuple((key, type(value)) for key, value in data.items()))
     model_instance = JSONOutput(**data)
     return model_instance
 
@@ -62,70 +74,431 @@ class JsonParsingException(Exception):
     pass
 
 
+BATCH_SYSTEM_PROMPT = """
+BATCH MODE
+You will receive a JSON array of items, each with an "id" and an "input". Process each input independently, following
+the instructions above. Respond with a JSON object {"results": [{"id": <item id>, "output": <output for the item>}]}
+containing exactly one result per item.
+"""
+
+DEFAULT_MAX_BATCH_SIZE = 20
+DEFAULT_OUTPUT_TOKENS_PER_ITEM = 100
+# Token limit used for models missing from LLM_TOKEN_LIMITS and from the litellm model map
+DEFAULT_BATCH_TOKEN_LIMIT = 4096
+# Most models cap the completion size well below their context size
+MAX_BATCH_COMPLETION_TOKENS = 4096
+
+
+FIX_OUTPUT_SYSTEM_ROLE = """
+You fix JSON outputs that don't match their JSON schema. You will receive the schema, the invalid output and the
+validation error. Respond only with the corrected JSON object, keeping the original values wherever possible.
+"""
+
+
+def get_output_model(output_model, output):
+    if output_model is None:
+        return create_pydantic_model_from_dict(output)
+    return output_model(**output)
+
+
+def coerce_value(value, annotation):
+    origin = get_origin(annotation)
+    if origin is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return coerce_value(value, args[0]) if value is not None and len(args) == 1 else value
+    if origin is list:
+        item_annotation = (get_args(annotation) or [Any])[0]
+        values = value if isinstance(value, list) else [value]
+        return [coerce_value(item, item_annotation) for item in values]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return coerce_output(value, annotation)
+    if isinstance(value, list) and len(value) == 1 and annotation in (str, int, float, bool):
+        value = value[0]
+    if annotation in (int, float) and isinstance(value, str):
+        try:
+            number = float(value.strip().rstrip('%').replace(',', ''))
+        except ValueError:
+            return value
+        return int(number) if annotation is int and number.is_integer() else number
+    if annotation is str and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+def coerce_output(output, output_model):
+    """
+    Best-effort coercion of a parsed output to the fields of output_model: unwraps outputs nested in a one-item list
+    or under a single unknown key, and fixes the usual type mismatches (numbers as strings like "85%" or "1,200",
+    numbers for strings, scalars for lists and one-item lists for scalars).
+    """
+    if isinstance(output, list) and len(output) == 1:
+        output = output[0]
+    if output_model is None or not isinstance(output, dict):
+        return output
+    fields = output_model.model_fields
+    if len(output) == 1 and not set(output) & set(fields) and isinstance(next(iter(output.values())), dict):
+        output = next(iter(output.values()))
+    return {key: coerce_value(value, fields[key].annotation) if key in fields else value
+            for key, value in output.items()}
+
+
+class OutputRepairStats:
+    """
+    Counts how the outputs of a tiny_function were obtained: parsed as is, repaired locally (JSON repair and type
+    coercion), fixed by a follow-up call that only sends the bad output and the schema, or not at all. Retried counts
+    the full re-generations that followed a failure.
+    """
+
+    def __init__(self):
+        self.parsed = 0
+        self.repaired = 0
+        self.fixed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def record(self, outcome):
+        setattr(self, outcome, getattr(self, outcome) + 1)
+
+    @property
+    def stats(self):
+        outputs = self.parsed + self.repaired + self.fixed + self.failed
+        return {
+            'parsed': self.parsed,
+            'repaired': self.repaired,
+            'fixed': self.fixed,
+            'failed': self.failed,
+            'retried': self.retried,
+            'repair_rate': (self.repaired + self.fixed) / outputs if outputs else 0.0,
+            'retry_rate': self.retried / outputs if outputs else 0.0,
+        }
+
+
+class CompiledTinyFunction:
+    """
+    Everything a tiny_function needs that doesn't change between calls, prepared once at decoration time: the
+    system prompt with the output schema, the <prompt> template and the LLM call kwargs. The Agent is built on the
+    first call and reused, since it keeps no state between calls.
+    """
+
+    def __init__(self, func, output_model, example_manager, model_kwargs):
+        self.name = func.__name__
+        self.output_model = output_model
+        self.example_manager = example_manager
+        self.system_role = get_system_role(func=func,
+                                           output_model=output_model)
+        prompt = extract_html(func.__doc__.strip(), tag='prompt')
+        self.format_prompt = prompt[0].format if len(prompt) > 0 else None
+        self.model_kwargs = {**model_kwargs, 'response_format': {"type": "json_object"}}
+        self.batch_system_role = self.system_role + BATCH_SYSTEM_PROMPT
+        self.repair_stats = OutputRepairStats()
+        self._agent = None
+        self._batch_agent = None
+        self._fix_agent = None
+        self._stream_agent = None
+
+    @property
+    def agent(self) -> Agent:
+        if self._agent is None:
+            self._agent = Agent(
+                name=self.name,
+                system_role=self.system_role,
+                example_manager=self.example_manager
+            )
+        return self._agent
+
+    @property
+    def batch_agent(self) -> Agent:
+        if self._batch_agent is None:
+            self._batch_agent = Agent(
+                name=self.name + '.batch',
+                system_role=self.batch_system_role,
+                example_manager=self.example_manager
+            )
+        return self._batch_agent
+
+    @property
+    def stream_agent(self) -> AgentStream:
+        if self._stream_agent is None:
+            self._stream_agent = AgentStream(
+                name=self.name + '.stream',
+                system_role=self.system_role,
+                example_manager=self.example_manager,
+                # No memory, so calls don't see each other
+                prompt_manager=PromptManager(system_role=self.system_role,
+                                             example_manager=self.example_manager)
+            )
+        return self._stream_agent
+
+    @property
+    def fix_agent(self) -> Agent:
+        if self._fix_agent is None:
+            self._fix_agent = Agent(
+                name=self.name + '.fix',
+                system_role=FIX_OUTPUT_SYSTEM_ROLE,
+            )
+        return self._fix_agent
+
+    def render_prompt(self, **kwargs) -> str:
+        if self.format_prompt is None:
+            assert 'content' in kwargs, "tinyllm_function requires content kwarg"
+            return kwargs['content']
+        return self.format_prompt(**kwargs)
+
+    def pack_batches(self, items, max_batch_size, output_tokens_per_item):
+        """
+        Greedily packs (id, content) items into batches that fit the model's context limit (get_token_limit) along
+        with the system prompt and the expected outputs.
+        """
+        model = self.model_kwargs.get('model', DEFAULT_LLM_MODEL)
+        token_budget = get_token_limit(model, default=DEFAULT_BATCH_TOKEN_LIMIT) - count_tokens(self.batch_system_role,
+                                                                                                model=model)
+        max_items = max(1, min(max_batch_size, MAX_BATCH_COMPLETION_TOKENS // output_tokens_per_item))
+        item_sizes = [count_tokens(content, model=model) + output_tokens_per_item for _, content in items]
+
+        batches = []
+        batch, batch_size = [], 0
+        for item, item_size in zip(items, item_sizes):
+            if batch and (len(batch) == max_items or batch_size + item_size > token_budget):
+                batches.append(batch)
+                batch, batch_size = [], 0
+            batch.append(item)
+            batch_size += item_size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def validate_output(self, parsed_output) -> Tuple[BaseModel, bool]:
+        """
+        Validates a parsed output against the output model, coercing its types if needed. Returns the output and
+        whether it had to be coerced.
+        """
+        try:
+            return get_output_model(self.output_model, parsed_output), False
+        except Exception:
+            pass
+        try:
+            return get_output_model(self.output_model, coerce_output(parsed_output, self.output_model)), True
+        except Exception as e:
+            raise LLMJsonValidationError(f"Output does not match the expected model: {self.output_model}\n{e}")
+
+    def repair_output(self, msg_content: str) -> Tuple[BaseModel, bool]:
+        """
+        Parses and validates an LLM output, repairing it locally if needed. Returns the output and whether it was
+        repaired. Raises ValueError if the output isn't JSON and LLMJsonValidationError if it doesn't match the model.
+        """
+        try:
+            parsed_output, repaired = json.loads(msg_content), False
+        except ValueError:
+            parsed_output, repaired = json.loads(repair_json(msg_content)), True
+        output, coerced = self.validate_output(parsed_output)
+        return output, repaired or coerced
+
+    async def fix_output(self, msg_content: str, error: Exception) -> BaseModel:
+        """
+        Asks the LLM to fix an invalid output. Only the output, the schema and the error are sent, not the prompt.
+        """
+        schema = json.dumps(self.output_model.model_json_schema()) if self.output_model else "Any JSON object"
+        content = f"JSON SCHEMA\n{schema}\n\nINVALID OUTPUT\n{msg_content}\n\nERROR\n{error}"
+        result = await self.fix_agent(content=content, **self.model_kwargs)
+        if result['status'] != 'success':
+            raise LLMJsonValidationError(f"Output fix failed: {result.get('message')}")
+        fixed_content = result['output']['response']['choices'][0]['message']['content']
+        try:
+            output, _ = self.repair_output(fixed_content)
+        except ValueError as e:
+            raise LLMJsonValidationError(f"Output fix failed: {e}")
+        return output
+
+
 def tiny_function(output_model: Type[BaseModel] = None,
                   example_manager=None,
-                  model_kwargs={}):
+                  model_kwargs={},
+                  semantic_cache: SemanticCache = None):
     def decorator(func):
+        compiled = CompiledTinyFunction(func, output_model, example_manager, model_kwargs)
+        # Semantic cache entries are scoped per function and output model
+        cache_scope = (f"{func.__module__}.{func.__qualname__}",
+                       f"{output_model.__module__}.{output_model.__qualname__}" if output_model else None)
+
+        @observation(observation_type='span', name=func.__name__)
+        async def traced_call(func, *args, **kwargs):
+            agent_input_content = compiled.render_prompt(**kwargs)
+
+            if semantic_cache is not None:
+                prompt_embedding = await semantic_cache.embed(agent_input_content)
+                cached_output = semantic_cache.get(cache_scope, prompt_embedding)
+                if cached_output is not None:
+                    return {
+                        'status': 'success',
+                        'output': get_output_model(output_model, cached_output),
+                        'semantic_cache': 'hit',
+                    }
+
+            result = await compiled.agent(content=agent_input_content,
+                                          **compiled.model_kwargs)
+            if result['status'] == 'success':
+                msg_content = result['output']['response']['choices'][0]['message']['content']
+                # Repair the output locally, then with a follow-up call on the output alone. A full retry is the
+                # last resort.
+                try:
+                    function_output_model, repaired = compiled.repair_output(msg_content)
+                    repair = 'local' if repaired else None
+                except (ValueError, LLMJsonValidationError) as e:
+                    try:
+                        function_output_model, repair = await compiled.fix_output(msg_content, e), 'fix_up'
+                    except LLMJsonValidationError:
+                        compiled.repair_stats.record('failed')
+                        raise
+                compiled.repair_stats.record({None: 'parsed', 'local': 'repaired', 'fix_up': 'fixed'}[repair])
+
+                result = {
+                    'status': 'success',
+                    'output': function_output_model
+                }
+                if repair is not None:
+                    result['repair'] = repair
+                if semantic_cache is not None:
+                    semantic_cache.set(cache_scope, prompt_embedding, function_output_model.model_dump())
+                    result['semantic_cache'] = 'miss'
+                return result
+            else:
+                return {
+                    'status': 'error',
+                    "message": "Agent failed", "details": result
+                }
+
         @functools.wraps(func)
         @retry(
             reraise=True,
             stop=stop_after_attempt(3),
             wait=wait_fixed(1),
-            retry=retry_if_exception_type((MissingBlockException, LLMJsonValidationError))
+            retry=retry_if_exception_type((MissingBlockException, LLMJsonValidationError)),
+            before_sleep=lambda retry_state: compiled.repair_stats.record('retried')
         )
         async def wrapper(*args, **kwargs):
+            response = await traced_call(func, *args, **kwargs)
+            return response
 
-            @observation(observation_type='span', name=func.__name__)
-            async def traced_call(func, *args, **kwargs):
-                system_role = get_system_role(func=func,
-                                              output_model=output_model)
-
-                prompt = extract_html(func.__doc__.strip(), tag='prompt')
-                if len(prompt) == 0:
-                    assert 'content' in kwargs, "tinyllm_function requires content kwarg"
-                    agent_input_content = kwargs['content']
+        @observation(observation_type='span', name=func.__name__, stream=True)
+        async def traced_stream(func, *args, **kwargs):
+            message = None
+            validated, members = {}, 0
+            async for message in compiled.stream_agent(content=compiled.render_prompt(**kwargs),
+                                                       **compiled.model_kwargs):
+                if message['status'] != 'success':
+                    yield {'status': 'error', 'message': "Agent failed", 'details': message}
+                    return
+                partial_json = message['output']['partial_json']
+                # Validated fields only change when a top level member is complete
+                if partial_json is None or partial_json['complete'] or partial_json['members'] == members:
+                    continue
+                members = partial_json['members']
+                if output_model is None:
+                    partial_output = {key: value for key, value in partial_json['value'].items()
+                                      if key != partial_json['pending_key']}
                 else:
-                    prompt = prompt[0]
-                    agent_input_content = prompt.format(**kwargs)
-
-                agent = Agent(
-                    name=func.__name__,
-                    system_role=system_role,
-                    example_manager=example_manager
-                )
-                model_kwargs['response_format'] = {"type": "json_object"}
-
-                result = await agent(content=agent_input_content,
-                                     **model_kwargs)
-                if result['status'] == 'success':
-                    msg_content = result['output']['response']['choices'][0]['message']['content']
-                    try:
-                        parsed_output = json.loads(msg_content)
-                        if output_model is None:
-                            function_output_model = create_pydantic_model_from_dict(parsed_output)
-                        else:
-                            try:
-                                function_output_model = output_model(**parsed_output)
-                            except:
-                                raise LLMJsonValidationError(f"Output does not match the expected model: {output_model}")
-
-                        return {
-                            'status': 'success',
-                            'output': function_output_model
-                        }
-
-                    except (ValueError, json.JSONDecodeError) as e:
-                        return {"message": f"Parsing error : {traceback.format_exc()}",
-                                'status': 'error'}
-                else:
-                    return {
-                        'status': 'error',
-                        "message": "Agent failed", "details": result
-                    }
+                    partial_output = validate_partial(output_model, partial_json['value'],
+                                                      partial_json['pending_key'])
+                if partial_output != validated:
+                    validated = partial_output
+                    yield {'status': 'streaming', 'output': partial_output}
 
-            response = await traced_call(func, *args, **kwargs)
-            return response
+            completion = message['output']['completion'] if message is not None else ''
+            try:
+                try:
+                    function_output_model, repaired = compiled.repair_output(completion)
+                    repair = 'local' if repaired else None
+                except (ValueError, LLMJsonValidationError) as e:
+                    function_output_model, repair = await compiled.fix_output(completion, e), 'fix_up'
+            except LLMJsonValidationError as e:
+                compiled.repair_stats.record('failed')
+                yield {'status': 'error', 'message': str(e)}
+                return
+            compiled.repair_stats.record({None: 'parsed', 'local': 'repaired', 'fix_up': 'fixed'}[repair])
+            result = {'status': 'success', 'output': function_output_model.model_dump()}
+            if repair is not None:
+                result['repair'] = repair
+            yield result
+
+        async def stream(*args, **kwargs):
+            """
+            Streams the function output: yields {'status': 'streaming', 'output': dict} with the fields that are
+            complete and valid so far whenever they change, then the final output like a regular call. Outputs are
+            repaired like regular calls, but not retried.
+            """
+            async for message in traced_stream(func, *args, **kwargs):
+                yield message
+
+        async def run_batch(batch, output_tokens_per_item):
+            # Returns the valid outputs of a batch by item id
+            content = json.dumps([{'id': item_id, 'input': item_content} for item_id, item_content in batch])
+            result = await compiled.batch_agent(content=content,
+                                                **{**compiled.model_kwargs,
+                                                   'max_tokens': len(batch) * output_tokens_per_item})
+            if result['status'] != 'success':
+                return {}
+            try:
+                msg_content = result['output']['response']['choices'][0]['message']['content']
+                item_results = parse_json(msg_content)['results']
+            except (ValueError, KeyError, TypeError):
+                return {}
+
+            batch_ids = {item_id for item_id, _ in batch}
+            outputs = {}
+            for item_result in item_results:
+                try:
+                    item_id = str(item_result['id'])
+                    if item_id in batch_ids:
+                        outputs[item_id] = compiled.validate_output(item_result['output'])[0].model_dump()
+                except Exception:
+                    # Invalid items are re-issued
+                    continue
+            return outputs
+
+        @observation(observation_type='span', name=func.__name__ + '.batch')
+        async def traced_batch(inputs, max_batch_size, output_tokens_per_item, max_attempts, max_concurrency):
+            pending = [(str(i), compiled.render_prompt(**kwargs)) for i, kwargs in enumerate(inputs)]
+            outputs = {}
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def run_bounded(batch):
+                async with semaphore:
+                    return await run_batch(batch, output_tokens_per_item)
+
+            attempts = 0
+            while pending and attempts < max_attempts:
+                attempts += 1
+                batches = compiled.pack_batches(pending, max_batch_size, output_tokens_per_item)
+                for batch_outputs in await asyncio.gather(*[run_bounded(batch) for batch in batches]):
+                    outputs.update(batch_outputs)
+                pending = [item for item in pending if item[0] not in outputs]
+
+            results = [{'status': 'success', 'output': outputs[str(i)]} if str(i) in outputs else
+                       {'status': 'error', 'message': f"No valid output after {attempts} attempts"}
+                       for i in range(len(inputs))]
+            return {'results': results, 'attempts': attempts}
+
+        async def batch(inputs: List[Dict],
+                        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                        output_tokens_per_item: int = DEFAULT_OUTPUT_TOKENS_PER_ITEM,
+                        max_attempts: int = 3,
+                        max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[Dict]:
+            """
+            Runs the function on many inputs (kwargs dicts) by packing them into JSON-array requests. Each item is
+            validated against output_model on its own, and only invalid or missing items are re-issued. Returns one
+            {'status', 'output'} dict per input, in order.
+            """
+            response = await traced_batch(inputs=inputs,
+                                          max_batch_size=max_batch_size,
+                                          output_tokens_per_item=output_tokens_per_item,
+                                          max_attempts=max_attempts,
+                                          max_concurrency=max_concurrency)
+            return response['results']
 
+        wrapper.compiled = compiled
+        wrapper.batch = batch
+        wrapper.stream = stream
+        wrapper.repair_stats = compiled.repair_stats
         return wrapper
 
     return decorator
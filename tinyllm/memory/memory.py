@@ -4,7 +4,7 @@ from typing import Union
 from tinyllm.function import Function
 from tinyllm.util.helpers import count_tokens
 from tinyllm.util.message import Message
-from tinyllm.validator import Validator
+from tinyllm.validator import Validator, validate_init
 
 
 class MemoryOutputValidator(Validator):
@@ -50,7 +50,7 @@ class BufferMemory(Memory):
     def __init__(self,
                  buffer_size=10,
                  **kwargs):
-        BufferMemoryInitValidator(buffer_size=buffer_size)
+        validate_init(BufferMemoryInitValidator, buffer_size=buffer_size)
         super().__init__(**kwargs)
         self.buffer_size = buffer_size
         self.memories = []
@@ -62,7 +62,7 @@ class BufferMemory(Memory):
         # Make sure we keep complete tool calls msgs
         for memory in self.memories[::-1]:
             memories_to_return.append(memory)
-            if 'tool_calls' in memory.to_dict() or memory.role == 'tool':
+            if 'tool_calls' in memory.wire_dict or memory.role == 'tool':
                 continue
             else:
                 msg_count += 1
@@ -86,13 +86,13 @@ class CharacterBufferMemory(BufferMemory):
         size_count = 0
         # Make sure we keep complete tool calls msgs
         for memory in self.memories[::-1]:
-            size_count += len(str(memory.to_dict())) * 0.9
+            size_count += len(str(memory.wire_dict)) * 0.9
             if size_count >= self.buffer_size:
                 break
             memories_to_return.append(memory)
-            if 'tool_calls' in memory.to_dict() or memory.role == 'tool':
+            if 'tool_calls' in memory.wire_dict or memory.role == 'tool':
                 continue
             else:
-                size_count += len(str(memory.to_dict()))*0.9
+                size_count += len(str(memory.wire_dict))*0.9
 
         return memories_to_return[::-1]
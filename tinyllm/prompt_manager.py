@@ -43,7 +43,7 @@ class PromptManager:
                            0] + '>'
 
         system_content = self.update_system_content(self.system_role) + '\n\n' + current_time
-        system_msg = SystemMessage(system_content)
+        system_msg = SystemMessage(system_content, validate=False)
         memories = [] if self.memory is None else await self.memory.get_memories()
         examples = []
 
@@ -98,9 +98,9 @@ class PromptManager:
     def get_run_config(self, messages, **kwargs):
 
         user_msg = messages[-1]
-        user_msg_size = count_tokens(user_msg)
-        all_msg_size = count_tokens(messages)
         model = kwargs.get('model', DEFAULT_LLM_MODEL)
+        user_msg_size = count_tokens(user_msg, model=model)
+        all_msg_size = count_tokens(messages, model=model)
         model_token_limit = LLM_TOKEN_LIMITS[model]
 
         if 'max_tokens' in kwargs:
@@ -11,7 +11,50 @@ class DocumentTypes(Enum):
     IMAGE = 'image'
 
 
+class Metadata(dict):
+    """
+    Dict that counts its in-place changes, so documents know when their cached string and size are stale.
+    """
+    version = 0
+
+    def _changed(self):
+        self.version += 1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._changed()
+        return value
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._changed()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._changed()
+        return item
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+
 class Document:
+    # Assigning any of these attributes invalidates the cached strings and sizes
+    cached_on = ('content', 'metadata', 'type', 'header', 'include_keys')
 
     def __init__(self,
                  content,
@@ -27,18 +70,43 @@ class Document:
         self.include_keys = include_keys
         self.embeddings = embeddings
 
+    def __setattr__(self, name, value):
+        if name == 'metadata' and not isinstance(value, Metadata):
+            value = Metadata(value)
+        super().__setattr__(name, value)
+        if name in self.cached_on:
+            self.invalidate()
+
+    def invalidate(self):
+        self._strings = {}
+        self._size = None
+
+    def _check_metadata(self):
+        # In-place changes to the metadata dict don't go through __setattr__
+        if self.__dict__.get('_metadata_version') != self.metadata.version:
+            self.invalidate()
+            self._metadata_version = self.metadata.version
+
     @property
     def size(self):
-        content = self.to_string()
-        return count_tokens(content)
+        self._check_metadata()
+        if self._size is None:
+            self._size = count_tokens(self.to_string())
+        return self._size
 
     def to_string(self,
                   **kwargs):
-        full_dict = self.metadata.copy()
-        full_dict.update({'content': self.content})
-        return stringify_dict(header=kwargs.get('header', self.header),
-                              dict=full_dict,
-                              include_keys=kwargs.get('include_keys', self.include_keys))
+        self._check_metadata()
+        header = kwargs.get('header', self.header)
+        include_keys = kwargs.get('include_keys', self.include_keys)
+        key = (header, tuple(include_keys))
+        if key not in self._strings:
+            full_dict = self.metadata.copy()
+            full_dict.update({'content': self.content})
+            self._strings[key] = stringify_dict(header=header,
+                                                dict=full_dict,
+                                                include_keys=include_keys)
+        return self._strings[key]
 
 
 class ImageDocument(Document):
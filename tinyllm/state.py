@@ -38,6 +38,7 @@ ALLOWED_TRANSITIONS = {
     ],
     States.PROCESSED_OUTPUT_VALIDATION: [
         States.PROCESSED_OUTPUT_EVALUATION,
+        States.CLOSING,
         States.COMPLETE,
         States.FAILED,
     ],
@@ -3,7 +3,7 @@ import logging
 import sys
 import unittest
 
-from tinyllm import langfuse_client, tinyllm_config
+from tinyllm import flush_traces, tinyllm_config
 
 
 class AsyncioTestCase(unittest.TestCase):
@@ -15,5 +15,5 @@ class AsyncioTestCase(unittest.TestCase):
     def tearDown(self):
         self.loop.close()
         asyncio.set_event_loop(None)
-        langfuse_client.flush()
+        flush_traces()
 
@@ -1,6 +1,10 @@
+import asyncio
+import json
 import unittest
+from unittest.mock import patch
 
 from tinyllm.agent.tool.tool import Tool
+from tinyllm.llms.lite_llm_stream import replay_chunks
 from tinyllm.tests.base import AsyncioTestCase
 from tinyllm.agent.agent_stream import AgentStream
 from tinyllm.agent.tool import Toolkit, tinyllm_toolkit
@@ -83,6 +87,158 @@ class TestStreamingAgent(AsyncioTestCase):
         self.assertEqual(result[-1]['status'], 'success', "The last message status should be 'success'")
 
 
+    def run_tool_calls(self, speculative_tools=False, idempotent=False, arguments_suffix=''):
+        events = []
+
+        async def get_user_property(asked_property):
+            events.append(f"tool {asked_property}")
+            return {'name': 'Elias', 'birthday': 'January 1st'}[asked_property]
+
+        tool = Tool(name="get_user_property",
+                    description="Retrieves information about the user",
+                    python_lambda=get_user_property,
+                    parameters=tools[0].parameters,
+                    idempotent=idempotent)
+        tool_calls = [{'id': f"call_{asked_property}", 'type': 'function',
+                       'function': {'name': 'get_user_property',
+                                    'arguments': json.dumps({'asked_property': asked_property}) + suffix}}
+                      for asked_property, suffix in [('name', ''), ('birthday', arguments_suffix)]]
+        responses = [
+            {'choices': [{'index': 0, 'finish_reason': 'tool_calls',
+                          'message': {'role': 'assistant', 'content': None, 'tool_calls': tool_calls}}]},
+            {'choices': [{'index': 0, 'finish_reason': 'stop',
+                          'message': {'role': 'assistant', 'content': 'Elias, born on January 1st'}}]},
+        ]
+        requests = []
+
+        async def acompletion(**kwargs):
+            requests.append(kwargs['messages'])
+            response = responses[len(requests) - 1]
+
+            async def stream():
+                async for chunk in replay_chunks(response, chunk_size=8):
+                    if chunk['choices'][0]['finish_reason'] is not None:
+                        events.append('end of stream')
+                    yield chunk
+                    await asyncio.sleep(0.01)
+
+            return stream()
+
+        agent = AgentStream(name="Test: Agent Stream parallel tools",
+                            toolkit=Toolkit(name='Toolkit', tools=[tool]),
+                            speculative_tools=speculative_tools)
+
+        async def async_test():
+            return [message async for message in agent(content="What is my name and birthday?")]
+
+        with patch('tinyllm.llms.lite_llm.acompletion', acompletion):
+            result = self.loop.run_until_complete(async_test())
+
+        self.assertEqual(result[-1]['status'], 'success')
+        self.assertEqual(result[-1]['output']['completion'], 'Elias, born on January 1st')
+        tool_messages = [message for message in requests[1] if message['role'] == 'tool']
+        self.assertEqual([(message['tool_call_id'], message['content']) for message in tool_messages],
+                         [('call_name', 'Elias'), ('call_birthday', 'January 1st')])
+        return events, agent.speculation_stats
+
+    def test_parallel_tool_calls(self):
+        events, stats = self.run_tool_calls()
+        self.assertEqual(events, ['end of stream', 'tool name', 'tool birthday', 'end of stream'])
+        # Tools that aren't idempotent never run speculatively
+        events, stats = self.run_tool_calls(speculative_tools=True)
+        self.assertEqual(events, ['end of stream', 'tool name', 'tool birthday', 'end of stream'])
+
+    def test_speculative_tool_calls(self):
+        events, stats = self.run_tool_calls(speculative_tools=True, idempotent=True)
+        # Each call ran as soon as it was parsed, before the end of the stream, and its result was reused
+        self.assertEqual(events, ['tool name', 'tool birthday', 'end of stream', 'end of stream'])
+        self.assertEqual(stats, {'speculated': 2, 'reused': 2, 'cancelled': 0})
+
+        # The final arguments of the second call differ from the ones it was started with
+        events, stats = self.run_tool_calls(speculative_tools=True, idempotent=True, arguments_suffix=' ' * 16)
+        self.assertEqual(stats, {'speculated': 2, 'reused': 1, 'cancelled': 1})
+        self.assertEqual(events.count('tool birthday'), 2)
+
+
+    def run_unused_speculative_call(self, final_chunk=None, error=None):
+        events = []
+        started = asyncio.Event()
+
+        async def get_user_property(asked_property):
+            events.append('tool started')
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                events.append('tool cancelled')
+                raise
+
+        tool = Tool(name="get_user_property",
+                    description="Retrieves information about the user",
+                    python_lambda=get_user_property,
+                    parameters=tools[0].parameters,
+                    idempotent=True)
+        tool_call = {'id': 'call_name', 'type': 'function',
+                     'function': {'name': 'get_user_property', 'arguments': json.dumps({'asked_property': 'name'})}}
+        response = {'choices': [{'index': 0, 'finish_reason': 'tool_calls',
+                                 'message': {'role': 'assistant', 'content': None, 'tool_calls': [tool_call]}}]}
+
+        async def acompletion(**kwargs):
+            async def stream():
+                async for chunk in replay_chunks(response, chunk_size=8):
+                    if chunk['choices'][0]['finish_reason'] is not None:
+                        # The speculative call is running when the stream ends
+                        await started.wait()
+                        chunk = final_chunk(chunk) if final_chunk else chunk
+                    yield chunk
+
+            return stream()
+
+        agent = AgentStream(name="Test: Agent Stream unused speculative call",
+                            toolkit=Toolkit(name='Toolkit', tools=[tool]),
+                            speculative_tools=True)
+        if error is not None:
+            llm = agent.llm
+
+            async def failing_llm(**kwargs):
+                async for message in llm(**kwargs):
+                    if message['output']['streaming_status'] == 'finished-streaming':
+                        message = {'status': 'error', 'message': error}
+                    yield message
+
+            agent.llm = failing_llm
+
+        async def async_test():
+            messages = [message async for message in agent(content="What is my name?")]
+            # Cancelled tasks finish within a few iterations of the loop, tasks that were left running never do
+            tasks = asyncio.all_tasks() - {asyncio.current_task()}
+            _, pending = await asyncio.wait(tasks, timeout=1) if tasks else (set(), set())
+            return messages, pending
+
+        with patch('tinyllm.llms.lite_llm.acompletion', acompletion):
+            messages, pending = self.loop.run_until_complete(async_test())
+
+        self.assertEqual(events, ['tool started', 'tool cancelled'])
+        self.assertEqual(pending, set())
+        self.assertEqual(agent.speculation_stats, {'speculated': 1, 'reused': 0, 'cancelled': 1})
+        return messages
+
+    def test_unused_speculative_call_cancelled(self):
+        # The model stops with an answer instead of the tool call
+        def stop(chunk):
+            chunk['choices'][0]['finish_reason'] = 'stop'
+            chunk['choices'][0]['delta']['content'] = 'I am not sure'
+            return chunk
+
+        messages = self.run_unused_speculative_call(final_chunk=stop)
+        self.assertEqual(messages[-1]['status'], 'success')
+        self.assertEqual(messages[-1]['output']['type'], 'assistant')
+
+        # The model fails at the end of the stream
+        messages = self.run_unused_speculative_call(error='Connection lost')
+        self.assertEqual(messages[-1]['status'], 'error')
+        self.assertIn('Connection lost', messages[-1]['message'])
+
 # This allows the test to be run standalone
 if __name__ == '__main__':
     unittest.main()
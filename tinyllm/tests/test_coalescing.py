@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from litellm import ModelResponse
+
+from tinyllm.llms.coalescing import RequestCoalescer, request_coalescer, request_key
+from tinyllm.llms.lite_llm import LiteLLM
+from tinyllm.tests.base import AsyncioTestCase
+from tinyllm.util.message import UserMessage
+
+
+class TestCoalescing(AsyncioTestCase):
+
+    def test_request_key(self):
+        self.assertEqual(request_key({'model': 'gpt-4o-mini', 'temperature': 0}),
+                         request_key({'temperature': 0, 'model': 'gpt-4o-mini'}))
+        self.assertNotEqual(request_key({'model': 'gpt-4o-mini', 'temperature': 0}),
+                            request_key({'model': 'gpt-4o-mini', 'temperature': 1}))
+
+    def test_coalescer(self):
+        coalescer = RequestCoalescer()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        async def run_all():
+            return await asyncio.gather(*[coalescer.run(key, call) for key in ['a', 'a', 'a', 'b']])
+
+        results = self.loop.run_until_complete(run_all())
+        self.assertEqual([result for result, _ in results], ['result'] * 4)
+        self.assertEqual([coalesced for _, coalesced in results], [False, True, True, False])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(coalescer.stats, {'issued': 2, 'coalesced': 2, 'in_flight': 0})
+
+    def test_litellm_coalescing(self):
+        calls = []
+
+        async def acompletion(**kwargs):
+            calls.append(kwargs)
+            await asyncio.sleep(0.05)
+            return ModelResponse(choices=[{'message': {'role': 'assistant', 'content': 'positive'},
+                                           'finish_reason': 'stop'}])
+
+        litellm_chat = LiteLLM(name='Test: LiteLLM coalescing', coalesce=True)
+        messages = [UserMessage('Classify: great product')]
+        issued = request_coalescer.issued
+
+        async def run_all():
+            return await asyncio.gather(*[litellm_chat(messages=messages, model='gpt-4o-mini') for _ in range(5)])
+
+        with patch('tinyllm.llms.lite_llm.acompletion', acompletion):
+            results = self.loop.run_until_complete(run_all())
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(request_coalescer.issued - issued, 1)
+        self.assertTrue(all(result['output']['completion'] == 'positive' for result in results))
+        self.assertEqual(sorted(result['output']['generation_metadata']['coalesced'] for result in results),
+                         [False, True, True, True, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,18 @@
+import asyncio
+import gc
 import unittest
+from unittest.mock import patch
 
+from pydantic import BaseModel, ValidationError
+
+import tinyllm
 from tinyllm.tests.base import AsyncioTestCase
+from tinyllm.execution_context import current_execution_context
 from tinyllm.function import Function
+from tinyllm.function_stream import FunctionStream
+from tinyllm.tracing.langfuse_context import current_observation_context
 from tinyllm.exceptions import InvalidStateTransition
-from tinyllm.validator import Validator
+from tinyllm.validator import Validator, is_noop_validator
 from tinyllm.state import States
 
 
@@ -25,6 +34,66 @@ class AddOneOperator(Function):
         return {"value": result}
 
 
+class YieldingAddOneOperator(AddOneOperator):
+
+    async def run(self, **kwargs):
+        # Yield to the event loop so concurrent calls interleave
+        await asyncio.sleep(0)
+        return {"value": kwargs["value"] + 1}
+
+
+class ConcurrencyTrackingOperator(AddOneOperator):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def run(self, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # Later inputs finish first
+        await asyncio.sleep(0.01 * (10 - kwargs["value"]))
+        self.in_flight -= 1
+        return {"value": kwargs["value"] + 1}
+
+
+class GatedAddOneOperator(AddOneOperator):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.gates = {}
+
+    async def run(self, **kwargs):
+        # Each call completes when the test opens its gate
+        await self.gates[kwargs["value"]].wait()
+        return {"value": kwargs["value"] + 1}
+
+
+class NestedAddOneOperator(Function):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.add_one = AddOneOperator(name="AddOneTest: nested")
+
+    async def run(self, **kwargs):
+        result = await self.add_one(**kwargs)
+        return result['output']
+
+
+class CountingStream(FunctionStream):
+
+    async def run(self, **kwargs):
+        for i in range(3):
+            yield {"streaming_status": "streaming", "type": "assistant_response", "last_completion_delta": None,
+                   "completion": str(i)}
+
+
+class ParentRecordingOperator(Function):
+
+    async def run(self, **kwargs):
+        return {"parent": self.context.parent}
+
+
 class TestFunction(AsyncioTestCase):
 
     def test_add_one(self):
@@ -43,6 +112,116 @@ class TestFunction(AsyncioTestCase):
         self.loop.run_until_complete(operator(value="wrong input"))
         assert operator.state == States.FAILED
 
+    def test_concurrent_calls(self):
+        operator = YieldingAddOneOperator(name="AddOneTest: concurrent calls")
+
+        async def gather_calls():
+            return await asyncio.gather(*[operator(value=float(i)) for i in range(1000)])
+
+        results = self.loop.run_until_complete(gather_calls())
+        self.assertTrue(all(result['status'] == 'success' for result in results))
+        self.assertEqual([result['output']['value'] for result in results], [i + 1.0 for i in range(1000)])
+        self.assertEqual(operator.state, States.COMPLETE)
+
+    def test_batch(self):
+        operator = ConcurrencyTrackingOperator(name="AddOneTest: batch")
+        inputs = [{"value": float(i)} for i in range(10)] + [{"value": "wrong input"}]
+
+        results = self.loop.run_until_complete(operator.batch(inputs, max_concurrency=3))
+
+        self.assertEqual(operator.max_in_flight, 3)
+        self.assertEqual([result['output']['value'] for result in results[:10]], [i + 1.0 for i in range(10)])
+        self.assertEqual(results[10]['status'], 'error')
+
+    def test_map_completion_order(self):
+        operator = GatedAddOneOperator(name="AddOneTest: map")
+
+        async def inputs():
+            for i in range(5):
+                yield {"value": float(i)}
+
+        async def collect():
+            operator.gates = {float(i): asyncio.Event() for i in range(5)}
+            # Calls complete from the last input to the first: each result opens the gate of the previous input
+            operator.gates[4.0].set()
+            indexes = []
+            async for index, result in operator.map(inputs(), max_concurrency=5, ordered=False):
+                indexes.append(index)
+                if index > 0:
+                    operator.gates[float(index - 1)].set()
+            return indexes
+
+        indexes = self.loop.run_until_complete(asyncio.wait_for(collect(), timeout=5))
+        self.assertEqual(indexes, [4, 3, 2, 1, 0])
+
+    def test_stream_context_not_leaked(self):
+        stream = CountingStream(name="CountingStream")
+        errors = []
+        self.loop.set_exception_handler(lambda loop, context: errors.append(context))
+
+        async def consume(stop_early):
+            seen = []
+            async for message in stream(value=1):
+                seen.append((current_execution_context.get(), current_observation_context.get()))
+                if stop_early:
+                    break
+            return seen
+
+        for stop_early in [False, True]:
+            seen = self.loop.run_until_complete(consume(stop_early))
+            # The consumer never sees the stream call as its current call or observation, during or after iteration
+            self.assertTrue(all(context == (None, None) for context in seen))
+            self.assertIsNone(current_execution_context.get())
+            self.assertIsNone(current_observation_context.get())
+
+        # The generator left after the break is finalized without errors
+        gc.collect()
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual(errors, [])
+
+        async def break_then_call():
+            async for message in stream(value=1):
+                break
+            return await ParentRecordingOperator()(value=1)
+
+        result = self.loop.run_until_complete(break_then_call())
+        self.assertIsNone(result['output']['parent'])
+
+    def test_validation_modes(self):
+        operator = NestedAddOneOperator(name="AddOneTest: validation modes")
+
+        # The nested call validates its input, which turns the int into a float
+        result = self.loop.run_until_complete(operator(value=5))
+        self.assertEqual(type(result['output']['value']), float)
+
+        with patch.object(tinyllm, 'validation_mode', 'boundary'):
+            result = self.loop.run_until_complete(operator(value=5))
+            self.assertEqual(type(result['output']['value']), int)
+            # The outermost call still validates
+            self.assertEqual(self.loop.run_until_complete(AddOneOperator()(value="wrong input"))['status'], 'error')
+
+        with patch.object(tinyllm, 'validation_mode', 'off'):
+            result = self.loop.run_until_complete(AddOneOperator()(value=5))
+            self.assertEqual(type(result['output']['value']), int)
+            Function(stream='not a bool')
+        with self.assertRaises(ValidationError):
+            Function(stream='not a bool')
+
+    def test_noop_validator(self):
+        class Point(BaseModel):
+            x: int
+
+        self.assertTrue(is_noop_validator(Validator))
+        self.assertFalse(is_noop_validator(InputValidator))
+        # The base Validator is skipped, payloads are passed through with their pydantic models dumped like
+        # model_dump does
+        value = object()
+        result = self.loop.run_until_complete(Function()(value=value, points=[Point(x=1)]))
+        self.assertIs(result['output']['value'], value)
+        self.assertEqual(result['output']['points'], [{'x': 1}])
+        # Empty payloads still fail
+        self.assertEqual(self.loop.run_until_complete(Function()())['status'], 'error')
+
 
 
 if __name__ == '__main__':
@@ -0,0 +1,90 @@
+import unittest
+from typing import List, Optional
+from unittest.mock import patch
+
+from litellm import ModelResponse
+from pydantic import BaseModel
+
+from tinyllm.llms.tiny_function import tiny_function, coerce_output, FIX_OUTPUT_SYSTEM_ROLE
+from tinyllm.tests.base import AsyncioTestCase
+from tinyllm.util.parse_util import parse_json, repair_json
+
+
+class RiskScoreOutput(BaseModel):
+    risk_score: float
+    reasons: List[str]
+    comment: Optional[str] = None
+
+
+@tiny_function(output_model=RiskScoreOutput, model_kwargs={'model': 'gpt-4'})
+async def calculate_risk_score(bank_account_history: str):
+    """
+    <system>
+    Extract a Risk Score between 0 and 1 based on the bank account history, and the reasons for it.
+    </system>
+
+    <prompt>
+    {bank_account_history}
+    </prompt>
+    """
+    pass
+
+
+def make_acompletion(contents, requests):
+    async def acompletion(**kwargs):
+        requests.append(kwargs['messages'])
+        return ModelResponse(choices=[{'message': {'role': 'assistant', 'content': contents[len(requests) - 1]},
+                                       'finish_reason': 'stop'}])
+
+    return acompletion
+
+
+class TestJsonRepair(AsyncioTestCase):
+
+    def test_repair_json(self):
+        self.assertEqual(parse_json('Sure:\n```json\n{"a": [1, 2,],}\n```'), {'a': [1, 2]})
+        self.assertEqual(parse_json('{"a": "unterminated'), {'a': 'unterminated'})
+        self.assertEqual(parse_json('{"a": {"b": True, "c": None'), {'a': {'b': True, 'c': None}})
+        self.assertEqual(parse_json('{"a": "multi\nline"} and some prose'), {'a': 'multi\nline'})
+        self.assertEqual(repair_json('no json here'), 'no json here')
+        with self.assertRaises(ValueError):
+            parse_json('no json here')
+
+    def test_coerce_output(self):
+        self.assertEqual(coerce_output({'output': {'risk_score': '85%', 'reasons': 'salary', 'comment': 3}},
+                                       RiskScoreOutput),
+                         {'risk_score': 85.0, 'reasons': ['salary'], 'comment': '3'})
+        self.assertEqual(coerce_output([{'risk_score': ['0.5']}], RiskScoreOutput), {'risk_score': 0.5})
+
+    def test_local_repair(self):
+        requests = []
+        contents = ['```json\n{"risk_score": "0.5", "reasons": "irregular income",}\n```']
+        with patch('tinyllm.llms.lite_llm.acompletion', make_acompletion(contents, requests)):
+            result = self.loop.run_until_complete(calculate_risk_score(bank_account_history="salary"))
+
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['repair'], 'local')
+        self.assertEqual(result['output'], {'risk_score': 0.5, 'reasons': ['irregular income'], 'comment': None})
+        self.assertEqual(len(requests), 1)
+
+    def test_fix_up(self):
+        stats = calculate_risk_score.repair_stats.stats
+        requests = []
+        contents = ['{"risk_score": "high"}', '{"risk_score": 0.9, "reasons": ["overdrafts"]}']
+        with patch('tinyllm.llms.lite_llm.acompletion', make_acompletion(contents, requests)):
+            result = self.loop.run_until_complete(calculate_risk_score(bank_account_history="monthly salary"))
+
+        self.assertEqual(result['repair'], 'fix_up')
+        self.assertEqual(result['output'], {'risk_score': 0.9, 'reasons': ['overdrafts'], 'comment': None})
+        # The follow-up only sends the bad output and the schema
+        fix_messages = requests[1]
+        self.assertIn(FIX_OUTPUT_SYSTEM_ROLE.strip(), fix_messages[0]['content'])
+        self.assertIn('{"risk_score": "high"}', fix_messages[-1]['content'])
+        self.assertIn('"reasons"', fix_messages[-1]['content'])
+        self.assertNotIn("monthly salary", fix_messages[-1]["content"])
+        self.assertEqual(calculate_risk_score.repair_stats.fixed, stats['fixed'] + 1)
+        self.assertEqual(calculate_risk_score.repair_stats.retried, stats['retried'])
+
+
+if __name__ == '__main__':
+    unittest.main()
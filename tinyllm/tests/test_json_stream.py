@@ -0,0 +1,105 @@
+import json
+import unittest
+from typing import List
+from unittest.mock import patch
+
+from pydantic import BaseModel
+
+from tinyllm.llms.lite_llm_stream import LiteLLMStream, replay_chunks
+from tinyllm.llms.tiny_function import tiny_function
+from tinyllm.tests.base import AsyncioTestCase
+from tinyllm.util.json_stream import IncrementalJsonParser, validate_partial
+from tinyllm.util.message import UserMessage
+
+
+class RiskScoreOutput(BaseModel):
+    risk_score: float
+    reasons: List[str]
+
+
+@tiny_function(output_model=RiskScoreOutput, model_kwargs={'model': 'gpt-4'})
+async def calculate_risk_score(bank_account_history: str):
+    """
+    <system>
+    Extract a Risk Score between 0 and 1 based on the bank account history, and the reasons for it.
+    </system>
+
+    <prompt>
+    {bank_account_history}
+    </prompt>
+    """
+    pass
+
+
+def make_acompletion(message, chunk_size=4):
+    response = {'id': 'chatcmpl-test', 'model': 'gpt-4',
+                'choices': [{'index': 0, 'message': message,
+                             'finish_reason': 'tool_calls' if message.get('tool_calls') else 'stop'}]}
+
+    async def acompletion(**kwargs):
+        async def stream():
+            async for chunk in replay_chunks(response, chunk_size=chunk_size):
+                yield chunk
+
+        return stream()
+
+    return acompletion
+
+
+class TestJsonStream(AsyncioTestCase):
+
+    def test_incremental_parser(self):
+        document = '```json\n{"name": "Ali\\"ce", "age": 31, "tags": ["a", {"b": null}], "ok": true}\n```'
+        parser = IncrementalJsonParser()
+        values = []
+        for char in document:
+            parser.feed(char)
+            values.append(parser.value)
+
+        self.assertTrue(parser.complete)
+        self.assertEqual(parser.value, json.loads(document[8:-4]))
+        self.assertIn({'name': 'Ali"c'}, values)
+        # Numbers and literals only show up once complete
+        self.assertNotIn({'name': 'Ali"ce', 'age': 3}, values)
+        self.assertIn({'name': 'Ali"ce', 'age': 31, 'tags': ['a', {}]}, values)
+
+        parser = IncrementalJsonParser()
+        parser.feed('{"name": "Al')
+        self.assertEqual(parser.pending_key, 'name')
+        self.assertEqual(validate_partial(RiskScoreOutput, {'risk_score': '0.5', 'reasons': ['a']}, 'reasons'),
+                         {'risk_score': 0.5})
+
+    def test_stream_tool_arguments(self):
+        message = {'role': 'assistant', 'content': None, 'tool_calls': [{
+            'id': 'call_1', 'type': 'function',
+            'function': {'name': 'get_user_property', 'arguments': '{"asked_property": "birthday", "n": 2}'}}]}
+
+        async def get_stream():
+            return [msg async for msg in LiteLLMStream(name='Test: LiteLLM Stream')(messages=[UserMessage('Hi')])]
+
+        with patch('tinyllm.llms.lite_llm.acompletion', make_acompletion(message)):
+            msgs = self.loop.run_until_complete(get_stream())
+
+        partials = [msg['output']['partial_json']['value'] for msg in msgs if msg['output']['partial_json']]
+        self.assertIn({'asked_property': 'birthday'}, partials)
+        self.assertEqual(msgs[-1]['output']['partial_json'],
+                         {'value': {'asked_property': 'birthday', 'n': 2}, 'pending_key': None, 'complete': True,
+                          'members': 2})
+
+    def test_tiny_function_stream(self):
+        message = {'role': 'assistant', 'content': '{"risk_score": 0.8, "reasons": ["overdrafts", "late payments"]}'}
+
+        async def get_stream():
+            return [msg async for msg in calculate_risk_score.stream(bank_account_history="overdrafts")]
+
+        with patch('tinyllm.llms.lite_llm.acompletion', make_acompletion(message)):
+            msgs = self.loop.run_until_complete(get_stream())
+
+        self.assertEqual([msg['output'] for msg in msgs[:-1]],
+                         [{'risk_score': 0.8}])
+        self.assertEqual(msgs[-1]['status'], 'success')
+        self.assertEqual(msgs[-1]['output'], {'risk_score': 0.8, 'reasons': ['overdrafts', 'late payments']})
+
+
+if __name__ == '__main__':
+    unittest.main()
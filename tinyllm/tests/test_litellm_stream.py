@@ -1,4 +1,7 @@
 import unittest
+from unittest.mock import patch
+
+from litellm.types.utils import Delta, ModelResponseStream, StreamingChoices
 
 from tinyllm.llms.lite_llm_stream import LiteLLMStream
 from tinyllm.tests.base import AsyncioTestCase
@@ -32,6 +35,36 @@ class TestlitellmChat(AsyncioTestCase):
         final_string = ''.join(deltas)
         self.assertTrue(final_string[-1] != final_string[-2], "The last Delta has been returned twice")
 
+    def test_stream_events(self):
+        words = ['Hello', ' there', ', how', ' are', ' you?']
+        chunks = [ModelResponseStream(choices=[StreamingChoices(index=0, delta=Delta(content=word, role='assistant'),
+                                                                finish_reason=None)]) for word in words]
+        chunks.append(ModelResponseStream(choices=[StreamingChoices(index=0, delta=Delta(content=None),
+                                                                    finish_reason='stop')]))
+
+        async def acompletion(**kwargs):
+            async def stream():
+                for chunk in chunks:
+                    yield chunk
+
+            return stream()
+
+        async def get_stream():
+            return [msg async for msg in LiteLLMStream(name='Test: LiteLLM Stream')(messages=[UserMessage('Hi')])]
+
+        with patch('tinyllm.llms.lite_llm.acompletion', acompletion):
+            msgs = self.loop.run_until_complete(get_stream())
+
+        self.assertEqual([msg['output']['delta'] for msg in msgs[:-1]], words)
+        # Events materialize the completion as it was when they were emitted
+        self.assertEqual([msg['output']['completion'] for msg in msgs[:2]], ['Hello', 'Hello there'])
+        self.assertEqual(msgs[1]['output']['last_completion_delta']['content'], ' there')
+        final = msgs[-1]['output']
+        self.assertIsInstance(final, dict)
+        self.assertEqual(final['streaming_status'], 'finished-streaming')
+        self.assertEqual(final['completion'], 'Hello there, how are you?')
+        self.assertEqual(final['message'], {'role': 'assistant', 'content': 'Hello there, how are you?'})
+
 
 
 if __name__ == '__main__':
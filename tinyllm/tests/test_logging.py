@@ -0,0 +1,89 @@
+import io
+import json
+import logging
+import unittest
+from unittest.mock import patch
+
+import tinyllm
+from tinyllm import tinyllm_logger
+from tinyllm.function import Function
+from tinyllm.tests.base import AsyncioTestCase
+from tinyllm.util import log_util
+from tinyllm.util.log_util import JsonFormatter, TextFormatter, configure_logger, create_log_handler, stop_log_listener
+
+
+class TestLogging(AsyncioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.handlers = tinyllm_logger.handlers
+        self.level = tinyllm_logger.level
+        self.stream = io.StringIO()
+        tinyllm_logger.handlers = [logging.StreamHandler(self.stream)]
+        logs_config = patch.dict(tinyllm.tinyllm_config['LOGS'], {'LOGGING': True,
+                                                                 'LOG_STATES': ['RUNNING', 'COMPLETE', 'FAILED']})
+        logs_config.start()
+        self.addCleanup(logs_config.stop)
+
+    def tearDown(self):
+        stop_log_listener()
+        tinyllm_logger.handlers = self.handlers
+        tinyllm_logger.setLevel(self.level)
+        super().tearDown()
+
+    def test_json_records(self):
+        tinyllm_logger.handlers[0].setFormatter(JsonFormatter())
+        self.loop.run_until_complete(Function(name='Test: logging')(value=1))
+
+        records = [json.loads(line) for line in self.stream.getvalue().splitlines()]
+        self.assertEqual([record['state'] for record in records], ['RUNNING', 'COMPLETE'])
+        self.assertEqual(records[-1]['message'], 'transition to: COMPLETE')
+        self.assertEqual(records[-1]['function'], 'Test: logging')
+        self.assertIn('trace_id', records[-1])
+        self.assertGreater(records[-1]['duration'], records[0]['duration'])
+
+    def test_text_records(self):
+        tinyllm_logger.handlers[0].setFormatter(TextFormatter())
+        function = Function(name='Test: logging')
+        self.loop.run_until_complete(function())
+
+        lines = self.stream.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('ERROR | tinyllm | '))
+        self.assertIn(f'[{function.trace.id}][Test: logging](', lines[0])
+        self.assertIn('transition from INPUT_VALIDATION to: FAILED (Traceback', lines[0])
+
+    def test_level_checked_before_formatting(self):
+        tinyllm_logger.handlers[0].setFormatter(TextFormatter())
+        tinyllm_logger.setLevel(logging.WARNING)
+        with patch.object(log_util, 'get_log_prefix') as get_log_prefix:
+            result = self.loop.run_until_complete(Function(name='Test: logging')(value=1))
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(self.stream.getvalue(), '')
+        get_log_prefix.assert_not_called()
+
+    def test_queue_handler(self):
+        with patch('sys.stderr', self.stream):
+            configure_logger(tinyllm_logger, {'FORMAT': 'json', 'HANDLER': 'queue', 'LEVEL': 'INFO'})
+        self.assertIsInstance(tinyllm_logger.handlers[0], log_util.LazyQueueHandler)
+        self.loop.run_until_complete(Function(name='Test: logging')(value=1))
+        try:
+            raise ValueError('Failed')
+        except ValueError:
+            tinyllm_logger.exception('Something %s', 'failed')
+        # Stopping the listener writes the queued records
+        stop_log_listener()
+
+        records = [json.loads(line) for line in self.stream.getvalue().splitlines()]
+        self.assertEqual([record.get('state') for record in records], ['RUNNING', 'COMPLETE', None])
+        self.assertEqual(records[-1]['message'], 'Something failed')
+        self.assertIn('ValueError: Failed', records[-1]['exception'])
+
+    def test_config(self):
+        with self.assertRaises(ValueError):
+            create_log_handler({'FORMAT': 'xml'})
+        with self.assertRaises(ValueError):
+            create_log_handler({'HANDLER': 'file'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+
+import tinyllm
+from tinyllm import set_tracer
+from tinyllm.eval.evaluator import Evaluator
+from tinyllm.function import Function
+from tinyllm.function_stream import FunctionStream
+from tinyllm.tests.base import AsyncioTestCase
+from tinyllm.tracing.metrics import (FUNCTION_CALL_SECONDS, FUNCTION_STATE_SECONDS, MetricsRegistry, dump_metrics,
+                                     metrics_registry)
+from tinyllm.tracing.tracer import InMemorySink, LocalTracer
+
+
+class ScoreEvaluator(Evaluator):
+    async def run(self, **kwargs):
+        return {"evals": {"score": 1}, "metadata": {}}
+
+
+class Child(Function):
+    async def run(self, **kwargs):
+        return {"result": 1}
+
+
+class Parent(Function):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.child = Child(name='Test: metrics child')
+
+    async def run(self, **kwargs):
+        return await self.child(value=1)
+
+
+class FailingFunction(Function):
+    async def run(self, **kwargs):
+        raise ValueError('Failed')
+
+
+class StreamFunction(FunctionStream):
+    async def run(self, **kwargs):
+        for i in range(3):
+            yield {"streaming_status": "streaming", "type": "assistant_response", "last_completion_delta": None,
+                   "completion": str(i)}
+
+
+class TestMetrics(AsyncioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics_registry.reset()
+
+    def test_state_timings(self):
+        function = Function(name='Test: metrics', run_evaluators=[ScoreEvaluator()],
+                            processed_output_evaluators=[ScoreEvaluator()])
+        result = self.loop.run_until_complete(function(value=1))
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(list(function.state_timings), ['INIT', 'INPUT_VALIDATION', 'RUNNING', 'OUTPUT_VALIDATION',
+                                                        'OUTPUT_EVALUATION', 'PROCESSING_OUTPUT',
+                                                        'PROCESSED_OUTPUT_VALIDATION', 'PROCESSED_OUTPUT_EVALUATION',
+                                                        'CLOSING'])
+        self.assertTrue(all(seconds >= 0 for seconds in function.state_timings.values()))
+
+        running = metrics_registry.get(FUNCTION_STATE_SECONDS, function='Test: metrics', state='RUNNING')
+        self.assertEqual(running.count, 1)
+        call = metrics_registry.get(FUNCTION_CALL_SECONDS, function='Test: metrics', status='success')
+        self.assertAlmostEqual(call.sum, sum(function.state_timings.values()))
+
+    def test_failed_and_stream_calls(self):
+        failing = FailingFunction(name='Test: metrics failing')
+        self.assertEqual(self.loop.run_until_complete(failing(value=1))['status'], 'error')
+        self.assertEqual(metrics_registry.get(FUNCTION_CALL_SECONDS, function='Test: metrics failing',
+                                              status='error').count, 1)
+        self.assertNotIn('PROCESSING_OUTPUT', failing.state_timings)
+
+        stream = StreamFunction(name='Test: metrics stream')
+
+        async def run():
+            return [message async for message in stream(value=1)]
+
+        messages = self.loop.run_until_complete(run())
+        self.assertEqual(messages[-1]['status'], 'success')
+        self.assertIn('PROCESSED_OUTPUT_VALIDATION', stream.state_timings)
+        self.assertEqual(metrics_registry.get(FUNCTION_CALL_SECONDS, function='Test: metrics stream',
+                                              status='success').count, 1)
+
+    def test_span_metadata(self):
+        tracer = LocalTracer(InMemorySink())
+        previous_tracer = tinyllm.tracer
+        set_tracer(tracer)
+        try:
+            parent = Parent(name='Test: metrics parent')
+            self.loop.run_until_complete(parent(value=1))
+            tinyllm.flush_traces()
+        finally:
+            set_tracer(previous_tracer)
+
+        span_ids = {event['id'] for event in tracer.sink.get_events(type='span-create',
+                                                                     name='Test: metrics child')}
+        updates = [event for event in tracer.sink.get_events(type='span-update') if event['id'] in span_ids]
+        self.assertEqual(len(updates), 1)
+        state_timings = updates[0]['body']['metadata']['state_timings']
+        self.assertIn('RUNNING', state_timings)
+        self.assertIn('CLOSING', state_timings)
+
+    def test_prometheus_dump(self):
+        registry = MetricsRegistry(buckets=(0.1, 1))
+        registry.observe('latency_seconds', 0.05, function='a "quoted"\\name')
+        registry.observe('latency_seconds', 0.5, function='a "quoted"\\name')
+        registry.observe('latency_seconds', 5, function='a "quoted"\\name')
+        labels = 'function="a \\"quoted\\"\\\\name"'
+        self.assertEqual(registry.dump().splitlines(), [
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{' + labels + ',le="0.1"} 1',
+            'latency_seconds_bucket{' + labels + ',le="1.0"} 2',
+            'latency_seconds_bucket{' + labels + ',le="+Inf"} 3',
+            'latency_seconds_sum{' + labels + '} 5.55',
+            'latency_seconds_count{' + labels + '} 3',
+        ])
+        self.assertEqual(registry.snapshot()['latency_seconds'][0]['count'], 3)
+
+        self.loop.run_until_complete(Function(name='Test: metrics dump')(value=1))
+        dump = dump_metrics()
+        self.assertIn(f'# HELP {FUNCTION_STATE_SECONDS}', dump)
+        self.assertIn(f'{FUNCTION_CALL_SECONDS}_count{{function="Test: metrics dump",status="success"}} 1', dump)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import json
+import random
+import unittest
+from unittest.mock import patch
+
+import litellm
+from pydantic import BaseModel
+
+import tinyllm
+from tinyllm.agent.agent import Agent
+from tinyllm.agent.agent_stream import AgentStream
+from tinyllm.agent.tool import Toolkit
+from tinyllm.agent.tool.tool import Tool
+from tinyllm.llms.lite_llm import LiteLLM
+from tinyllm.llms.lite_llm_stream import LiteLLMStream
+from tinyllm.llms.mock_provider import (Latency, MockModelSettings, MockProvider, MockRule,
+                                        MockToolCall, create_mock_provider, get_mock_provider,
+                                        set_mock_provider)
+from tinyllm.llms.tiny_function import tiny_function
+from tinyllm.tests.base import AsyncioTestCase
+from tinyllm.util.message import UserMessage
+from tinyllm.validator import VALIDATION_MODES
+
+
+def get_user_property(asked_property):
+    return {'name': 'Elias', 'birthday': 'January 1st'}[asked_property]
+
+
+toolkit = Toolkit(name='Toolkit', tools=[Tool(
+    name="get_user_property",
+    description="Retrieves information about the user",
+    python_lambda=get_user_property,
+    parameters={
+        "type": "object",
+        "properties": {"asked_property": {"type": "string", "enum": ["birthday", "name"]}},
+        "required": ["asked_property"],
+    },
+)])
+
+
+class TestMockProvider(AsyncioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        set_mock_provider(MockProvider())
+
+    def tearDown(self):
+        set_mock_provider(None)
+        super().tearDown()
+
+    def test_litellm(self):
+        get_mock_provider().add_response('positive', match='great product')
+        litellm_chat = LiteLLM(name='Test: LiteLLM mock')
+        # Usage is estimated without a tokenizer, so it works offline
+        with patch('tinyllm.util.helpers.TokenCounter.count', side_effect=AssertionError('Tokenizer used')), \
+                patch('tinyllm.util.helpers.TokenCounter.count_batch', side_effect=AssertionError('Tokenizer used')):
+            result = self.loop.run_until_complete(litellm_chat(messages=[UserMessage('Classify: great product')],
+                                                               model='mock/test'))
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['output']['completion'], 'positive')
+        usage = result['output']['response']['usage']
+        self.assertEqual((usage['prompt_tokens'], usage['completion_tokens'], usage['total_tokens']), (6, 2, 8))
+
+        # Unmatched requests echo the last message
+        result = self.loop.run_until_complete(litellm_chat(messages=[UserMessage('Hello')], model='mock/test'))
+        self.assertEqual(result['output']['completion'], 'Mock response to: Hello')
+
+    def test_stream(self):
+        set_mock_provider(MockProvider(settings=MockModelSettings(chunk_size=3)))
+        get_mock_provider().add_response({'sentiment': 'positive'})
+        litellm_stream = LiteLLMStream(name='Test: LiteLLMStream mock')
+
+        async def run():
+            return [message async for message in litellm_stream(messages=[UserMessage('Classify: great product')],
+                                                                 model='mock/test',
+                                                                 response_format={'type': 'json_object'})]
+
+        messages = self.loop.run_until_complete(run())
+        last = messages[-1]['output']
+        # 25 characters in chunks of 3, then the finish chunk
+        self.assertEqual(len(messages), 10)
+        self.assertEqual(''.join(message['output']['delta'] for message in messages[:-1]), last['completion'])
+        self.assertEqual(json.loads(last['completion']), {'sentiment': 'positive'})
+        self.assertEqual(last['partial_json']['value'], {'sentiment': 'positive'})
+        self.assertEqual(last['last_chunk']['usage']['completion_tokens'],
+                         get_mock_provider().get_usage({'model': 'mock/test'}, last['completion'],
+                                                         [])['completion_tokens'])
+
+    def test_agent_tool_calls(self):
+        get_mock_provider().add_response(MockToolCall('get_user_property', {'asked_property': 'birthday'}),
+                                           times=1)
+        get_mock_provider().add_response(lambda kwargs: f"Tool result: {kwargs['messages'][-1]['content']}")
+
+        agent = Agent(name='Test: Agent mock tools', toolkit=toolkit)
+        result = self.loop.run_until_complete(agent(content='When is my birthday?', model='mock/test'))
+        self.assertEqual(result['status'], 'success')
+        self.assertIn('January 1st', result['output']['response']['choices'][0]['message']['content'])
+
+        # Rules are matched in order
+        get_mock_provider().rules.insert(0, MockRule(MockToolCall('get_user_property', {'asked_property': 'name'}),
+                                                       times=1))
+        agent_stream = AgentStream(name='Test: AgentStream mock tools', toolkit=toolkit)
+
+        async def run():
+            return [message async for message in agent_stream(content='What is my name?', model='mock/test')]
+
+        messages = self.loop.run_until_complete(run())
+        self.assertEqual(messages[-1]['status'], 'success')
+        self.assertIn('Elias', messages[-1]['output']['completion'])
+
+    def test_validation_modes(self):
+        class RiskScore(BaseModel):
+            risk_score: float
+
+        requests = []
+
+        def respond(kwargs):
+            requests.append(kwargs)
+            return {'risk_score': 42}
+
+        get_mock_provider().add_response(respond)
+        for mode in VALIDATION_MODES:
+            requests.clear()
+            with self.subTest(mode=mode), patch.object(tinyllm, 'validation_mode', mode):
+                agent = Agent(name='Test: Agent validation modes', output_model=RiskScore)
+                result = self.loop.run_until_complete(agent(content='Risk score of Johny?', model='mock/test'))
+                self.assertEqual(result['status'], 'success')
+                # Output models are dumped even when their validation is skipped
+                self.assertEqual(result['output']['response'], {'risk_score': 42})
+
+                litellm_chat = LiteLLM(name='Test: LiteLLM validation modes')
+                result = self.loop.run_until_complete(litellm_chat(messages=[UserMessage('Hello')],
+                                                                   model='mock/test'))
+                self.assertEqual(result['status'], 'success')
+
+                # Nested or not, LiteLLM calls get the defaults of their input validator
+                self.assertEqual(len(requests), 2)
+                for request in requests:
+                    self.assertEqual((request['temperature'], request['n'], request['stream']), (0, 1, False))
+
+    def test_tiny_function(self):
+        class Sentiment(BaseModel):
+            sentiment: str
+
+        @tiny_function(output_model=Sentiment, model_kwargs={'model': 'mock/test'})
+        async def classify(text: str):
+            """
+            <system>
+            Classify the sentiment of a text
+            </system>
+
+            <prompt>
+            Text: {text}
+            </prompt>
+            """
+
+        get_mock_provider().add_response('```json\n{"sentiment": "positive"}\n```')
+        result = self.loop.run_until_complete(classify(text='Great product'))
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['output'], {'sentiment': 'positive'})
+
+    def test_errors(self):
+        provider = MockProvider(settings=MockModelSettings(rate_limit_rate=0.5, error_rate=0.5))
+
+        async def run():
+            errors = []
+            for i in range(20):
+                try:
+                    await provider.acompletion(model='mock/test', messages=[{'role': 'user', 'content': str(i)}])
+                except Exception as error:
+                    errors.append(error)
+            return errors
+
+        errors = self.loop.run_until_complete(run())
+        self.assertEqual(len(errors), 20)
+        self.assertTrue(all(isinstance(error, (litellm.RateLimitError, litellm.InternalServerError))
+                            for error in errors))
+        self.assertEqual(provider.stats['rate_limited'] + provider.stats['errors'], 20)
+        self.assertGreater(provider.stats['rate_limited'], 0)
+        self.assertGreater(provider.stats['errors'], 0)
+
+    def test_deterministic(self):
+        settings = MockModelSettings(latency=Latency('uniform', low=0, high=0.01))
+        kwargs = {'model': 'mock/test', 'messages': [{'role': 'user', 'content': 'Hi'}]}
+
+        async def run(provider):
+            return [(await provider.acompletion(**kwargs)).id for _ in range(3)]
+
+        first = self.loop.run_until_complete(run(MockProvider(seed=1, settings=settings)))
+        second = self.loop.run_until_complete(run(MockProvider(seed=1, settings=settings)))
+        self.assertEqual(first, second)
+        self.assertEqual(len(set(first)), 3)
+
+        # Scripted tool calls get a new id for each request, which doesn't depend on the other requests
+        def tool_call_id(provider, content):
+            response = self.loop.run_until_complete(provider.acompletion(
+                model='mock/test', messages=[{'role': 'user', 'content': content}]))
+            return response.choices[0].message.tool_calls[0].id
+
+        provider = MockProvider(seed=1)
+        rule = provider.add_response(MockToolCall('get_user_property', {'asked_property': 'name'}))
+        ids = [tool_call_id(provider, 'one'), tool_call_id(provider, 'two'), tool_call_id(provider, 'one')]
+        self.assertEqual(len(set(ids)), 3)
+        self.assertIsNone(rule.response.id)
+        fresh_provider = MockProvider(seed=1)
+        fresh_provider.add_response(MockToolCall('get_user_property', {'asked_property': 'name'}))
+        self.assertEqual(tool_call_id(fresh_provider, 'two'), ids[1])
+
+    def test_latency(self):
+        rng = random.Random(0)
+        self.assertEqual(Latency(mean=0.2).sample(rng), 0.2)
+        samples = [Latency('lognormal', mean=0.2, std=0.1).sample(rng) for _ in range(5000)]
+        self.assertAlmostEqual(sum(samples) / len(samples), 0.2, delta=0.01)
+        self.assertTrue(all(0 <= Latency('normal', mean=0.01, std=0.1).sample(rng) for _ in range(100)))
+        self.assertTrue(all(1 <= Latency('uniform', low=1, high=2).sample(rng) <= 2 for _ in range(100)))
+
+    def test_config(self):
+        provider = create_mock_provider({'LLM': {'MOCK': {
+            'SEED': 3,
+            'LATENCY': {'DISTRIBUTION': 'lognormal', 'MEAN': 0.5, 'STD': 0.2},
+            'CHUNK_SIZE': 8,
+            'MODELS': {'flaky': {'RATE_LIMIT_RATE': 0.1}},
+        }}})
+        self.assertEqual(provider.seed, 3)
+        self.assertEqual(provider.get_settings('mock/other').latency.distribution, 'lognormal')
+        flaky = provider.get_settings('mock/flaky')
+        self.assertEqual((flaky.chunk_size, flaky.rate_limit_rate, flaky.latency.mean), (8, 0.1, 0.5))
+        self.assertEqual(create_mock_provider({}).get_settings('mock/test').latency.sample(random.Random()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import httpx
+import openai
+import tinyllm
+from litellm import ModelResponse
+
+from tinyllm.llms.lite_llm import LiteLLM
+from tinyllm.llms.rate_limiter import ModelRateLimiter, RateLimiter, create_rate_limiter
+from tinyllm.tests.base import AsyncioTestCase
+from tinyllm.util.message import UserMessage
+
+
+class TestRateLimiter(AsyncioTestCase):
+
+    def tearDown(self):
+        tinyllm.rate_limiter = None
+        super().tearDown()
+
+    def test_tokens_per_minute(self):
+        # 6000 tokens per minute: 100 tokens per second once the burst is used
+        limiter = ModelRateLimiter(tpm=6000)
+
+        async def run():
+            first = await limiter.acquire(6000)
+            second = await limiter.acquire(20)
+            return first, second
+
+        first, second = self.loop.run_until_complete(run())
+        self.assertLess(first, 0.01)
+        self.assertGreater(second, 0.15)
+        self.assertEqual(limiter.stats['admitted'], 2)
+        self.assertEqual(limiter.stats['queued'], 1)
+
+    def test_priorities_and_fairness(self):
+        limiter = ModelRateLimiter(tpm=60000)
+        limiter.tpm.level = 0
+        admitted = []
+
+        async def request(name, key, priority=0):
+            await limiter.acquire(50, priority=priority, key=key)
+            admitted.append(name)
+
+        async def run():
+            await asyncio.gather(request('a1', 'a'), request('a2', 'a'), request('a3', 'a'),
+                                 request('b1', 'b'), request('c1', 'c', priority=-1))
+
+        self.loop.run_until_complete(run())
+        # The high priority request goes first, then users a and b take turns
+        self.assertEqual(admitted, ['c1', 'a1', 'b1', 'a2', 'a3'])
+        self.assertEqual(limiter.stats['waiting'], 0)
+
+    def test_fairness_across_priorities(self):
+        limiter = ModelRateLimiter(tpm=60000)
+        limiter.tpm.level = 0
+        admitted = []
+        requests = []
+
+        async def request(name, key, priority=0):
+            await limiter.acquire(50, priority=priority, key=key)
+            admitted.append(name)
+            # User a sends another request once its first one is admitted
+            if name == 'a1':
+                requests.append(asyncio.ensure_future(request('a4', 'a')))
+
+        async def run():
+            await asyncio.gather(*[request(f'h{i}', 'h', priority=-1) for i in range(1, 6)],
+                                 request('a1', 'a'), request('a2', 'a'), request('a3', 'a'), request('b1', 'b'))
+            await asyncio.gather(*requests)
+
+        self.loop.run_until_complete(run())
+        # The virtual time reached by the high priority requests is kept: the late request of user a is queued after
+        # its earlier ones
+        self.assertEqual(admitted, ['h1', 'h2', 'h3', 'h4', 'h5', 'a1', 'b1', 'a2', 'a3', 'a4'])
+
+    def test_cancelled_request_leaves_queue(self):
+        limiter = ModelRateLimiter(rpm=60)
+        limiter.rpm.level = 0
+
+        async def run():
+            task = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(limiter.queue, [])
+
+    def test_config(self):
+        self.assertIsNone(create_rate_limiter({'LLM': {'COALESCE': False}}))
+        rate_limiter = create_rate_limiter({'LLM': {'RATE_LIMITS': {'gpt-4o-mini': {'RPM': 500, 'TPM': 200000},
+                                                                    'azure/gpt41106': None},
+                                                    'PRIORITIES': {'admin': -1, 42: 1}}})
+        self.assertEqual(rate_limiter.get('gpt-4o-mini').tpm.capacity, 200000)
+        self.assertIsNone(rate_limiter.get('azure/gpt41106'))
+        self.assertEqual(rate_limiter.get_priority(user_id='admin'), -1)
+        self.assertEqual(rate_limiter.get_priority(user_id='someone', session_id=42), 1)
+        self.assertEqual(rate_limiter.get_priority(), 0)
+
+    def test_litellm_rate_limits(self):
+        tinyllm.rate_limiter = RateLimiter({'gpt-4o-mini': {'TPM': 100000}})
+        limiter = tinyllm.rate_limiter.get('gpt-4o-mini')
+
+        async def acompletion(**kwargs):
+            return ModelResponse(choices=[{'message': {'role': 'assistant', 'content': 'positive'},
+                                           'finish_reason': 'stop'}],
+                                 usage={'prompt_tokens': 10, 'completion_tokens': 2, 'total_tokens': 12})
+
+        litellm_chat = LiteLLM(name='Test: LiteLLM rate limits')
+        with patch('tinyllm.llms.lite_llm.acompletion', acompletion), \
+                patch.object(limiter, 'settle', wraps=limiter.settle) as settle:
+            result = self.loop.run_until_complete(litellm_chat(messages=[UserMessage('Classify: great product')],
+                                                               model='gpt-4o-mini', max_tokens=1000))
+
+        self.assertEqual(result['status'], 'success')
+        self.assertIn('queue_wait', result['output']['generation_metadata'])
+        # The request was charged its prompt tokens and max_tokens, then settled with the actual usage
+        estimated_tokens, used_tokens = settle.call_args.args
+        self.assertGreater(estimated_tokens, 1000)
+        self.assertEqual(used_tokens, 12)
+
+    def test_settle(self):
+        limiter = ModelRateLimiter(tpm=6000)
+        limiter.tpm.level = 0
+        limiter.settle(1000, 12)
+        self.assertAlmostEqual(limiter.tpm.level, 988, delta=5)
+        limiter.settle(10000, 0)
+        self.assertEqual(limiter.tpm.level, 6000)
+
+    def test_litellm_provider_rate_limited(self):
+        tinyllm.rate_limiter = RateLimiter({'gpt-4o-mini': {'RPM': 600}})
+        limiter = tinyllm.rate_limiter.get('gpt-4o-mini')
+        error = openai.RateLimitError('Rate limit reached', body=None,
+                                      response=httpx.Response(429, request=httpx.Request('POST', 'https://api')))
+
+        async def acompletion(**kwargs):
+            raise error
+
+        with patch('tinyllm.llms.lite_llm.acompletion', acompletion):
+            with self.assertRaises(openai.RateLimitError):
+                self.loop.run_until_complete(LiteLLM()._acompletion({'model': 'gpt-4o-mini',
+                                                                     'messages': [{'role': 'user',
+                                                                                   'content': 'Hi'}]}, {}))
+        # Queued requests now wait for the bucket to refill
+        self.assertLess(limiter.rpm.level, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from litellm import ModelResponse
+
+from tinyllm.llms.cache import InMemoryCache, SQLiteCache, TieredCache
+from tinyllm.llms.lite_llm import LiteLLM
+from tinyllm.llms.lite_llm_stream import LiteLLMStream
+from tinyllm.tests.base import AsyncioTestCase
+from tinyllm.util.message import UserMessage
+
+RESPONSE = {'id': 'cached', 'model': 'gpt-4o-mini',
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': 'The answer is 42, as always.'},
+                         'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 8, 'total_tokens': 18}}
+
+
+class TestResponseCache(AsyncioTestCase):
+
+    def test_in_memory_cache(self):
+        cache = InMemoryCache(max_entries=2)
+        cache.set('a', {'value': 1})
+        cache.set('b', {'value': 2}, ttl=-1)
+        self.assertEqual(cache.get('a'), {'value': 1})
+        self.assertIsNone(cache.get('b'))
+        # The least recently used entry is evicted
+        cache.set('c', {'value': 3})
+        cache.set('d', {'value': 4})
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats, {'hits': 1, 'misses': 2})
+
+    def test_sqlite_cache(self):
+        path = os.path.join(tempfile.mkdtemp(), 'responses.sqlite')
+        cache = SQLiteCache(path, max_entries=2)
+        cache.set('a', RESPONSE)
+        cache.set('b', RESPONSE)
+        cache.get('a')
+        time.sleep(0.01)
+        cache.set('c', RESPONSE)
+        self.assertIsNone(cache.get('b'))
+        # Expired entries are misses, and are deleted with the next set
+        cache.set('d', RESPONSE, ttl=-1)
+        self.assertIsNone(cache.get('d'))
+
+        # Hits don't write to the file
+        statements = []
+        cache.connection.set_trace_callback(statements.append)
+        self.assertEqual(cache.get('a'), RESPONSE)
+        self.assertTrue(all(statement.startswith('SELECT') for statement in statements))
+        cache.connection.set_trace_callback(None)
+
+        # Entries persist across instances, and the in-memory tier is filled on hits
+        tiered = TieredCache(InMemoryCache(), SQLiteCache(path))
+        self.assertEqual(tiered.get('a'), RESPONSE)
+        self.assertEqual(tiered.memory.get('a'), RESPONSE)
+
+    def test_litellm_cache(self):
+        calls = []
+
+        async def acompletion(**kwargs):
+            calls.append(kwargs)
+            return ModelResponse(**RESPONSE)
+
+        litellm_chat = LiteLLM(name='Test: LiteLLM cache', cache=InMemoryCache())
+        messages = [UserMessage('What is the answer?')]
+        with patch('tinyllm.llms.lite_llm.acompletion', acompletion):
+            miss = self.loop.run_until_complete(litellm_chat(messages=messages, temperature=0))
+            hit = self.loop.run_until_complete(litellm_chat(messages=messages, temperature=0))
+            self.loop.run_until_complete(litellm_chat(messages=messages, temperature=0, cache=False))
+            self.loop.run_until_complete(litellm_chat(messages=messages, temperature=1))
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(miss['output']['generation_metadata'], {'cache': 'miss'})
+        self.assertEqual(hit['output']['generation_metadata'], {'cache': 'hit'})
+        self.assertEqual(hit['output']['completion'], 'The answer is 42, as always.')
+
+    def test_litellm_stream_replay(self):
+        cache = InMemoryCache()
+        messages = [UserMessage('What is the answer?')]
+
+        async def acompletion(**kwargs):
+            return ModelResponse(**RESPONSE)
+
+        # Streamed and non-streamed calls share cache entries
+        with patch('tinyllm.llms.lite_llm.acompletion', acompletion):
+            self.loop.run_until_complete(LiteLLM(name='Test: LiteLLM cache', cache=cache)(messages=messages))
+
+        litellm_stream = LiteLLMStream(name='Test: LiteLLMStream cache', cache=cache)
+
+        async def collect():
+            return [message async for message in litellm_stream(messages=messages)]
+
+        async def failing_acompletion(**kwargs):
+            raise AssertionError("The provider should not be called")
+
+        with patch('tinyllm.llms.lite_llm.acompletion', failing_acompletion):
+            stream_messages = self.loop.run_until_complete(collect())
+
+        self.assertEqual(len(stream_messages), 2)
+        last_message = stream_messages[-1]['output']
+        self.assertEqual(last_message['streaming_status'], 'finished-streaming')
+        self.assertEqual(last_message['completion'], 'The answer is 42, as always.')
+        self.assertEqual(last_message['generation_metadata'], {'cache': 'hit'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import zlib
+from unittest.mock import patch
+
+import numpy as np
+from litellm import ModelResponse
+from pydantic import BaseModel
+
+from tinyllm.llms.semantic_cache import SemanticCache, SemanticIndex
+from tinyllm.llms.tiny_function import tiny_function
+from tinyllm.tests.base import AsyncioTestCase
+
+
+async def embedding_function(text):
+    # Bag of words: insensitive to whitespace and word order
+    vector = [0.0] * 64
+    for word in text.lower().split():
+        vector[zlib.crc32(word.encode()) % 64] += 1
+    return [vector]
+
+
+class RiskScoreOutput(BaseModel):
+    risk_score: float
+
+
+class TestSemanticCache(AsyncioTestCase):
+
+    def test_index(self):
+        index = SemanticIndex(max_entries=2)
+        for i, vector in enumerate([[1, 0], [0, 1], [0.6, 0.8]]):
+            index.add(np.array(vector, dtype=np.float32), i)
+        # The oldest entry was replaced
+        self.assertEqual(index.values, [2, 1])
+        value, similarity = index.search(np.array([0, 1], dtype=np.float32))
+        self.assertEqual(value, 1)
+        self.assertAlmostEqual(similarity, 1.0)
+
+    def test_tiny_function_cache(self):
+        semantic_cache = SemanticCache(embedding_function, similarity_threshold=0.95)
+        calls = []
+
+        async def acompletion(**kwargs):
+            calls.append(kwargs)
+            return ModelResponse(choices=[{'message': {'role': 'assistant', 'content': '{"risk_score": 0.2}'},
+                                           'finish_reason': 'stop'}])
+
+        @tiny_function(output_model=RiskScoreOutput, semantic_cache=semantic_cache)
+        async def calculate_risk_score(bank_account_history: str):
+            """
+            <system>
+            Extract a Risk Score between 0 and 1 based on the bank account history.
+            </system>
+
+            <prompt>
+            {bank_account_history}
+            </prompt>
+            """
+            pass
+
+        with patch('tinyllm.llms.lite_llm.acompletion', acompletion):
+            miss = self.loop.run_until_complete(
+                calculate_risk_score(bank_account_history="salary 5000 rent 1500 savings 300"))
+            hit = self.loop.run_until_complete(
+                calculate_risk_score(bank_account_history="rent 1500   salary 5000\nsavings 300"))
+            other = self.loop.run_until_complete(
+                calculate_risk_score(bank_account_history="overdraft fees gambling casino loans"))
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((miss['semantic_cache'], hit['semantic_cache'], other['semantic_cache']),
+                         ('miss', 'hit', 'miss'))
+        self.assertEqual(hit['output'], {'risk_score': 0.2})
+        self.assertEqual(semantic_cache.stats['hit_rate'], 1 / 3)
+
+        # Entries are scoped per function
+        self.assertIsNone(semantic_cache.get(('other.function', None),
+                                             self.loop.run_until_complete(semantic_cache.embed("salary 5000"))))
+
+
+if __name__ == '__main__':
+    unittest.main()
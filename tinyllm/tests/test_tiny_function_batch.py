@@ -0,0 +1,91 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from litellm import ModelResponse
+from pydantic import BaseModel
+
+from tinyllm.llms.lite_llm import DEFAULT_LLM_MODEL, get_token_limit
+from tinyllm.llms.tiny_function import DEFAULT_BATCH_TOKEN_LIMIT, tiny_function
+from tinyllm.tests.base import AsyncioTestCase
+
+
+class RiskScoreOutput(BaseModel):
+    risk_score: float
+
+
+@tiny_function(output_model=RiskScoreOutput, model_kwargs={'model': 'gpt-4'})
+async def calculate_risk_score(bank_account_history: str):
+    """
+    <system>
+    Extract a Risk Score between 0 and 1 based on the bank account history.
+    </system>
+
+    <prompt>
+    {bank_account_history}
+    </prompt>
+    """
+    pass
+
+
+class TestTinyFunctionBatch(AsyncioTestCase):
+
+    def test_pack_batches(self):
+        compiled = calculate_risk_score.compiled
+        items = [(str(i), 'salary ' * 100) for i in range(50)]
+        batches = compiled.pack_batches(items, max_batch_size=20, output_tokens_per_item=100)
+        # gpt-4 has an 8192 tokens context, so ~200 tokens items are packed by less than 40
+        self.assertEqual(sum(len(batch) for batch in batches), 50)
+        self.assertTrue(all(len(batch) <= 20 for batch in batches))
+        batches = compiled.pack_batches(items, max_batch_size=50, output_tokens_per_item=100)
+        self.assertGreater(len(batches), 1)
+        self.assertLess(len(batches), 50)
+
+    def test_pack_batches_default_model(self):
+        @tiny_function(output_model=RiskScoreOutput)
+        async def default_model_risk_score(bank_account_history: str):
+            """
+            <system>
+            Extract a Risk Score between 0 and 1 based on the bank account history.
+            </system>
+
+            <prompt>
+            {bank_account_history}
+            </prompt>
+            """
+            pass
+
+        # About 6000 tokens: over the fallback limit, well within the 128k context of the default model
+        items = [(str(i), 'salary ' * 100) for i in range(60)]
+        batches = default_model_risk_score.compiled.pack_batches(items, max_batch_size=100, output_tokens_per_item=10)
+        self.assertEqual(get_token_limit(DEFAULT_LLM_MODEL), 128000)
+        self.assertEqual([len(batch) for batch in batches], [60])
+        # Models the litellm model map knows, and unknown ones
+        self.assertEqual(get_token_limit('gpt-4-turbo'), 128000)
+        self.assertEqual(get_token_limit('mock/test', default=DEFAULT_BATCH_TOKEN_LIMIT), DEFAULT_BATCH_TOKEN_LIMIT)
+
+    def test_batch(self):
+        requests = []
+
+        async def acompletion(**kwargs):
+            items = json.loads(kwargs['messages'][-1]['content'])
+            requests.append(items)
+            results = []
+            for item in items:
+                # The first request returns an invalid output for the item '1'
+                score = 'high' if item['id'] == '1' and len(requests) == 1 else 0.1
+                results.append({'id': item['id'], 'output': {'risk_score': score}})
+            return ModelResponse(choices=[{'message': {'role': 'assistant', 'content': json.dumps({'results': results})},
+                                           'finish_reason': 'stop'}])
+
+        inputs = [{'bank_account_history': f"salary {i}"} for i in range(5)]
+        with patch('tinyllm.llms.lite_llm.acompletion', acompletion):
+            results = self.loop.run_until_complete(calculate_risk_score.batch(inputs))
+
+        self.assertEqual(results, [{'status': 'success', 'output': {'risk_score': 0.1}}] * 5)
+        # All items in one request, then only the invalid one re-issued
+        self.assertEqual([[item['id'] for item in items] for items in requests], [['0', '1', '2', '3', '4'], ['1']])
+
+
+if __name__ == '__main__':
+    unittest.main()
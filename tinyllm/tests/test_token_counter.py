@@ -0,0 +1,67 @@
+import unittest
+
+import tiktoken
+
+from tinyllm.rag.document.document import Document
+from tinyllm.util.helpers import TokenCounter, count_tokens, get_encoding_for_model
+from tinyllm.util.message import AssistantMessage
+
+
+class TestTokenCounter(unittest.TestCase):
+
+    def test_count(self):
+        counter = TokenCounter(cache_size=2)
+        encoding = tiktoken.get_encoding('cl100k_base')
+        strings = ['Hello world', 'How are you?', 'Hello world']
+
+        counts = [counter.count(string) for string in strings]
+        self.assertEqual(counts, [len(encoding.encode(string)) for string in strings])
+        self.assertEqual((counter.hits, counter.misses), (1, 2))
+
+        # The LRU cache is bounded
+        counter.count('A third string')
+        self.assertEqual(len(counter.cache), 2)
+
+    def test_count_batch(self):
+        counter = TokenCounter()
+        strings = ['first document', 'second document', 'first document']
+        self.assertEqual(counter.count_batch(strings), [counter.count(string) for string in strings])
+        self.assertEqual(counter.misses, 2)
+
+    def test_model_encoding(self):
+        self.assertEqual(get_encoding_for_model('gpt-4o').name, 'o200k_base')
+        self.assertEqual(get_encoding_for_model('azure/gpt-4o').name, 'o200k_base')
+        self.assertEqual(get_encoding_for_model('gpt-3.5-turbo').name, 'cl100k_base')
+        self.assertEqual(get_encoding_for_model('claude-3-haiku').name, 'cl100k_base')
+
+    def test_count_tokens(self):
+        messages = [{'role': 'user', 'content': 'Hi'}, {'role': 'assistant', 'content': 'Hello, how can I help?'}]
+        self.assertEqual(count_tokens(messages), sum(count_tokens(message) for message in messages))
+        self.assertEqual(count_tokens([]), 0)
+
+    def test_message_cache(self):
+        message = AssistantMessage('Hi there', validate=False)
+        size = count_tokens(message)
+        self.assertEqual(message.token_counts, {None: size})
+        self.assertEqual(count_tokens([message]), size)
+        self.assertIs(message.wire_dict, message.wire_dict)
+        self.assertEqual(message.to_dict(), {'role': 'assistant', 'content': 'Hi there'})
+
+        with self.assertRaises(AttributeError):
+            message.raw_content = 'Something else'
+
+    def test_document_cache(self):
+        document = Document(content='Some content', metadata={'source': 'a'}, include_keys=['content', 'source'])
+        size = document.size
+        self.assertIs(document.to_string(), document.to_string())
+
+        document.metadata['source'] = 'a much longer source description'
+        self.assertIn('much longer', document.to_string())
+        self.assertGreater(document.size, size)
+
+        document.content = 'Other'
+        self.assertIn('Other', document.to_string())
+
+
+if __name__ == '__main__':
+    unittest.main()
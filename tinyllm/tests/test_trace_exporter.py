@@ -0,0 +1,130 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import yaml
+
+import tinyllm
+from tinyllm import tinyllm_logger
+from tinyllm.function import Function
+from tinyllm.tracing.exporter import BackgroundExporter
+from tinyllm.util.log_util import configure_logger
+
+
+class RecordingClient:
+
+    def __init__(self):
+        self.flush_count = 0
+
+    def flush(self):
+        self.flush_count += 1
+
+
+class TestBackgroundExporter(unittest.TestCase):
+
+    def test_flush_runs_queued_operations(self):
+        client = RecordingClient()
+        exporter = BackgroundExporter(client=client)
+        results = []
+        for i in range(25):
+            exporter.submit(results.append, i)
+
+        exporter.flush()
+
+        self.assertEqual(results, list(range(25)))
+        self.assertEqual(client.flush_count, 1)
+        self.assertEqual(exporter.stats['exported'], 25)
+        exporter.shutdown()
+
+    def test_overflow_is_dropped(self):
+        exporter = BackgroundExporter(max_queue_size=2)
+        release = threading.Event()
+        # Block the consumer thread so the queue fills up
+        exporter.submit(release.wait)
+        accepted = [exporter.submit(lambda: None) for _ in range(5)]
+        release.set()
+        exporter.flush()
+
+        self.assertEqual(exporter.dropped, accepted.count(False))
+        self.assertGreaterEqual(exporter.dropped, 3)
+        exporter.shutdown()
+
+    def test_failed_operation_does_not_stop_exporter(self):
+        exporter = BackgroundExporter()
+        results = []
+        exporter.submit(lambda: 1 / 0)
+        exporter.submit(results.append, 'ok')
+        exporter.flush()
+
+        self.assertEqual(exporter.failed, 1)
+        self.assertEqual(results, ['ok'])
+        exporter.shutdown()
+
+    def test_submit_after_shutdown_is_dropped(self):
+        client = RecordingClient()
+        exporter = BackgroundExporter(client=client)
+        exporter.shutdown()
+        results = []
+
+        self.assertFalse(exporter.submit(results.append, 1))
+        # Returns instead of waiting for a consumer that is gone
+        exporter.flush()
+
+        self.assertEqual(results, [])
+        self.assertEqual(exporter.stats['dropped'], 1)
+        self.assertEqual(exporter.stats['queued'], 0)
+        self.assertEqual(client.flush_count, 2)
+
+    def test_flush_during_shutdown(self):
+        exporter = BackgroundExporter()
+        release = threading.Event()
+        results = []
+        exporter.submit(release.wait)
+        for i in range(5):
+            exporter.submit(results.append, i)
+        # A flush waiting on the queue when another thread shuts the exporter down
+        flush = threading.Thread(target=exporter.flush)
+        flush.start()
+        shutdown = threading.Thread(target=exporter.shutdown)
+        shutdown.start()
+        release.set()
+        flush.join(timeout=5)
+        shutdown.join(timeout=5)
+
+        self.assertFalse(flush.is_alive())
+        self.assertFalse(shutdown.is_alive())
+        # Operations submitted before the shutdown still run
+        self.assertEqual(results, list(range(5)))
+        self.assertEqual(exporter.stats['exported'], 6)
+
+    def test_set_config_replaces_exporter(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config_path = os.path.join(directory, 'tinyllm.yaml')
+            with open(config_path, 'w') as config_file:
+                yaml.safe_dump({'LLM_PROVIDERS': {}, 'TRACING': {'SINK': 'memory'}}, config_file)
+            previous_exporter = BackgroundExporter()
+            with patch.multiple(tinyllm, tinyllm_config=None, langfuse_client=None, tracer=None,
+                                trace_exporter=previous_exporter, response_cache=None, rate_limiter=None,
+                                validation_mode='strict'):
+                try:
+                    tinyllm.set_config(config_path)
+                    exporter = tinyllm.trace_exporter
+                    # Observations go to the exporter of the current config
+                    asyncio.run(Function(name='Test: exporter config')(value=1))
+                    tinyllm.flush_traces()
+                    events = tinyllm.tracer.sink.get_events(type='span-create', name='Test: exporter config')
+                finally:
+                    tinyllm.trace_exporter.shutdown()
+            configure_logger(tinyllm_logger, (tinyllm.tinyllm_config or {}).get('LOGS') or {})
+
+        self.assertIsNot(exporter, previous_exporter)
+        self.assertFalse(previous_exporter._thread.is_alive())
+        self.assertEqual(len(events), 1)
+        self.assertEqual(exporter.stats['dropped'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
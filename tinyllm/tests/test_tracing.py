@@ -1,8 +1,15 @@
+import os
+import tempfile
 import unittest
 
+import tinyllm
+from tinyllm import set_tracer
 from tinyllm.eval.evaluator import Evaluator
 from tinyllm.function import Function
+from tinyllm.tracing.helpers import ObservationUtil
 from tinyllm.tracing.langfuse_context import observation
+from tinyllm.tracing.sampling import HeadSamplingTracer, TailSamplingTracer
+from tinyllm.tracing.tracer import InMemorySink, JsonlSink, LocalTracer, ship_jsonl_traces
 from tinyllm.tests.base import AsyncioTestCase
 
 
@@ -45,6 +52,106 @@ class TestlitellmChat(AsyncioTestCase):
         result = self.loop.run_until_complete(test_func(message=message))
         self.assertEqual(result['status'], 'success')
 
+    def test_in_memory_sink(self):
+        class TestFunction(Function):
+
+            @observation(observation_type='span')
+            async def run(self, **kwargs):
+                return {
+                    "result": 1
+                }
+
+        sink = InMemorySink()
+        result = self.run_with_tracer(LocalTracer(sink), TestFunction(name='Test: in memory sink'), value=1)
+
+        self.assertEqual(result['status'], 'success')
+        trace = sink.get_events(type='trace-create')[0]
+        self.assertEqual(trace['body']['name'], 'Test: in memory sink')
+        run_span = sink.get_events(type='span-create', name='Test: in memory sink.run')[0]
+        self.assertEqual(run_span['trace_id'], trace['id'])
+        span_ends = [event for event in sink.get_events(type='span-update') if event['id'] == run_span['id']]
+        self.assertEqual(span_ends[0]['body']['output'], {'result': 1})
+
+    def test_jsonl_sink(self):
+        class RecordingClient:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, method):
+                return lambda **kwargs: self.calls.append((method, kwargs))
+
+        path = os.path.join(tempfile.mkdtemp(), 'traces.jsonl')
+        tracer = LocalTracer(JsonlSink(path))
+        trace = tracer.trace(name='Test: jsonl sink')
+        span = trace.span(name='span', input={'value': 1})
+        span.generation(name='generation').end(output='done')
+        span.score(name='score', value=1)
+        span.end(output={'value': 2})
+        tracer.flush()
+
+        client = RecordingClient()
+        ship_jsonl_traces(path, client)
+        self.assertEqual([method for method, kwargs in client.calls],
+                         ['trace', 'span', 'generation', 'generation', 'score', 'span', 'flush'])
+        generation_create = client.calls[2][1]
+        self.assertEqual(generation_create['trace_id'], trace.id)
+        self.assertEqual(generation_create['parent_observation_id'], span.id)
+        self.assertEqual(client.calls[4][1]['observation_id'], span.id)
+
+    def run_with_tracer(self, tracer, function, **kwargs):
+        default_tracer = tinyllm.tracer
+        set_tracer(tracer)
+        try:
+            result = self.loop.run_until_complete(function(**kwargs))
+            tinyllm.flush_traces()
+        finally:
+            set_tracer(default_tracer)
+        return result
+
+    def test_head_sampling(self):
+        sink = InMemorySink()
+        result = self.run_with_tracer(HeadSamplingTracer(LocalTracer(sink), sample_rate=0),
+                                      Function(name='Test: head sampling'), value=1)
+
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(sink.events, [])
+
+    def test_tail_sampling(self):
+        class FailingFunction(Function):
+            async def run(self, **kwargs):
+                raise ValueError('Failed on purpose')
+
+        sink = InMemorySink()
+        tracer = TailSamplingTracer(LocalTracer(sink), latency_threshold=60)
+        self.run_with_tracer(tracer, Function(name='Test: tail sampling success'), value=1)
+        self.run_with_tracer(tracer, FailingFunction(name='Test: tail sampling error'), value=1)
+
+        self.assertEqual((tracer.exported, tracer.dropped), (1, 1))
+        traces = sink.get_events(type='trace-create')
+        self.assertEqual([trace['body']['name'] for trace in traces], ['Test: tail sampling error'])
+        # Buffered observations keep their ids and timings when exported
+        span = sink.get_events(type='span-create')[0]
+        self.assertEqual(span['trace_id'], traces[0]['id'])
+        self.assertIn('start_time', span['body'])
+
+    def test_usage_source(self):
+        messages = {'input': [{'role': 'user', 'content': 'Hi'}]}
+        response = {
+            'type': 'completion',
+            'message': {'role': 'assistant', 'content': 'Hello there'},
+            'response': {'usage': {'prompt_tokens': 8, 'completion_tokens': 2, 'total_tokens': 10}},
+        }
+        self.assertEqual(ObservationUtil.get_usage(messages, response), (8, 2, 'provider'))
+
+        streamed_response = {
+            'type': 'assistant',
+            'message': {'role': 'assistant', 'content': 'Hello there'},
+            'last_chunk': {'choices': []},
+        }
+        prompt_tokens, completion_tokens, source = ObservationUtil.get_usage(messages, streamed_response)
+        self.assertEqual(source, 'local')
+        self.assertGreater(completion_tokens, 0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,91 @@
+import atexit
+import logging
+import queue
+import threading
+
+tinyllm_logger = logging.getLogger('tinyllm')
+
+# Queued after the last operation by shutdown(), stops the consumer thread
+STOP = object()
+
+
+class BackgroundExporter:
+    """
+    Runs tracing operations (ending observations, scores...) on a background thread so the calling function
+    never waits on the tracing client. Operations run one by one in submission order, and the client batches the
+    uploads they produce. The queue is bounded: when it is full, new operations are dropped and counted instead of
+    blocking the caller.
+    """
+
+    def __init__(self,
+                 client=None,
+                 max_queue_size: int = 10000):
+        self.client = client
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.submitted = 0
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        # Submits and shutdown are serialized, so no operation is queued after STOP
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._consume, name='tinyllm-trace-exporter', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    @property
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'exported': self.exported,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'queued': self.queue.qsize(),
+        }
+
+    def submit(self, operation, *args, **kwargs) -> bool:
+        with self._lock:
+            # Nothing consumes the queue once the exporter is shut down
+            if self._stopped:
+                self.dropped += 1
+                return False
+            try:
+                self.queue.put_nowait((operation, args, kwargs))
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self.submitted += 1
+            return True
+
+    def flush(self):
+        # Wait for queued operations, then for the client to upload what they produced. The consumer runs every
+        # operation queued before STOP, so this returns after a shutdown too
+        self.queue.join()
+        if self.client is not None:
+            self.client.flush()
+
+    def shutdown(self):
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        self.queue.put(STOP)
+        self.flush()
+        self._thread.join()
+        atexit.unregister(self.shutdown)
+
+    def _consume(self):
+        while True:
+            item = self.queue.get()
+            if item is STOP:
+                self.queue.task_done()
+                return
+            operation, args, kwargs = item
+            try:
+                operation(*args, **kwargs)
+                self.exported += 1
+            except Exception as e:
+                self.failed += 1
+                tinyllm_logger.error(f"Trace exporter: {getattr(operation, '__name__', operation)} failed: {e}")
+            finally:
+                self.queue.task_done()
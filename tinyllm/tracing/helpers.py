@@ -3,11 +3,12 @@ import inspect
 import traceback
 from functools import wraps
 
-import langfuse
 import numpy as np
 
-from tinyllm import langfuse_client
+import tinyllm
 from tinyllm.constants import LLM_PRICING
+from tinyllm.state import TERMINAL_STATES
+from tinyllm.tracing.sampling import NOOP_OBSERVATION
 from tinyllm.util.helpers import count_tokens, num_tokens_from_string
 from tinyllm.util.message import Message
 
@@ -33,12 +34,21 @@ model_parameters = [
 
 class ObservationUtil:
 
+    @classmethod
+    def is_sampled(cls, parent_observation):
+        if parent_observation is None:
+            return tinyllm.tracer.sample()
+        return parent_observation is not NOOP_OBSERVATION
+
     @classmethod
     def handle_exception(cls, obs, e):
+        if obs is NOOP_OBSERVATION:
+            return
         if 'end' in dir(obs):
-            obs.end(level='ERROR', status_message=str(traceback.format_exc()))
+            tinyllm.trace_exporter.submit(obs.end, end_time=dt.datetime.now(), level='ERROR',
+                                          status_message=str(traceback.format_exc()))
         elif 'update' in dir(obs):
-            obs.update(level='ERROR', status_message=str(traceback.format_exc()))
+            tinyllm.trace_exporter.submit(obs.update, level='ERROR', status_message=str(traceback.format_exc()))
 
     @classmethod
     def prepare_observation_input(cls, input_mapping, function_input):
@@ -72,8 +82,37 @@ class ObservationUtil:
         return clean(d)
 
     @classmethod
-    def end_observation(cls, obs, function_input, function_output, output_mapping, observation_type, function_kwargs):
-        if type(obs) == langfuse.client.StatefulTraceClient:
+    def get_provider_usage(cls, function_output):
+        # Non-streaming responses carry usage, streamed ones only in the last chunk if the provider sends it
+        for key in ['response', 'last_chunk']:
+            usage = (function_output.get(key) or {}).get('usage')
+            if usage and usage.get('prompt_tokens') is not None:
+                return usage
+        return None
+
+    @classmethod
+    def get_usage(cls, function_input, function_output):
+        """
+        Returns (prompt_tokens, completion_tokens, source). Uses the usage reported by the provider, and only counts
+        tokens locally when it is missing.
+        """
+        usage = cls.get_provider_usage(function_output)
+        if usage is not None:
+            return usage['prompt_tokens'], usage.get('completion_tokens') or 0, 'provider'
+
+        model = function_input.get('model')
+        prompt_tokens = count_tokens(function_input, model=model)
+        message = function_output.get('message', {})
+        if message.get('tool_calls'):
+            completion_tokens = count_tokens(message['tool_calls'], model=model)
+        else:
+            completion_tokens = count_tokens(message.get('content') or '', model=model)
+        return prompt_tokens, completion_tokens, 'local'
+
+    @classmethod
+    def end_observation(cls, obs, function_input, function_output, output_mapping, observation_type, function_kwargs,
+                        metadata=None):
+        if obs is NOOP_OBSERVATION or tinyllm.tracer.is_trace(obs):
             return
 
         mapped_output = {}
@@ -86,13 +125,7 @@ class ObservationUtil:
 
         if observation_type == 'generation':
 
-            prompt_tokens = count_tokens(function_input)
-
-            if function_output['type'] == 'tool' or function_output.get('message',{}).get('tool_calls',[]) != []:
-                completion_tokens = count_tokens(function_output['message']['tool_calls'])
-            else:
-                completion_tokens = count_tokens(function_output['message']['content'])
-
+            prompt_tokens, completion_tokens, usage_source = cls.get_usage(function_input, function_output)
             total_tokens = prompt_tokens + completion_tokens
             usage_info = {
                 'input': prompt_tokens,
@@ -103,8 +136,10 @@ class ObservationUtil:
 
             model = function_kwargs.get('model', None)
             pricing = LLM_PRICING.get(model, None)
+            generation_metadata = function_output.get('generation_metadata') or {}
             cost = {}
-            if pricing:
+            # Responses served from the response cache cost nothing
+            if pricing and generation_metadata.get('cache') != 'hit':
                 input_cost = pricing['input'] * (prompt_tokens / 1000)
                 output_cost = pricing['output'] * (completion_tokens / 1000)
                 cost = {
@@ -118,14 +153,35 @@ class ObservationUtil:
             if 'response_format' in model_params:
                 model_params['response_format'] = str(model_params['response_format'])
 
-            obs.end(
+            tinyllm.trace_exporter.submit(
+                obs.end,
                 end_time=dt.datetime.now(),
                 model=function_kwargs.get('model', None),
                 model_parameters=model_params,
                 usage=usage_info,
+                metadata={'usage_source': usage_source, **generation_metadata, **(metadata or {})},
                 **mapped_output)
         elif observation_type == 'span':
-            obs.end(**mapped_output)
+            if metadata:
+                mapped_output['metadata'] = metadata
+            tinyllm.trace_exporter.submit(obs.end, end_time=dt.datetime.now(), **mapped_output)
+
+    @classmethod
+    def get_state_metadata(cls, *args):
+        # Seconds spent by the observed Function call in each state. Only for the span of the call itself: spans of
+        # methods like run end while the call is still running
+        if not args or getattr(args[0], 'state', None) not in TERMINAL_STATES:
+            return None
+        state_timings = getattr(args[0], 'state_timings', None)
+        if not state_timings:
+            return None
+        return {'state_timings': {state: round(seconds, 6) for state, seconds in state_timings.items()}}
+
+    @classmethod
+    def end_trace(cls, obs):
+        # Runs after the observation's queued operations so sampling decisions see the complete trace
+        if obs is not NOOP_OBSERVATION:
+            tinyllm.trace_exporter.submit(tinyllm.tracer.end_trace, obs)
 
     @classmethod
     async def perform_evaluations(cls, observation, result, evaluators):
@@ -169,9 +225,17 @@ class ObservationUtil:
                         parent_observation,
                         observation_type,
                         name,
-                        observation_input):
+                        observation_input,
+                        sampled=True):
 
-        if parent_observation is None:
+        if not sampled:
+            # Unsampled trace: skip observations for this function and its children
+            observation = NOOP_OBSERVATION
+            if len(args) > 0:
+                args[0].observation = observation
+                if parent_observation is None:
+                    args[0].trace = observation
+        elif parent_observation is None:
             # This is the root function, create a new trace
             optional_args = {}
             for arg in ['user_id', 'session_id']:
@@ -179,9 +243,9 @@ class ObservationUtil:
                     if getattr(args[0], arg, None):
                         optional_args[arg] = getattr(args[0], arg)
 
-            observation = langfuse_client.trace(name=name,
-                                                **optional_args,
-                                                **observation_input)
+            observation = tinyllm.tracer.trace(name=name,
+                                               **optional_args,
+                                               **observation_input)
             # Pass the trace to the Function
             if len(args) > 0:
                 args[0].observation = observation
@@ -1,8 +1,10 @@
+import contextvars
 from contextvars import ContextVar
 
 from pydantic import BaseModel
 
 from smartpy.utility.py_util import stringify_values_recursively
+from tinyllm.execution_context import ContextStep
 from tinyllm.tracing.helpers import *
 
 current_observation_context = ContextVar('current_observation_context', default=None)
@@ -13,25 +15,30 @@ class ObservationDecoratorFactory:
     @classmethod
     def get_streaming_decorator(self,
                                 observation_type,
+                                name=None,
                                 input_mapping=None,
                                 output_mapping=None,
                                 evaluators=None):
         def decorator(func):
-            @wraps(func)
-            async def wrapper(*args, **function_input):
+            async def traced(*args, **function_input):
                 parent_observation = current_observation_context.get()
+                if name is None:
+                    obs_name = ObservationUtil.get_obs_name(*args, func=func)
+                else:
+                    obs_name = name
 
-                name = ObservationUtil.get_obs_name(*args, func=func)
-
-                # Prepare the input for the observation
-                observation_input = ObservationUtil.prepare_observation_input(input_mapping, function_input)
+                # Prepare the input for the observation, unless the trace is not sampled
+                sampled = ObservationUtil.is_sampled(parent_observation)
+                observation_input = ObservationUtil.prepare_observation_input(input_mapping,
+                                                                              function_input) if sampled else {}
 
                 # Get the current observation
                 observation = ObservationUtil.get_current_obs(*args,
                                                               parent_observation=parent_observation,
                                                               observation_type=observation_type,
-                                                              name=name,
-                                                              observation_input=observation_input)
+                                                              name=obs_name,
+                                                              observation_input=observation_input,
+                                                              sampled=sampled)
                 # Pass the observation to the class (so it can evaluate it)
                 if len(args) > 0:
                     args[0].observation = observation
@@ -48,7 +55,25 @@ class ObservationDecoratorFactory:
                 finally:
                     current_observation_context.reset(token)
                     ObservationUtil.end_observation(observation, observation_input, result, output_mapping,
-                                                    observation_type, function_input)
+                                                    observation_type, function_input,
+                                                    metadata=ObservationUtil.get_state_metadata(*args))
+                    if parent_observation is None:
+                        ObservationUtil.end_trace(observation)
+
+            @wraps(func)
+            async def wrapper(*args, **function_input):
+                # The observation is only current for the steps of the generator, not for the consumer in between
+                variables = contextvars.copy_context()
+                results = traced(*args, **function_input)
+                try:
+                    while True:
+                        try:
+                            result = await ContextStep(variables, results.__anext__())
+                        except StopAsyncIteration:
+                            break
+                        yield result
+                finally:
+                    await ContextStep(variables, results.aclose())
 
             return wrapper
 
@@ -70,12 +95,15 @@ class ObservationDecoratorFactory:
                     obs_name = ObservationUtil.get_obs_name(*args, func=func)
                 else:
                     obs_name = name
-                observation_input = ObservationUtil.prepare_observation_input(input_mapping, function_input)
+                sampled = ObservationUtil.is_sampled(parent_observation)
+                observation_input = ObservationUtil.prepare_observation_input(input_mapping,
+                                                                              function_input) if sampled else {}
                 observation = ObservationUtil.get_current_obs(*args,
                                                               parent_observation=parent_observation,
                                                               observation_type=observation_type,
                                                               name=obs_name,
-                                                              observation_input=observation_input)
+                                                              observation_input=observation_input,
+                                                              sampled=sampled)
                 token = current_observation_context.set(observation)
                 result = {}
                 if len(args) > 0:
@@ -96,8 +124,10 @@ class ObservationDecoratorFactory:
                 finally:
                     current_observation_context.reset(token)
                     ObservationUtil.end_observation(observation, observation_input, result, output_mapping,
-                                                    observation_type, function_input)
-                    langfuse_client.flush()
+                                                    observation_type, function_input,
+                                                    metadata=ObservationUtil.get_state_metadata(*args))
+                    if parent_observation is None:
+                        ObservationUtil.end_trace(observation)
 
             return wrapper
 
@@ -109,7 +139,7 @@ def observation(observation_type='span',name=None, input_mapping=None, output_ma
                                                                      input_mapping,
                                                                      output_mapping)
     if stream:
-        return ObservationDecoratorFactory.get_streaming_decorator(observation_type, input_mapping, output_mapping,
-                                                                   evaluators)
+        return ObservationDecoratorFactory.get_streaming_decorator(observation_type, name, input_mapping,
+                                                                   output_mapping, evaluators)
     else:
         return ObservationDecoratorFactory.get_decorator(observation_type, name, input_mapping, output_mapping, evaluators)
@@ -0,0 +1,122 @@
+import bisect
+import math
+import threading
+from typing import Dict, Optional, Tuple
+
+# Seconds, from validators (sub millisecond) to LLM calls (seconds to minutes)
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+FUNCTION_STATE_SECONDS = 'tinyllm_function_state_seconds'
+FUNCTION_CALL_SECONDS = 'tinyllm_function_call_seconds'
+
+METRIC_HELP = {
+    FUNCTION_STATE_SECONDS: 'Time spent by Function calls in each state of the lifecycle',
+    FUNCTION_CALL_SECONDS: 'Duration of Function calls, by final status',
+}
+
+
+class Histogram:
+    """
+    Counts observations in cumulative buckets (observations <= each upper bound), like Prometheus histograms.
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One count per bucket and one for +Inf, not cumulative until exported
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        total = 0
+        for upper_bound, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            yield upper_bound, total
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': {str(upper_bound): count for upper_bound, count in self.cumulative_counts()},
+        }
+
+
+class MetricsRegistry:
+    """
+    In-process histograms by metric name and labels. dump() renders them in the Prometheus text format.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def get(self, name: str, **labels) -> Optional[Histogram]:
+        return self.histograms.get(name, {}).get(tuple(sorted(labels.items())))
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {name: [{'labels': dict(key), **histogram.to_dict()} for key, histogram in series.items()]
+                    for name, series in self.histograms.items()}
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def dump(self) -> str:
+        lines = []
+        with self.lock:
+            for name, series in self.histograms.items():
+                if name in METRIC_HELP:
+                    lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    for upper_bound, count in histogram.cumulative_counts():
+                        le = '+Inf' if upper_bound == math.inf else repr(float(upper_bound))
+                        lines.append(f"{name}_bucket{format_labels(key + (('le', le),))} {count}")
+                    lines.append(f"{name}_sum{format_labels(key)} {histogram.sum!r}")
+                    lines.append(f"{name}_count{format_labels(key)} {histogram.count}")
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in labels) + '}'
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics_registry = MetricsRegistry()
+
+
+def record_state_timings(function_name: str, state_timings: Dict[str, float], status: str):
+    for state, seconds in state_timings.items():
+        metrics_registry.observe(FUNCTION_STATE_SECONDS, seconds, function=function_name, state=state)
+    metrics_registry.observe(FUNCTION_CALL_SECONDS, sum(state_timings.values()), function=function_name,
+                             status=status)
+
+
+def dump_metrics() -> str:
+    """
+    The metrics of this process in the Prometheus text exposition format.
+    """
+    return metrics_registry.dump()
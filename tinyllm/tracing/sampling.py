@@ -0,0 +1,196 @@
+import datetime as dt
+import random
+import uuid
+
+from tinyllm.tracing.tracer import Tracer
+
+
+class NoOpObservation:
+    """
+    Observation of an unsampled trace: every call is ignored and child observations are unsampled too.
+    """
+    id = None
+
+    def span(self, **kwargs):
+        return self
+
+    def generation(self, **kwargs):
+        return self
+
+    def score(self, **kwargs):
+        return self
+
+    def update(self, **kwargs):
+        return self
+
+    def end(self, **kwargs):
+        return self
+
+
+NOOP_OBSERVATION = NoOpObservation()
+
+
+class SamplingTracer(Tracer):
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    def trace(self, **kwargs):
+        return self.tracer.trace(**kwargs)
+
+    def is_trace(self, observation) -> bool:
+        return self.tracer.is_trace(observation)
+
+    def flush(self):
+        self.tracer.flush()
+
+
+class HeadSamplingTracer(SamplingTracer):
+    """
+    Keeps a sample_rate fraction of root traces, decided when the trace starts.
+    """
+
+    def __init__(self, tracer: Tracer, sample_rate: float):
+        super().__init__(tracer)
+        self.sample_rate = sample_rate
+
+    def sample(self) -> bool:
+        return random.random() < self.sample_rate
+
+
+class BufferedObservation:
+
+    def __init__(self, buffered_trace, parent, method, kwargs):
+        self.buffered_trace = buffered_trace or self
+        self.id = kwargs.setdefault('id', str(uuid.uuid4()))
+        self.buffered_trace.record(('create', self, parent, method, kwargs))
+
+    def span(self, **kwargs):
+        return BufferedSpan(self.buffered_trace, self, 'span', kwargs)
+
+    def generation(self, **kwargs):
+        return BufferedSpan(self.buffered_trace, self, 'generation', kwargs)
+
+    def score(self, **kwargs):
+        self.buffered_trace.record(('call', self, 'score', kwargs))
+        return self
+
+    def update(self, **kwargs):
+        self.buffered_trace.record(('call', self, 'update', kwargs))
+        return self
+
+
+class BufferedTrace(BufferedObservation):
+    """
+    Keeps the operations of a trace and its observations in memory until the trace is done, so they can be
+    replayed on a tracer or dropped.
+    """
+
+    def __init__(self, kwargs):
+        self.operations = []
+        self.errored = False
+        self.cost = 0
+        self.start_time = None
+        self.end_time = None
+        kwargs.setdefault('timestamp', dt.datetime.now())
+        super().__init__(None, None, 'trace', kwargs)
+
+    def record(self, operation):
+        kwargs = operation[-1]
+        if kwargs.get('level') == 'ERROR' or (isinstance(kwargs.get('output'), dict) and
+                                              kwargs['output'].get('status') == 'error'):
+            self.errored = True
+        self.cost += (kwargs.get('usage') or {}).get('total_cost', 0)
+        if kwargs.get('start_time') and (self.start_time is None or kwargs['start_time'] < self.start_time):
+            self.start_time = kwargs['start_time']
+        if kwargs.get('end_time') and (self.end_time is None or kwargs['end_time'] > self.end_time):
+            self.end_time = kwargs['end_time']
+        self.operations.append(operation)
+
+    @property
+    def latency(self):
+        if self.start_time is None or self.end_time is None:
+            return 0
+        return (self.end_time - self.start_time).total_seconds()
+
+    def replay(self, tracer):
+        observations = {}
+        for operation in self.operations:
+            if operation[0] == 'create':
+                _, observation, parent, method, kwargs = operation
+                target = tracer if parent is None else observations[parent]
+                observations[observation] = getattr(target, method)(**kwargs)
+            else:
+                _, observation, method, kwargs = operation
+                getattr(observations[observation], method)(**kwargs)
+
+
+class BufferedSpan(BufferedObservation):
+
+    def __init__(self, buffered_trace, parent, method, kwargs):
+        kwargs.setdefault('start_time', dt.datetime.now())
+        super().__init__(buffered_trace, parent, method, kwargs)
+
+    def end(self, **kwargs):
+        kwargs.setdefault('end_time', dt.datetime.now())
+        self.buffered_trace.record(('call', self, 'end', kwargs))
+        return self
+
+
+class TailSamplingTracer(SamplingTracer):
+    """
+    Buffers every trace in memory and exports it only if it errored, took longer than latency_threshold seconds
+    or cost more than cost_threshold. Other traces are kept with probability sample_rate.
+    """
+
+    def __init__(self,
+                 tracer: Tracer,
+                 latency_threshold: float = None,
+                 cost_threshold: float = None,
+                 sample_rate: float = 0):
+        super().__init__(tracer)
+        self.latency_threshold = latency_threshold
+        self.cost_threshold = cost_threshold
+        self.sample_rate = sample_rate
+        self.exported = 0
+        self.dropped = 0
+
+    def trace(self, **kwargs):
+        return BufferedTrace(kwargs)
+
+    def is_trace(self, observation) -> bool:
+        return isinstance(observation, BufferedTrace)
+
+    def should_export(self, buffered_trace) -> bool:
+        if buffered_trace.errored:
+            return True
+        if self.latency_threshold is not None and buffered_trace.latency > self.latency_threshold:
+            return True
+        if self.cost_threshold is not None and buffered_trace.cost > self.cost_threshold:
+            return True
+        return random.random() < self.sample_rate
+
+    def end_trace(self, observation):
+        buffered_trace = getattr(observation, 'buffered_trace', None)
+        if buffered_trace is None:
+            return
+        if self.should_export(buffered_trace):
+            buffered_trace.replay(self.tracer)
+            self.exported += 1
+        else:
+            self.dropped += 1
+
+
+def create_sampling_tracer(tracer: Tracer, tinyllm_config: dict) -> Tracer:
+    sampling_config = (tinyllm_config.get('TRACING') or {}).get('SAMPLING') or {}
+    policy = sampling_config.get('POLICY') or 'always'
+    if policy == 'always':
+        return tracer
+    elif policy == 'head':
+        return HeadSamplingTracer(tracer, sample_rate=sampling_config.get('SAMPLE_RATE', 1.0))
+    elif policy == 'tail':
+        return TailSamplingTracer(tracer,
+                                  latency_threshold=sampling_config.get('LATENCY_THRESHOLD'),
+                                  cost_threshold=sampling_config.get('COST_THRESHOLD'),
+                                  sample_rate=sampling_config.get('SAMPLE_RATE', 0))
+    raise ValueError(f"Unknown sampling policy: {policy}")
@@ -0,0 +1,240 @@
+import datetime as dt
+import json
+import threading
+import uuid
+from abc import abstractmethod
+
+from langfuse import Langfuse
+from langfuse.client import StatefulTraceClient
+
+
+class Tracer:
+    """
+    Creates root traces. Observations returned by a tracer follow the Langfuse stateful client API: span(),
+    generation(), score(), update(), end() for spans and generations, and an id.
+    """
+
+    @abstractmethod
+    def trace(self, **kwargs):
+        pass
+
+    @abstractmethod
+    def is_trace(self, observation) -> bool:
+        pass
+
+    def sample(self) -> bool:
+        # Head sampling decision, made when a root trace starts
+        return True
+
+    def end_trace(self, observation):
+        # Called with the root observation once a root trace is done
+        pass
+
+    def flush(self):
+        pass
+
+
+class LangfuseTracer(Tracer):
+
+    def __init__(self, client):
+        self.client = client
+
+    def trace(self, **kwargs):
+        return self.client.trace(**kwargs)
+
+    def is_trace(self, observation) -> bool:
+        return isinstance(observation, StatefulTraceClient)
+
+    def flush(self):
+        self.client.flush()
+
+
+class TraceSink:
+    """
+    Receives the tracing events of a LocalTracer. Events are dicts shaped like Langfuse ingestion events:
+    {'type': 'span-create', 'id': ..., 'trace_id': ..., 'parent_observation_id': ..., 'timestamp': ..., 'body': {...}}
+    """
+
+    @abstractmethod
+    def write(self, event: dict):
+        pass
+
+    def flush(self):
+        pass
+
+
+class NoOpSink(TraceSink):
+
+    def write(self, event: dict):
+        pass
+
+
+class InMemorySink(TraceSink):
+
+    def __init__(self):
+        self.events = []
+
+    def write(self, event: dict):
+        self.events.append(event)
+
+    def get_events(self, type=None, name=None):
+        return [event for event in self.events
+                if (type is None or event['type'] == type) and (name is None or event['body'].get('name') == name)]
+
+
+class JsonlSink(TraceSink):
+    """
+    Appends events to a JSONL file, one event per line. Files can be shipped to Langfuse later with
+    ship_jsonl_traces.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a')
+        self.lock = threading.Lock()
+
+    def write(self, event: dict):
+        line = json.dumps(event, default=str)
+        with self.lock:
+            self.file.write(line + '\n')
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+
+class LocalObservation:
+    observation_type = None
+
+    def __init__(self, sink, trace_id=None, parent_observation_id=None, **kwargs):
+        self.sink = sink
+        self.id = kwargs.pop('id', None) or str(uuid.uuid4())
+        self.trace_id = trace_id or self.id
+        self.parent_observation_id = parent_observation_id
+        self._emit('create', kwargs)
+
+    def _emit(self, action, body):
+        self.sink.write({
+            'type': f"{self.observation_type}-{action}",
+            'id': self.id,
+            'trace_id': self.trace_id,
+            'parent_observation_id': self.parent_observation_id,
+            'timestamp': dt.datetime.now().isoformat(),
+            'body': body,
+        })
+
+    def span(self, **kwargs):
+        return LocalSpan(self.sink, trace_id=self.trace_id, parent_observation_id=self._child_parent_id, **kwargs)
+
+    def generation(self, **kwargs):
+        return LocalGeneration(self.sink, trace_id=self.trace_id, parent_observation_id=self._child_parent_id,
+                               **kwargs)
+
+    def score(self, **kwargs):
+        if self._child_parent_id is not None:
+            kwargs['observation_id'] = self.id
+        self.sink.write({
+            'type': 'score-create',
+            'id': str(uuid.uuid4()),
+            'trace_id': self.trace_id,
+            'parent_observation_id': None,
+            'timestamp': dt.datetime.now().isoformat(),
+            'body': kwargs,
+        })
+        return self
+
+    def update(self, **kwargs):
+        self._emit('update', kwargs)
+        return self
+
+    @property
+    def _child_parent_id(self):
+        return self.id
+
+
+class LocalTrace(LocalObservation):
+    observation_type = 'trace'
+
+    @property
+    def _child_parent_id(self):
+        # Top level observations have no parent observation
+        return None
+
+
+class LocalSpan(LocalObservation):
+    observation_type = 'span'
+
+    def __init__(self, sink, **kwargs):
+        kwargs.setdefault('start_time', dt.datetime.now())
+        super().__init__(sink, **kwargs)
+
+    def end(self, **kwargs):
+        kwargs.setdefault('end_time', dt.datetime.now())
+        return self.update(**kwargs)
+
+
+class LocalGeneration(LocalSpan):
+    observation_type = 'generation'
+
+
+class LocalTracer(Tracer):
+    """
+    Writes traces to a TraceSink without any network I/O.
+    """
+
+    def __init__(self, sink: TraceSink):
+        self.sink = sink
+
+    def trace(self, **kwargs):
+        return LocalTrace(self.sink, **kwargs)
+
+    def is_trace(self, observation) -> bool:
+        return isinstance(observation, LocalTrace)
+
+    def flush(self):
+        self.sink.flush()
+
+
+def create_tracer(tinyllm_config: dict) -> Tracer:
+    tracing_config = tinyllm_config.get('TRACING') or {}
+    sink = tracing_config.get('SINK') or 'langfuse'
+    if sink == 'langfuse':
+        return LangfuseTracer(Langfuse(
+            public_key=tinyllm_config['LANGFUSE']['PUBLIC_KEY'],
+            secret_key=tinyllm_config['LANGFUSE']['SECRET_KEY'],
+            host=tinyllm_config['LANGFUSE']['HOST'],
+            flush_interval=0.1,
+        ))
+    elif sink == 'jsonl':
+        return LocalTracer(JsonlSink(tracing_config['JSONL_PATH']))
+    elif sink == 'memory':
+        return LocalTracer(InMemorySink())
+    elif sink == 'noop':
+        return LocalTracer(NoOpSink())
+    raise ValueError(f"Unknown tracing sink: {sink}")
+
+
+def parse_event_times(body):
+    return {key: dt.datetime.fromisoformat(value) if key.endswith('_time') and isinstance(value, str) else value
+            for key, value in body.items()}
+
+
+def ship_jsonl_traces(path, client):
+    """
+    Replays the events of a JsonlSink file into a Langfuse client.
+    """
+    with open(path) as file:
+        for line in file:
+            event = json.loads(line)
+            body = parse_event_times(event['body'])
+            observation_type = event['type'].split('-')[0]
+            if observation_type == 'trace':
+                client.trace(id=event['id'], **body)
+            elif observation_type in ['span', 'generation']:
+                getattr(client, observation_type)(id=event['id'],
+                                                  trace_id=event['trace_id'],
+                                                  parent_observation_id=event['parent_observation_id'],
+                                                  **body)
+            elif observation_type == 'score':
+                client.score(id=event['id'], trace_id=event['trace_id'], **body)
+    client.flush()
@@ -1,3 +1,6 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Union, List, Dict
 
 import tiktoken
@@ -44,19 +47,109 @@ def get_openai_message(role,
     return msg
 
 
-def num_tokens_from_string(string: str, encoding_name: str = 'cl100k_base') -> int:
+DEFAULT_ENCODING = 'cl100k_base'
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = DEFAULT_ENCODING):
+    """Returns a process-wide tiktoken encoder, loaded once per encoding."""
+    return tiktoken.get_encoding(encoding_name)
+
+
+@lru_cache(maxsize=256)
+def get_encoding_for_model(model: str = None):
+    """Returns the encoder of a model. Provider prefixes (azure/gpt-4o) are ignored and unknown models use
+    cl100k_base."""
+    if not model:
+        return get_encoding(DEFAULT_ENCODING)
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model.split('/')[-1])
+    except KeyError:
+        encoding_name = DEFAULT_ENCODING
+    return get_encoding(encoding_name)
+
+
+class TokenCounter:
+    """
+    Counts tokens with cached encoders and a bounded LRU cache of counts keyed by (encoding, content hash), so
+    the same prompts, documents and memories are only encoded once.
+    """
+
+    def __init__(self, cache_size: int = 10000):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, encoding, string):
+        return encoding.name, len(string), hash(string)
+
+    def _get(self, key):
+        with self.lock:
+            num_tokens = self.cache.get(key)
+            if num_tokens is None:
+                self.misses += 1
+                return None
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return num_tokens
+
+    def _set(self, key, num_tokens):
+        with self.lock:
+            self.cache[key] = num_tokens
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def count(self, string: str, model: str = None, encoding_name: str = None) -> int:
+        encoding = get_encoding(encoding_name) if encoding_name else get_encoding_for_model(model)
+        key = self._key(encoding, string)
+        num_tokens = self._get(key)
+        if num_tokens is None:
+            num_tokens = len(encoding.encode(string, disallowed_special=()))
+            self._set(key, num_tokens)
+        return num_tokens
+
+    def count_batch(self, strings: List[str], model: str = None, encoding_name: str = None) -> List[int]:
+        """Returns the token count of each string, encoding the cache misses together with encode_batch."""
+        encoding = get_encoding(encoding_name) if encoding_name else get_encoding_for_model(model)
+        keys = [self._key(encoding, string) for string in strings]
+        counts = {}
+        missing = {}
+        for key, string in zip(keys, strings):
+            if key in counts or key in missing:
+                continue
+            num_tokens = self._get(key)
+            if num_tokens is None:
+                missing[key] = string
+            else:
+                counts[key] = num_tokens
+        if missing:
+            encoded = encoding.encode_batch(list(missing.values()), disallowed_special=())
+            for key, tokens in zip(missing, encoded):
+                counts[key] = len(tokens)
+                self._set(key, counts[key])
+        return [counts[key] for key in keys]
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+token_counter = TokenCounter()
+
+
+def num_tokens_from_string(string: str, encoding_name: str = DEFAULT_ENCODING) -> int:
     """Returns the number of tokens in a text string."""
-    encoding = tiktoken.get_encoding(encoding_name)
-    num_tokens = len(encoding.encode(string))
-    return num_tokens
+    return token_counter.count(string, encoding_name=encoding_name)
 
 
 def count_openai_messages_tokens(messages, model="gpt-3.5-turbo"):
     """Returns the number of tokens used by a list of messages."""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
+    encoding = get_encoding_for_model(model)
     if model in ["gpt-4", "gpt-3.5-turbo", "text-embedding-ada-002"]:
         num_tokens = 0
         for message in messages:
@@ -71,30 +164,42 @@ def count_openai_messages_tokens(messages, model="gpt-3.5-turbo"):
         raise NotImplementedError("openai_num_tokens_from_messages() is not implemented for this model.")
 
 
+def to_token_string(input: Union[Dict, str, Message], **kwargs) -> str:
+    if isinstance(input, str):
+        return input
+    elif isinstance(input, Message):
+        input = input.wire_dict
+    if isinstance(input, dict):
+        return stringify_dict(header=kwargs.get('header', '[doc]'),
+                              dict=input,
+                              include_keys=kwargs.get('include_keys', []))
+    raise NotImplementedError("count_tokens() is not implemented for this input type.")
+
+
 def count_tokens(input: Union[List[Dict], Dict, str],
+                 model: str = None,
                  **kwargs):
     if isinstance(input, list):
         if len(input) == 0:
             return 0
-        if isinstance(input[0], str):
-            return sum([num_tokens_from_string(string) for string in input])
-        elif isinstance(input[0], dict):
-            return sum([count_tokens(input_dict) for input_dict in input])
-        elif isinstance(input[0], Message):
-            return sum([count_tokens(msg.to_dict()) for msg in input])
-
-        return sum([count_tokens(input_dict, **kwargs) for input_dict in input])
-
-    elif isinstance(input, str):
-        return num_tokens_from_string(input)
-    elif isinstance(input, dict):
-        dict_string = stringify_dict(header=kwargs.get('header', '[doc]'),
-                                     dict=input,
-                                     include_keys=kwargs.get('include_keys', []))
-        return num_tokens_from_string(dict_string)
-    elif isinstance(input, Message):
-        return count_tokens(input.to_dict())
+        if not all(isinstance(item, (str, dict, Message)) for item in input):
+            return sum([count_tokens(item, model=model, **kwargs) for item in input])
 
-    else:
-        raise NotImplementedError("count_tokens() is not implemented for this input type.")
+        # Messages keep their token counts, everything else is counted in one batch
+        counts = [item.token_counts.get(model) if isinstance(item, Message) and not kwargs else None
+                  for item in input]
+        missing = [i for i, num_tokens in enumerate(counts) if num_tokens is None]
+        if missing:
+            strings = [to_token_string(input[i], **kwargs) for i in missing]
+            for i, num_tokens in zip(missing, token_counter.count_batch(strings, model=model)):
+                counts[i] = num_tokens
+                if isinstance(input[i], Message) and not kwargs:
+                    input[i].token_counts[model] = num_tokens
+        return sum(counts)
+
+    if isinstance(input, Message) and not kwargs:
+        if model not in input.token_counts:
+            input.token_counts[model] = token_counter.count(to_token_string(input), model=model)
+        return input.token_counts[model]
 
+    return token_counter.count(to_token_string(input, **kwargs), model=model)
@@ -0,0 +1,249 @@
+import json
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Annotated, Any, Dict, Optional, Type
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from tinyllm.util.stream_buffer import StreamBuffer
+
+# Stage of a container: waiting for a key (objects), reading a key, waiting for the colon, waiting for a value,
+# reading a value, after a value
+KEY, IN_KEY, AFTER_KEY, VALUE, IN_VALUE, AFTER_VALUE = range(6)
+
+TOKEN_ENDS = set(',:}] \t\r\n')
+
+
+class ContainerFrame:
+    __slots__ = ('closer', 'stage', 'key_start', 'key', 'last_comma')
+
+    def __init__(self, closer):
+        self.closer = closer
+        self.stage = KEY if closer == '}' else VALUE
+        self.key_start = None
+        self.key = None
+        self.last_comma = None
+
+
+class PartialJson(Mapping):
+    """
+    Snapshot of an IncrementalJsonParser: where to cut the text streamed so far and how to close it. The value is
+    only parsed when read, so taking a snapshot doesn't depend on the length of the document.
+    """
+
+    __slots__ = ('parser', 'end', 'suffix', 'closers', 'pending_key', 'complete', 'members', '_value')
+    fields = ('value', 'pending_key', 'complete', 'members')
+
+    def __init__(self, parser, end, suffix, closers, pending_key, complete, members):
+        self.parser = parser
+        self.end = end
+        self.suffix = suffix
+        self.closers = closers
+        self.pending_key = pending_key
+        self.complete = complete
+        self.members = members
+        self._value = None
+
+    @property
+    def value(self) -> Any:
+        if self._value is None:
+            text = self.parser.buffer.text()[self.parser.start:self.end]
+            self._value = json.loads(text + self.suffix + self.closers)
+        return self._value
+
+    def __getitem__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+
+class IncrementalJsonParser:
+    """
+    Parses a JSON document as it streams. Each delta is scanned once, and value is the document parsed so far:
+    complete members as they are and the string being streamed cut where it is. Numbers, literals and keys that
+    are still streaming are left out, so every value in the partial document is final except the string being
+    streamed. Text before the document (like a code fence) and after it is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = StreamBuffer()
+        self.start = None
+        self.end = None
+        self.stack = []
+        self.complete = False
+        self.in_string = False
+        self.escaped = False
+        self.escape_start = None
+        self.unicode_digits = 0
+        self.key_chars = None
+        self.token_start = None
+        # Complete top level members (or items)
+        self.members = 0
+        self._snapshot = None
+
+    def feed(self, delta: str):
+        offset = self.buffer.length
+        self.buffer.append(delta)
+        self._snapshot = None
+        if self.complete:
+            return
+        for i, char in enumerate(delta, offset):
+            self._scan(i, char)
+            if self.complete:
+                break
+
+    @property
+    def value(self) -> Any:
+        state = self.state
+        return state.value if state is not None else None
+
+    @property
+    def pending_key(self) -> Optional[str]:
+        """
+        The top level key whose value is still streaming.
+        """
+        if self.complete or not self.stack:
+            return None
+        root = self.stack[0]
+        return root.key if root.closer == '}' and root.stage == IN_VALUE else None
+
+    @property
+    def state(self) -> Optional[PartialJson]:
+        if self.start is None:
+            return None
+        if self._snapshot is None:
+            self._snapshot = self._take_snapshot()
+        return self._snapshot
+
+    def _start_value(self):
+        if self.stack:
+            self.stack[-1].stage = IN_VALUE
+
+    def _end_value(self):
+        if self.stack:
+            self.stack[-1].stage = AFTER_VALUE
+            if len(self.stack) == 1:
+                self.members += 1
+
+    def _scan(self, i, char):
+        if self.start is None:
+            if char in '{[':
+                self.start = i
+                self.stack.append(ContainerFrame('}' if char == '{' else ']'))
+            return
+
+        frame = self.stack[-1]
+        if self.in_string:
+            if self.unicode_digits:
+                self.unicode_digits -= 1
+            elif self.escaped:
+                self.escaped = False
+                if char == 'u':
+                    self.unicode_digits = 4
+            elif char == '\\':
+                self.escaped = True
+                self.escape_start = i
+            elif char == '"':
+                self.in_string = False
+                if frame.stage == IN_KEY:
+                    frame.stage = AFTER_KEY
+                    frame.key = json.loads('"' + ''.join(self.key_chars) + '"')
+                else:
+                    self._end_value()
+                return
+            if frame.stage == IN_KEY:
+                self.key_chars.append(char)
+            return
+
+        if self.token_start is not None:
+            if char not in TOKEN_ENDS:
+                return
+            self.token_start = None
+            self._end_value()
+
+        if char.isspace():
+            return
+        if char == '"':
+            self.in_string = True
+            if frame.stage == KEY:
+                frame.stage = IN_KEY
+                frame.key_start = i
+                self.key_chars = []
+            else:
+                self._start_value()
+        elif char in '{[':
+            self._start_value()
+            self.stack.append(ContainerFrame('}' if char == '{' else ']'))
+        elif char in '}]':
+            self.stack.pop()
+            if self.stack:
+                self._end_value()
+            else:
+                self.complete = True
+                self.end = i + 1
+        elif char == ',':
+            frame.stage = KEY if frame.closer == '}' else VALUE
+            frame.last_comma = i
+        elif char == ':':
+            frame.stage = VALUE
+        else:
+            self.token_start = i
+            self._start_value()
+
+    def _take_snapshot(self) -> PartialJson:
+        # Cuts what can't be parsed yet and closes the open strings and containers
+        if self.complete:
+            return PartialJson(self, self.end, '', '', None, True, self.members)
+        frame = self.stack[-1]
+        end = self.buffer.length
+        suffix = ''
+        if self.in_string and frame.stage != IN_KEY:
+            if self.escaped or self.unicode_digits:
+                end = self.escape_start
+            suffix = '"'
+        elif frame.closer == '}' and (frame.stage in (KEY, IN_KEY, AFTER_KEY, VALUE) or self.token_start is not None):
+            # Drop the member being streamed and the comma before it
+            if frame.last_comma is not None:
+                end = frame.last_comma
+            elif frame.key_start is not None:
+                end = frame.key_start
+        elif frame.closer == ']' and (frame.stage == VALUE or self.token_start is not None):
+            if frame.last_comma is not None:
+                end = frame.last_comma
+            elif self.token_start is not None:
+                end = self.token_start
+        closers = ''.join(frame.closer for frame in reversed(self.stack))
+        return PartialJson(self, end, suffix, closers, self.pending_key, False, self.members)
+
+
+@lru_cache(maxsize=None)
+def get_field_adapters(output_model: Type[BaseModel]) -> Dict[str, TypeAdapter]:
+    adapters = {}
+    for name, field in output_model.model_fields.items():
+        annotation = Annotated[(field.annotation, *field.metadata)] if field.metadata else field.annotation
+        adapters[name] = TypeAdapter(annotation)
+    return adapters
+
+
+def validate_partial(output_model: Type[BaseModel], value: Any, pending_key: Optional[str] = None) -> Dict:
+    """
+    Returns the fields of a partial output that are complete and valid against output_model, validated.
+    """
+    if not isinstance(value, dict):
+        return {}
+    adapters = get_field_adapters(output_model)
+    validated = {}
+    for key, field_value in value.items():
+        if key == pending_key or key not in adapters:
+            continue
+        try:
+            validated[key] = adapters[key].validate_python(field_value)
+        except ValidationError:
+            continue
+    return validated
@@ -0,0 +1,124 @@
+import atexit
+import copy
+import datetime as dt
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import tinyllm
+
+LANGFUSE_TRACE_URL = "https://us.cloud.langfuse.com/project/{project_id}/traces/{trace_id}"
+
+# Attributes of the records of Function.log, passed as extra
+RECORD_FIELDS = ['trace_id', 'function', 'state', 'duration']
+
+TEXT_FORMAT = '%(levelname)s | %(name)s | %(asctime)s : %(prefix)s%(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Writes the records of the queue handler from a background thread
+log_listener: Optional[QueueListener] = None
+
+
+def get_log_prefix(trace_id, function_name) -> str:
+    if trace_id is None:
+        return f"[{function_name}]"
+    config = tinyllm.tinyllm_config or {}
+    url = LANGFUSE_TRACE_URL.format(project_id=(config.get('LANGFUSE') or {}).get('PROJECT_ID'), trace_id=trace_id)
+    return f"[{trace_id}][{function_name}]({url})"
+
+
+class TextFormatter(logging.Formatter):
+    """
+    The usual tinyllm log lines. Records of a Function are prefixed with its trace id, name and Langfuse URL, which are
+    only formatted if the record is written.
+    """
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+    def format(self, record):
+        function_name = getattr(record, 'function', None)
+        if function_name is None:
+            record.prefix = ''
+        else:
+            record.prefix = get_log_prefix(getattr(record, 'trace_id', None), function_name) + ' '
+        return super().format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record, with the trace id, function name, state and duration of Function records.
+    """
+
+    def format(self, record):
+        entry = {
+            'timestamp': dt.datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in RECORD_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        exception = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+        if exception:
+            entry['exception'] = exception
+        return json.dumps(entry, default=str)
+
+
+def create_log_handler(logs_config: dict) -> logging.Handler:
+    """
+    A stderr handler for LOGS.FORMAT (text or json). With LOGS.HANDLER queue, records are put on a queue and written by
+    a background thread, so logging never blocks the event loop on stderr.
+    """
+    global log_listener
+    log_format = logs_config.get('FORMAT') or 'text'
+    if log_format not in ['text', 'json']:
+        raise ValueError(f"Unknown log format: {log_format}")
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+
+    handler_type = logs_config.get('HANDLER') or 'stream'
+    if handler_type == 'stream':
+        return handler
+    elif handler_type == 'queue':
+        records = queue.SimpleQueue()
+        log_listener = QueueListener(records, handler, respect_handler_level=True)
+        log_listener.start()
+        return LazyQueueHandler(records)
+    raise ValueError(f"Unknown log handler: {handler_type}")
+
+
+class LazyQueueHandler(QueueHandler):
+
+    def prepare(self, record):
+        # QueueHandler.prepare formats the whole record in the calling thread, this only merges the arguments into
+        # the message. Like QueueHandler, exceptions are rendered here so that queued records don't hold tracebacks
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def stop_log_listener():
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+
+def configure_logger(logger: logging.Logger, logs_config: dict):
+    stop_log_listener()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.setLevel(logs_config.get('LEVEL') or logging.DEBUG)
+    logger.addHandler(create_log_handler(logs_config))
+
+
+atexit.register(stop_log_listener)
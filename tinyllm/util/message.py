@@ -7,17 +7,24 @@ from tinyllm.validator import Validator
 
 # Base class for content types
 class Content:
+    __slots__ = ('type',)
+
     def dict(self) -> Dict:
-        return self.__dict__
+        return {attribute: getattr(self, attribute) for cls in type(self).__mro__
+                for attribute in getattr(cls, '__slots__', ())}
 
 
 class Text(Content):
+    __slots__ = ('text',)
+
     def __init__(self, text: str):
         self.type = "text"
         self.text = text
 
 
 class Image(Content):
+    __slots__ = ('image_url',)
+
     def __init__(self, url: str):
         self.type = "image_url"
         self.image_url = {"url": url}
@@ -30,50 +37,97 @@ class MessageInput(Validator):
 
 
 class Message:
+    """
+    Immutable chat message. The wire dict and token counts are computed once and cached. Pass validate=False on
+    trusted internal paths to skip the pydantic validation of the input.
+    """
+
+    __slots__ = ('role', 'raw_content', '_content', '_dict', '_token_counts')
 
     def __init__(self,
                  role: str,
-                 content: Union[List[Content], str]):
-        MessageInput(role=role, content=content)
-        self.role = role
-        self.content = content
-        self.raw_content = content
-        if type(content) == str:
-            self.content = [Text(content)]
+                 content: Union[List[Content], str],
+                 validate: bool = True):
+        if validate:
+            MessageInput(role=role, content=content)
+        object.__setattr__(self, 'role', role)
+        object.__setattr__(self, 'raw_content', content)
+        object.__setattr__(self, '_content', None)
+        object.__setattr__(self, '_dict', None)
+        object.__setattr__(self, '_token_counts', None)
+
+    def _init(self, **attributes):
+        for name, value in attributes.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    __delattr__ = __setattr__
+
+    @property
+    def content(self) -> List[Content]:
+        if self._content is None:
+            self._init(_content=[Text(self.raw_content)] if type(self.raw_content) == str else self.raw_content)
+        return self._content
+
+    @property
+    def token_counts(self) -> Dict:
+        # Token counts by model, filled by count_tokens
+        if self._token_counts is None:
+            self._init(_token_counts={})
+        return self._token_counts
+
+    @property
+    def wire_dict(self) -> Dict:
+        """The memoized wire dict, shared between calls: read it, don't modify it."""
+        if self._dict is None:
+            self._init(_dict=self.serialize())
+        return self._dict
 
     def to_dict(self) -> Dict:
+        return dict(self.wire_dict)
+
+    def serialize(self) -> Dict:
         return {"role": self.role,
                 "content": self.raw_content.strip() if type(self.raw_content) == str else [c.dict() for c in self.content]}
 
 
 class UserMessage(Message):
-    def __init__(self, content: List[Content]):
-        super().__init__("user", content)
+    __slots__ = ()
+
+    def __init__(self, content: List[Content], validate: bool = True):
+        super().__init__("user", content, validate=validate)
 
 
 class SystemMessage(Message):
-    def __init__(self, content: List[Content]):
-        super().__init__("system", content)
+    __slots__ = ()
+
+    def __init__(self, content: List[Content], validate: bool = True):
+        super().__init__("system", content, validate=validate)
 
 
 class FunctionMessage(Message):
-    def __init__(self, content: List[Content]):
-        super().__init__("function", content)
+    __slots__ = ()
+
+    def __init__(self, content: List[Content], validate: bool = True):
+        super().__init__("function", content, validate=validate)
 
 
 class ToolMessage(Message):
+    __slots__ = ('name', 'tool_calls', 'tool_call_id')
+
     def __init__(self,
                  content: Union[List[Content], str],
                  name: str = None,
                  tool_calls: List[Dict] = None,
-                 tool_call_id: str = None):
-        self.name = name
-        self.tool_calls = tool_calls
-        self.tool_call_id = tool_call_id
-        super().__init__("tool", content)
+                 tool_call_id: str = None,
+                 validate: bool = True):
+        super().__init__("tool", content, validate=validate)
+        self._init(name=name, tool_calls=tool_calls, tool_call_id=tool_call_id)
 
-    def to_dict(self) -> Dict:
-        message = super().to_dict()
+    def serialize(self) -> Dict:
+        message = super().serialize()
         if self.tool_call_id:
             message['tool_call_id'] = self.tool_call_id
         if self.tool_calls:
@@ -84,14 +138,17 @@ class ToolMessage(Message):
 
 
 class AssistantMessage(Message):
+    __slots__ = ('tool_calls',)
+
     def __init__(self,
                  content,
-                 tool_calls: List[Dict] = None):
-        self.tool_calls = tool_calls
-        super().__init__("assistant", content)
+                 tool_calls: List[Dict] = None,
+                 validate: bool = True):
+        super().__init__("assistant", content, validate=validate)
+        self._init(tool_calls=tool_calls)
 
-    def to_dict(self) -> Dict:
-        message = super().to_dict()
+    def serialize(self) -> Dict:
+        message = super().serialize()
         if self.tool_calls:
             message['tool_calls'] = self.tool_calls
         return message
@@ -5,13 +5,99 @@ from typing import List, Union, Dict, Any
 import re
 from typing import List
 
-def extract_blocks(text: str, language: str= 'json') -> List[Union[Dict[str, Any], str]]:
+def extract_blocks(text: str, language: str= 'json', parse: bool = True) -> List[Union[Dict[str, Any], str]]:
     pattern = rf'```{language}\s*(.*?)\s*```'
     matches = re.findall(pattern, text.strip(), re.DOTALL)
-    extracted_blocks = [json.loads(match) if language == 'json' else match for match in matches]
+    extracted_blocks = [json.loads(match) if language == 'json' and parse else match for match in matches]
     return extracted_blocks
 
 def extract_html(text: str, tag='prompt') -> List[str]:
     pattern = fr'<{tag}>(.*?)</{tag}>'
     matches = re.findall(pattern, text, re.DOTALL)
     return matches
+
+
+JSON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+JSON_CLOSERS = {'{': '}', '[': ']'}
+
+
+def repair_json(text: str) -> str:
+    """
+    Fixes the usual defects of LLM JSON outputs: code fences and surrounding prose, trailing commas, Python
+    literals, raw newlines in strings, and outputs cut short (unterminated strings, unclosed objects and arrays).
+    """
+    blocks = extract_blocks(text, language='json', parse=False) or extract_blocks(text, language='', parse=False)
+    if blocks:
+        text = blocks[0]
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        return text
+    text = text[min(starts):]
+
+    repaired = []
+    stack = []
+    in_string = False
+    escaped = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == '\n':
+                char = '\\n'
+            repaired.append(char)
+        elif char == '"':
+            in_string = True
+            repaired.append(char)
+        elif char in JSON_CLOSERS:
+            stack.append(JSON_CLOSERS[char])
+            repaired.append(char)
+        elif char in '}]':
+            if stack and char == stack[-1]:
+                stack.pop()
+                _strip_trailing_comma(repaired)
+                repaired.append(char)
+                if not stack:
+                    # Ignore anything after the root value
+                    break
+        elif char.isalpha():
+            match = re.match(r'[A-Za-z]+', text[i:])
+            word = match.group(0)
+            repaired.append(JSON_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            repaired.append(char)
+        i += 1
+
+    if in_string:
+        if escaped:
+            repaired.pop()
+        repaired.append('"')
+    _strip_trailing_comma(repaired)
+    if repaired and repaired[-1].rstrip().endswith(':'):
+        repaired.append(' null')
+    repaired.extend(reversed(stack))
+    return ''.join(repaired)
+
+
+def _strip_trailing_comma(chars: List[str]):
+    while chars and chars[-1].isspace():
+        chars.pop()
+    if chars and chars[-1] == ',':
+        chars.pop()
+
+
+def parse_json(text: str) -> Any:
+    """
+    json.loads, falling back to repair_json. Raises ValueError if the repaired text isn't valid JSON either.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        return json.loads(repair_json(text))
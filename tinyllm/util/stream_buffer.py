@@ -0,0 +1,31 @@
+class StreamBuffer:
+    """
+    Accumulates streamed text as a list of parts. Appending is O(1) whatever the length of the text, and the text is
+    only joined when read. The joined text is kept and extended on the next read.
+    """
+
+    __slots__ = ('parts', 'length', '_text', '_joined_parts')
+
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+        self._text = ''
+        self._joined_parts = 0
+
+    def append(self, text: str):
+        self.parts.append(text)
+        self.length += len(text)
+
+    def text(self, length: int = None) -> str:
+        """
+        The text streamed so far, or its first length characters: the text as it was when the buffer had that length.
+        """
+        if self._joined_parts < len(self.parts):
+            self._text += ''.join(self.parts[self._joined_parts:])
+            self._joined_parts = len(self.parts)
+        if length is None or length == self.length:
+            return self._text
+        return self._text[:length]
+
+    def __len__(self):
+        return self.length
@@ -1,7 +1,14 @@
+import functools
 from typing import Any, Type
 
 from pydantic import BaseModel, ValidationError
 
+import tinyllm
+
+# strict: every Function call validates its input, output and processed output. boundary: only the outermost call does,
+# nested calls trust the payloads of their parent. off: no validation, including the init validators
+VALIDATION_MODES = ['strict', 'boundary', 'off']
+
 
 class Validator(BaseModel):
 
@@ -13,3 +20,46 @@ class Validator(BaseModel):
     class Config:
         extra = 'allow'
         arbitrary_types_allowed = True
+
+
+@functools.lru_cache(maxsize=None)
+def is_noop_validator(validator: Type[Validator]) -> bool:
+    # Validators without fields or custom validation accept any non empty payload as is
+    decorators = validator.__pydantic_decorators__
+    return (not validator.model_fields
+            and validator.model_config.get('extra') == 'allow'
+            and validator.__init__ is Validator.__init__
+            and not (decorators.validators or decorators.field_validators or decorators.root_validators
+                     or decorators.model_validators))
+
+
+@functools.lru_cache(maxsize=None)
+def get_field_defaults(validator: Type[Validator]) -> tuple:
+    return tuple((name, field) for name, field in validator.model_fields.items() if not field.is_required())
+
+
+def dump_models(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, dict):
+        return {key: dump_models(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(dump_models(item) for item in value)
+    return value
+
+
+def dump_unvalidated(validator: Type[Validator], payload: dict) -> dict:
+    """
+    What validator(**payload).model_dump() returns for a valid payload, without validating it: the fields missing
+    from the payload get their defaults and pydantic models are dumped to dicts.
+    """
+    payload = dump_models(payload)
+    for name, field in get_field_defaults(validator):
+        if name not in payload:
+            payload[name] = field.get_default(call_default_factory=True)
+    return payload
+
+
+def validate_init(validator: Type[Validator], **kwargs):
+    if tinyllm.validation_mode != 'off':
+        validator(**kwargs)